@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Optional
+
+from browser_use.browser.context import BrowserContext
+from browser_use.browser.views import URLNotAllowedError
+from loguru import logger
+
+from platilka.core.config import config
+from platilka.core.wait_profiles import WaitProfileStore
+
+# Резолвится, когда структура DOM основной области страницы не менялась quietMs миллисекунд
+# (или по истечении maxMs). Атрибуты не отслеживаются: карусели, таймеры и CSS-анимации меняют их
+# постоянно, и страница никогда не считалась бы стабильной
+DOM_SETTLE_SCRIPT = """
+([quietMs, maxMs, rootSelector]) => new Promise(resolve => {
+    const start = performance.now();
+    const root = (rootSelector && document.querySelector(rootSelector))
+        || document.querySelector('main, [role="main"]') || document.body || document.documentElement;
+    let timer, deadline;
+    const finish = timedOut => {
+        observer.disconnect(); clearTimeout(timer); clearTimeout(deadline);
+        resolve({elapsedMs: performance.now() - start, timedOut});
+    };
+    const observer = new MutationObserver(() => { clearTimeout(timer); timer = setTimeout(() => finish(false), quietMs); });
+    observer.observe(root, {subtree: true, childList: true, characterData: true});
+    timer = setTimeout(() => finish(false), quietMs);
+    deadline = setTimeout(() => finish(true), maxMs);
+})
+"""
+
+
+class AdaptiveBrowserContext(BrowserContext):
+    """Контекст браузера, ожидающий загрузку страницы по событиям, а не фиксированными паузами
+
+    Ждет затихания сети, стабилизации DOM и (если задан в профиле домена) появления
+    селектора готовности. Замеры пополняют профиль домена, а суммарное время ожидания
+    доступно как метрика заказа
+    """
+
+    def __init__(self, *args, domain: str, wait_profiles: WaitProfileStore, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.domain = domain
+        self.wait_profiles = wait_profiles
+        self.total_wait_seconds = 0.0
+
+    async def _wait_for_page_and_frames_load(self, timeout_overwrite: Optional[float] = None):
+        start_time = time.monotonic()
+        deadline = start_time + self.config.maximum_wait_page_load_time
+        load_seconds = settle_seconds = 0.0
+        timed_out = False
+        try:
+            await self._wait_for_stable_network()
+            load_seconds = time.monotonic() - start_time
+
+            # Ожидание - во вкладке, с которой работает агент
+            page = await self.get_agent_current_page()
+            ready_selector = self.wait_profiles.get(self.domain).ready_selector
+            remaining_ms = max(deadline - time.monotonic(), 0) * 1000
+            timed_out = not remaining_ms
+            if remaining_ms:
+                settled = await page.evaluate(
+                    DOM_SETTLE_SCRIPT, [config.DOM_SETTLE_QUIET_SECONDS * 1000, remaining_ms, ready_selector]
+                )
+                settle_seconds, timed_out = settled["elapsedMs"] / 1000, settled["timedOut"]
+
+            remaining_ms = max(deadline - time.monotonic(), 0) * 1000
+            if ready_selector and remaining_ms:
+                await page.wait_for_selector(ready_selector, timeout=remaining_ms)
+
+            await self._check_and_handle_navigation(page)
+            # Ожидания, упершиеся в максимум, не отражают скорость магазина и не попадают в профиль
+            if not timed_out:
+                self.wait_profiles.record(self.domain, load_seconds, settle_seconds)
+        except URLNotAllowedError as e:
+            raise e
+        except Exception as e:
+            logger.warning(f"Ожидание загрузки страницы {self.domain} прервано: {str(e)}")
+
+        # Явно запрошенная минимальная пауза (например, после перехода по ссылке)
+        remaining = (timeout_overwrite or 0) - (time.monotonic() - start_time)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+        self.total_wait_seconds += time.monotonic() - start_time
+
+    def record_action_waits(self, history):
+        """Учет пауз wait_between_actions между действиями внутри шагов завершенного запуска агента"""
+        between_actions = sum(max(len(item.result) - 1, 0) for item in history.history)
+        self.total_wait_seconds += between_actions * self.config.wait_between_actions
+
+    async def close(self):
+        await super().close()
+        snapshot = self.wait_profiles.snapshot()
+        if snapshot is not None:
+            try:
+                await asyncio.to_thread(self.wait_profiles.write, snapshot)
+            except OSError as e:
+                # Профили - оптимизация, ошибка записи не должна ронять оформление заказа
+                logger.warning(f"Не удалось сохранить профили ожидания: {str(e)}")
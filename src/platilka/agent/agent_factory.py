@@ -1,21 +1,37 @@
-from browser_use import Agent, Browser, BrowserConfig, BrowserContextConfig
+import asyncio
+import copy
+from typing import Optional, Type, List, Callable
+from urllib.parse import urlparse
+
+from browser_use import Agent, Browser, BrowserConfig, BrowserContextConfig, Controller
+from browser_use.browser.context import BrowserContext
+from langchain_core.language_models import BaseChatModel
 from langchain_groq import ChatGroq
 from loguru import logger
+from pydantic import BaseModel
 
+from platilka.agent.adaptive_context import AdaptiveBrowserContext
+from platilka.agent.memory_backend import memory_backend
 from platilka.core.config import config, sensitive_data
+from platilka.core.wait_profiles import wait_profiles
 
 
 class AgentFactory:
     """Расширенный класс для автоматизации покупок с детальной обработкой результатов"""
 
-    def __init__(self, groq_api_key: str,
+    def __init__(self, groq_api_key: Optional[str] = None,
                  # patchright
+                 llm: Optional[BaseChatModel] = None,
+                 allowed_domains: Optional[List[str]] = None,
+                 tool_calling_method: str = "auto",
                  ):
-        self.llm = ChatGroq(
+        # llm можно подменить, например скриптовой моделью в бенчмарках
+        self.llm = llm or ChatGroq(
             groq_api_key=groq_api_key,
             model_name=config.LLM_MODEL_NAME,
             temperature=config.LLM_TEMPERATURE,
         )
+        self.tool_calling_method = tool_calling_method
         # TODO вернуть новую версию
         # self.browser_session = BrowserSession(
         #     # playwright=patchright,
@@ -26,27 +42,62 @@ class AgentFactory:
         # )
         self.browser_session = Browser(
             config=BrowserConfig(
-                headless=False,
+                headless=config.BROWSER_HEADLESS,
                 disable_security=False,
                 # keep_alive=True,
                 new_context_config=BrowserContextConfig(
-                    allowed_domains=['www.delikateska.ru', 'hobbygames.ru', 'www.cosmall.ru', '*.ru', '*.shop'], #TODO придумать как без этого
+                    allowed_domains=allowed_domains or config.ALLOWED_DOMAINS, #TODO придумать как без этого
                     # keep_alive=True,
                     disable_security=False,
                 ),
             )
         )
 
-    async def create_agent(self, task: str):
-        """Инициализация браузерного агента"""
+    async def create_browser_context(self, url: Optional[str] = None) -> BrowserContext:
+        """Отдельный контекст браузера, общий для нескольких агентов одного заказа
+
+        Ожидания загрузки страниц подбираются по профилю домена url
+        """
+        domain = urlparse(url).netloc.lower() if url else ""
+        context_config = copy.copy(self.browser_session.config.new_context_config)
+        for name, value in wait_profiles.context_overrides(domain).items():
+            setattr(context_config, name, value)
+
+        return AdaptiveBrowserContext(
+            browser=self.browser_session,
+            config=context_config,
+            domain=domain,
+            wait_profiles=wait_profiles,
+        )
+
+    async def create_agent(self, task: str, output_model: Optional[Type[BaseModel]] = None,
+                           browser_context: Optional[BrowserContext] = None,
+                           step_callback: Optional[Callable] = None,
+                           memory_id: Optional[str] = None,
+                           memory_interval: Optional[int] = None):
+        """Инициализация браузерного агента
+
+        Если передана output_model, агент завершает работу структурированным ответом этой модели.
+        step_callback вызывается на каждом шаге агента до выполнения его действий.
+        Процедурная память подключается из общего бэкенда, только если заданы memory_id и memory_interval
+        """
         try:
             agent = Agent(
                 llm=self.llm,
                 browser=self.browser_session,
+                browser_context=browser_context,
                 # browser_session=self.browser_session,
+                controller=Controller(output_model=output_model) if output_model else Controller(),
                 sensitive_data=sensitive_data,
                 task=task,
+                tool_calling_method=self.tool_calling_method,
+                register_new_step_callback=step_callback,
+                # Собственный mem0 на каждого агента не создаем, память подключается ниже
+                enable_memory=False,
             )
+            if memory_id and memory_interval and memory_backend.available:
+                await asyncio.to_thread(memory_backend.get, self.llm)
+                memory_backend.attach(agent, memory_id, memory_interval)
             logger.info("Браузерный агент успешно инициализирован")
             return agent
         except Exception as e:
@@ -56,7 +107,7 @@ class AgentFactory:
     async def cleanup(self):
         """Очистка ресурсов"""
         try:
-            await self.browser_session.stop()
+            await self.browser_session.close()
             logger.info("Процесс браузера был убит")
         except Exception as e:
             logger.warning(f"Ошибка при остановке процесса браузера: {str(e)}")
@@ -1,12 +1,37 @@
+import asyncio
 import json
 import re
-from typing import Dict, Any, Optional
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Type, Callable
+from urllib.parse import urlparse
 
 from loguru import logger
+from pydantic import BaseModel
 
+from platilka.agent.adaptive_context import AdaptiveBrowserContext
 from platilka.agent.agent_factory import AgentFactory
-from platilka.exceptions.core_exceptions import InvalidAgentResponse
+from platilka.agent.checkout_stages import CheckoutStage, get_stages, is_transient_failure
+from platilka.agent.checkpoints import StageCheckpoint, capture_checkpoint, restore_checkpoint
+from platilka.agent.dead_ends import DeadEndDetector, create_detector
+from platilka.agent.memory_backend import memory_backend
+from platilka.agent.http_replay import http_replayer
+from platilka.agent.network_recorder import NetworkRecorder, NetworkRecording, network_recordings
+from platilka.agent.prompt_variants import PromptVariant, get_variant
+from platilka.core.cancellation import CancellationHandle
+from platilka.core.config import config
+from platilka.core.order_manager import OrderRecord
+from platilka.core.order_validator import order_validator
+from platilka.exceptions.core_exceptions import InvalidAgentResponse, OrderCancelled, StageFailed, DeadEndDetected
 from platilka.models.checkout.checkout_request import CheckoutRequest
+from platilka.models.common import CartSnapshot, PaymentResult
+from platilka.models.quote.quote_response import QuoteOffer
+
+
+def _log_straggler(task: asyncio.Task):
+    """Результат агента, остановленного после ответа /quote, больше не нужен; ошибки только логируются"""
+    if not task.cancelled() and task.exception():
+        logger.warning(f"Остановленный сбор предложения завершился ошибкой: {str(task.exception())}")
 
 
 class AIPayService:
@@ -15,6 +40,50 @@ class AIPayService:
     def __init__(self, agent_factory: AgentFactory):
         self.agent_factory = agent_factory
 
+    async def _run_agent(self, task: str, output_model: Optional[Type[BaseModel]] = None,
+                         browser_context=None, cancellation: Optional[CancellationHandle] = None,
+                         step_callback: Optional[Callable] = None,
+                         memory_id: Optional[str] = None, memory_interval: Optional[int] = None,
+                         dead_end: Optional[DeadEndDetector] = None):
+        """Запуск агента с привязкой к дескриптору отмены заказа и детектору тупиковых страниц"""
+        if cancellation:
+            cancellation.raise_if_cancelled()
+            step_callback = step_callback or cancellation.on_step
+        if dead_end:
+            step_callback = self._chain_step_callbacks(step_callback, dead_end.on_step)
+
+        agent = await self.agent_factory.create_agent(
+            task, output_model=output_model, browser_context=browser_context, step_callback=step_callback,
+            memory_id=memory_id, memory_interval=memory_interval
+        )
+        if cancellation:
+            cancellation.attach_agent(agent)
+        if dead_end:
+            dead_end.attach_agent(agent)
+
+        result = await agent.run()
+        if isinstance(browser_context, AdaptiveBrowserContext):
+            browser_context.record_action_waits(result)
+
+        if cancellation:
+            cancellation.raise_if_cancelled()
+        if dead_end and dead_end.detected:
+            if cancellation:
+                cancellation.publish("dead_end", {"reason": dead_end.detected.reason, "url": dead_end.detected.url})
+            raise dead_end.detected
+        return result
+
+    @staticmethod
+    def _chain_step_callbacks(*callbacks: Optional[Callable]) -> Callable:
+        """Последовательный вызов колбэков шага; InterruptedError любого из них останавливает шаг"""
+        callbacks = [callback for callback in callbacks if callback]
+
+        async def step_callback(state: Any, model_output: Any, step: int):
+            for callback in callbacks:
+                await callback(state, model_output, step)
+
+        return step_callback
+
     def parse_json_from_text(self, text: str) -> Optional[Dict[str, Any]]:
         """Извлечение JSON из текста ответа агента"""
         try:
@@ -35,147 +104,258 @@ class AIPayService:
             raise InvalidAgentResponse(f"Не удалось извлечь JSON из ответа: {str(e)}")
 
     def extract_numeric_value(self, text: str, default: float = 0.0) -> float:
-        """Извлечение числового значения из строки"""
+        """Извлечение числового значения из строки с учетом локали"""
+        value = order_validator.parse_price(text)
+        return default if value is None else value
+
+    def _stage_context(self, product_url: str, quantity: int, delivery_info: Dict[str, Any],
+                       notes: Optional[str] = None, payment_method: str = "card") -> Dict[str, Any]:
+        """Значения для подстановки в промпты этапов"""
+        return {
+            "product_url": product_url,
+            "quantity": quantity,
+            "delivery_method": delivery_info.get("delivery_method") or "Курьерская доставка",
+            "address": delivery_info.get("address", ""),
+            "preferred_date": delivery_info.get("preferred_date") or "Ближайшая доступная",
+            "notes": notes or "",
+            "payment_method": payment_method,
+        }
+
+    async def _run_stage(self, stage: CheckoutStage, context: Dict[str, Any], browser_context,
+                         cancellation: Optional[CancellationHandle] = None,
+                         resume_from: Optional[StageCheckpoint] = None,
+                         previous_data: Optional[Dict[str, Any]] = None,
+                         variant: Optional[PromptVariant] = None,
+                         memory_id: Optional[str] = None) -> Tuple[Dict[str, Any], int, int]:
+        """Выполнение одного этапа: структурированные данные этапа, число шагов агента и входных токенов"""
+        prompt = stage.render(
+            context,
+            resume_url=resume_from.url if resume_from else None,
+            previous_data=previous_data,
+            variant=variant,
+        )
+        domain = urlparse(context["product_url"]).netloc.lower()
         try:
-            # Ищем числа с возможными разделителями
-            number_pattern = r'[\d\s,.]+'
-            matches = re.findall(number_pattern, str(text))
+            result = await self._run_agent(
+                prompt, output_model=stage.output_model, browser_context=browser_context, cancellation=cancellation,
+                memory_id=memory_id, memory_interval=stage.memory_interval,
+                dead_end=create_detector(domain, stage.name, browser_context)
+            )
+            final_result = result.final_result()
+            data = stage.output_model.model_validate_json(final_result).model_dump() if final_result else {}
+        except OrderCancelled:
+            raise
+        except DeadEndDetected as e:
+            # Повтор с чекпоинта приведет на ту же страницу - этап завершается сразу
+            raise StageFailed(stage.name, str(e), transient=False, reason=e.reason)
+        except Exception as e:
+            raise StageFailed(stage.name, str(e), is_transient_failure(stage, str(e)))
+
+        error = data.get("error_message")
+        if data.get("payment_success") is False:
+            error = data.get("payment_error") or "Оплата не прошла"
+        if not result.is_successful() or not data or error:
+            message = error or "; ".join(e for e in result.errors() if e) or "Агент не завершил этап"
+            raise StageFailed(stage.name, message, is_transient_failure(stage, message))
+
+        return data, result.number_of_steps(), result.total_input_tokens()
+
+    async def _create_stage_context(self, product_url: str, recorder: Optional[NetworkRecorder] = None):
+        """Контекст браузера для этапов оформления, при включенной записи - с записью запросов"""
+        browser_context = await self.agent_factory.create_browser_context(product_url)
+        if recorder:
+            await recorder.attach(browser_context)
+        return browser_context
+
+    async def _replay_stage(self, stage: CheckoutStage, context: Dict[str, Any], browser_context,
+                            recording: Optional[NetworkRecording]) -> Optional[Dict[str, Any]]:
+        """Выполнение этапа записанными HTTP-запросами вместо агента (None - если невозможно)"""
+        if stage.name != "add_to_cart" or recording is None:
+            return None
+        try:
+            if await http_replayer.replay_cart(browser_context, recording, context["product_url"], context["quantity"]):
+                return {"added_to_cart": True}
+        except Exception as e:
+            logger.warning(f"Ошибка воспроизведения запросов корзины {recording.domain}: {str(e)}")
+        return None
+
+    async def run_stages(self, stages: List[CheckoutStage], context: Dict[str, Any],
+                         cancellation: Optional[CancellationHandle] = None,
+                         max_retries: Optional[int] = None,
+                         variant: Optional[PromptVariant] = None) -> Dict[str, Any]:
+        """Последовательное выполнение этапов оформления с чекпоинтами
+
+        После каждого этапа сохраняется чекпоинт (данные этапа, url, cookies и localStorage).
+        Временный сбой повторяет этап в новом контексте браузера, восстановленном из последнего
+        чекпоинта, постоянный - завершает оформление с ошибкой.
+        Если для домена есть запись запросов корзины, добавление в корзину выполняется по HTTP
+        """
+        max_retries = config.CHECKOUT_MAX_RETRIES if max_retries is None else max_retries
+        variant = variant or get_variant()
+        memory_id = memory_backend.new_memory_id()
+        checkpoints: List[StageCheckpoint] = []
+        retries: List[Dict[str, Any]] = []
+        stage_data: Dict[str, Any] = {}
+        agent_steps = 0
+        input_tokens = 0
+        wait_seconds = 0.0
+        error = None
+
+        domain = urlparse(context["product_url"]).netloc.lower()
+        recorder = NetworkRecorder(domain) if config.NETWORK_RECORDER_ENABLED else None
+        recording = network_recordings.load(domain) if config.HTTP_REPLAY_ENABLED else None
+        replayed_stages: List[str] = []
+
+        browser_context = await self._create_stage_context(context["product_url"], recorder)
+        try:
+            stage_index, resume_from = 0, None
+            while stage_index < len(stages):
+                stage = stages[stage_index]
+                if cancellation:
+                    cancellation.set_stage(stage.name)
+                if recorder:
+                    recorder.stage = stage.name
 
-            if matches:
-                # Берем последнее найденное число (обычно цена)
-                number_str = matches[-1].replace(' ', '').replace(',', '.')
-                return float(number_str)
+                try:
+                    data, steps, tokens = await self._replay_stage(stage, context, browser_context, recording), 0, 0
+                    if data is None:
+                        data, steps, tokens = await self._run_stage(
+                            stage, context, browser_context, cancellation, resume_from, stage_data, variant, memory_id
+                        )
+                    else:
+                        replayed_stages.append(stage.name)
+                except StageFailed as e:
+                    if not e.transient or len(retries) >= max_retries:
+                        error = e
+                        break
+
+                    resume_from = checkpoints[-1] if checkpoints else None
+                    retries.append({
+                        "attempt": len(retries) + 1,
+                        "failed_stage": stage.name,
+                        "resumed_from_stage": resume_from.stage if resume_from else None,
+                        "reason": str(e),
+                        "started_at": datetime.now().isoformat(),
+                    })
+                    logger.warning(f"{str(e)}. Повтор {len(retries)}/{max_retries} "
+                                   f"с чекпоинта {resume_from.stage if resume_from else 'start'}")
+                    if cancellation:
+                        cancellation.publish("retry", retries[-1])
+
+                    wait_seconds += browser_context.total_wait_seconds
+                    await browser_context.close()
+                    # Повторное закрытие в finally скрыло бы исходную ошибку создания нового контекста
+                    browser_context = None
+                    browser_context = await self._create_stage_context(context["product_url"], recorder)
+                    await restore_checkpoint(browser_context, resume_from)
+                    continue
 
-            return default
-        except:
-            return default
+                agent_steps += steps
+                input_tokens += tokens
+                stage_data.update(data)
+                checkpoints.append(await capture_checkpoint(browser_context, stage.name, data))
+                stage_index, resume_from = stage_index + 1, None
+                if cancellation:
+                    # Промежуточные данные (название, цена, доставка) клиент видит сразу после этапа
+                    cancellation.publish("stage_completed", {
+                        "data": data, "replayed": stage.name in replayed_stages, "agent_steps": steps
+                    })
+
+                if recorder and stage.name == "quantity" and "add_to_cart" not in replayed_stages:
+                    new_recording = recorder.recording(context["product_url"], context["quantity"], checkpoints[-1].url)
+                    if new_recording:
+                        await asyncio.to_thread(network_recordings.save, new_recording)
+        finally:
+            if browser_context is not None:
+                wait_seconds += browser_context.total_wait_seconds
+                await browser_context.close()
+            memory_usage = await asyncio.to_thread(memory_backend.release, memory_id)
+
+        return {
+            "success": error is None,
+            "error_message": str(error) if error else None,
+            "failed_stage": error.stage if error else None,
+            "abort_reason": error.reason if error else None,
+            "data": stage_data,
+            "agent_steps": agent_steps,
+            "input_tokens": input_tokens,
+            "prompt_variant": variant.name,
+            "memory": memory_usage,
+            "wait_seconds": wait_seconds,
+            "replayed_stages": replayed_stages,
+            "checkpoints": [checkpoint.public_view() for checkpoint in checkpoints],
+            "retries": retries,
+        }
 
     async def checkout(self, product_url: str, quantity: int,
                        request: CheckoutRequest,
                        delivery_info: Dict[str, Any],
-                       notes: str
+                       notes: str,
+                       cancellation: Optional[CancellationHandle] = None,
+                       prompt_variant: Optional[str] = None
                        ) -> Dict[
         str, Any]:
-        """Детальное создание корзины с обработкой результатов"""
+        """Детальное создание корзины по этапам с чекпоинтами и повторами"""
         try:
-
-            # Создаем детальный промпт на русском языке
-            checkout_prompt = f"""
-            Ты - профессиональный автоматизатор покупок в интернет-магазинах. Выполняй следующие действия максимально точно и последовательно:
-            
-            === КРИТИЧЕСКИЕ ПРАВИЛА ===
-            1. Работай ТОЛЬКО на странице товара - НЕ ПЕРЕХОДИ В КАТАЛОГ
-            2. Все действия выполняй как реальный пользователь
-            3. При ошибках указывай конкретный этап и детали проблемы
-            4. Адаптируйся к интерфейсу сайта, но не отклоняйся от инструкции
-            5. Не нажимай на кнопки и не заполняй формы слишком быстро
-            
-            ЭТАП 1: АНАЛИЗ ТОВАРА
-            1. Перейди по ссылке: {product_url}
-               - Убедись, что это страница товара (есть цена, кнопка "Купить")
-               - Если это не товар - немедленно верни ошибку
-            2. Найди и запиши:
-               - Точное название товара (ищи в h1, product-title, item-name)
-               - Цену (ищи в price-value, product-price, money-amount)
-               - Статус наличия ("В наличии", "Осталось X шт", "Под заказ")
-            
-            ЭТАП 2: ДОБАВЛЕНИЕ В КОРЗИНУ
-            1. Добавление товара:
-               - Найди кнопку (ищи: "Добавить в корзину", "Купить", "В корзину", "Add to cart")
-               - Если кнопка неактивна ("Нет в наличии") - верни ошибку
-               - Нажми и дождись подтверждения (ищи изменения в иконке корзины или popup)
-            2. Переход в корзину:
-               - Найди элемент корзины (ищи: "Корзина", "Оформить", иконку корзины, "Cart")
-               - Нажми и дождись загрузки страницы корзины
-            
-            ЭТАП 3: УПРАВЛЕНИЕ КОЛИЧЕСТВОМ
-            1. Найди элемент управления количеством (приоритет поиска):
-               а) Поле ввода (input[type='number'], [id*='quantity'], [name*='qty'])
-               б) Выпадающий список (select)
-               в) Кнопки +/- ("плюс", "минус", стрелки)
-               г) Слайдер количества
-            2. Проверь ограничения:
-               - Минимум (обычно 1)
-               - Максимум (если указан)
-               - Шаг изменения (обычно 1)
-            3. Установи количество {quantity}:
-               - Для поля: очисти, введи значение, нажми Enter
-               - Для dropdown: выбери значение
-               - Для кнопок: нажимай нужное количество раз
-               - Для слайдера: перетащи ползунок
-            4. Если {quantity} недоступно:
-               - Установи максимально возможное
-               - Запомни фактическое количество
-               - Проверь наличие предупреждений
-            5. Валидация:
-               - Убедись, что верное количество отображается
-               - Проверь отсутствие ошибок
-               - Запомни стоимость товаров
-            
-            ЭТАП 4: ОФОРМЛЕНИЕ ЗАКАЗА
-            1. Нажми кнопку оформления (ищи: "Оформить заказ", "Checkout", "Продолжить")
-            2. Заполни данные доставки:
-               - Способ: "{delivery_info.get('delivery_method', 'Курьерская доставка')}"
-               - Адрес: "{delivery_info.get('address', '')}"
-               - Дата: "{delivery_info.get('preferred_date', 'Ближайшая доступная')}"
-            3. Контактные данные:
-               - Телефон: phone_number
-               - Email: email
-               - ФИО: full_name
-            4. Комментарий: "{notes}" (если есть поле)
-            5. Проверь все данные перед продолжением
-            
-            ЭТАП 5: ОПЛАТА (только после валидации)
-            1. Выбери способ оплаты: {request.payment_method}
-            2. Для карты:
-               - Номер: card_number
-               - Срок: card_expiration_date
-               - CVV: card_cvv
-               - Держатель: cardholder_name
-            3. Подтверди оплату
-            4. Сохрани номер заказа
-            
-            ФОРМАТ ОТВЕТА (сохранен исходный):
-            ```json
-            {{
-                "success": true/false,
-                "product_name": "название товара",
-                "product_price": цена_за_единицу,
-                "requested_quantity": {quantity},
-                "actual_quantity": фактическое_количество,
-                "max_available_quantity": максимальное_доступное,
-                "availability_status": "в наличии/ограничено/нет",
-                "delivery_method": "способ доставки",
-                "delivery_cost": стоимость_доставки,
-                "estimated_delivery_date": "дата доставки",
-                "subtotal": стоимость_товаров,
-                "total_price": общая_стоимость,
-                "currency": "RUB",
-                "notes": "{notes}",
-                "error_message": "описание ошибки (если есть)"
-            ```    
-            }}
-            """
-
-            checkout_agent = await self.agent_factory.create_agent(checkout_prompt)
+            context = self._stage_context(product_url, quantity, delivery_info, notes, request.payment_method)
             logger.info(f"Начинаю создание корзины для {product_url}")
-            result = await checkout_agent.run()
-
-            extracted_content = result.history[-1].result[0].extracted_content
+            stage_run = await self.run_stages(get_stages(), context, cancellation, variant=get_variant(prompt_variant))
 
-            # Извлекаем структурированные данные из ответа
-            parsed_data = self.parse_json_from_text(str(extracted_content))
+            data = stage_run["data"]
+            product_price = self.extract_numeric_value(data.get("product_price"))
+            actual_quantity = data.get("actual_quantity", 0)
+            delivery_cost = self.extract_numeric_value(data.get("delivery_cost"))
 
             # Вычисляем totals если они не заполнены
-            if parsed_data.get("subtotal", 0) == 0:
-                parsed_data["subtotal"] = parsed_data.get("product_price", 0) * parsed_data.get("actual_quantity", 0)
-
-            if parsed_data.get("total_price", 0) == 0:
-                parsed_data["total_price"] = parsed_data.get("subtotal", 0) + parsed_data.get("delivery_cost", 0)
+            subtotal = self.extract_numeric_value(data.get("subtotal")) or product_price * actual_quantity
+            total_price = self.extract_numeric_value(data.get("total_price")) or subtotal + delivery_cost
+
+            parsed_data = {
+                "success": stage_run["success"],
+                "error_message": stage_run["error_message"],
+                "failed_stage": stage_run["failed_stage"],
+                "abort_reason": stage_run["abort_reason"],
+                "product_name": data.get("product_name", ""),
+                "product_price": product_price,
+                "requested_quantity": quantity,
+                "actual_quantity": actual_quantity,
+                "max_available_quantity": data.get("max_available_quantity"),
+                "availability_status": data.get("availability_status"),
+                "delivery_method": data.get("delivery_method"),
+                "delivery_cost": delivery_cost,
+                "estimated_delivery_date": data.get("estimated_delivery_date"),
+                "subtotal": subtotal,
+                "total_price": total_price,
+                "currency": data.get("currency", "RUB"),
+                "notes": notes,
+                "order_number": data.get("order_number"),
+                "agent_steps": stage_run["agent_steps"],
+                "input_tokens": stage_run["input_tokens"],
+                "prompt_variant": stage_run["prompt_variant"],
+                "memory": stage_run["memory"],
+                "wait_seconds": stage_run["wait_seconds"],
+                "replayed_stages": stage_run["replayed_stages"],
+                "checkpoints": stage_run["checkpoints"],
+                "retries": stage_run["retries"],
+            }
 
-            logger.info(f"Корзина создана успешно. Общая стоимость: {parsed_data.get('total_price', 0)} руб.")
+            if parsed_data["success"]:
+                logger.info(f"Корзина создана успешно. Общая стоимость: {total_price} руб.")
+            else:
+                logger.error(f"Ошибка при создании корзины: {stage_run['error_message']}")
             return parsed_data
 
+        except OrderCancelled as e:
+            logger.warning(f"Создание корзины для {product_url} остановлено: {str(e)}")
+            return {
+                "success": False,
+                "cancelled": True,
+                "cancelled_at_stage": e.stage,
+                "error_message": str(e),
+                "requested_quantity": quantity,
+                "actual_quantity": 0,
+                "total_price": 0.0
+            }
         except Exception as e:
             logger.error(f"Ошибка при создании корзины: {str(e)}")
             return {
@@ -188,104 +368,261 @@ class AIPayService:
                 "total_price": 0.0
             }
 
-    async def confirm_order(self, order_data: Dict[str, Any], expected_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Детальное подтверждение заказа с валидацией"""
+    async def quote_offer(self, product_url: str, quantity: int, delivery_info: Dict[str, Any],
+                          cancellation: Optional[CancellationHandle] = None) -> QuoteOffer:
+        """Сбор предложения магазина (этапы до оплаты) без оплаты"""
+        started_at = time.monotonic()
         try:
+            context = self._stage_context(product_url, quantity, delivery_info)
+            logger.info(f"Запрашиваю предложение для {product_url}")
+            stage_run = await self.run_stages(get_stages("product", "add_to_cart", "quantity", "delivery"), context,
+                                              cancellation)
+            if not stage_run["success"]:
+                raise InvalidAgentResponse(stage_run["error_message"])
+
+            data = stage_run["data"]
+            product_price = self.extract_numeric_value(data.get("product_price"))
+            delivery_cost = self.extract_numeric_value(data.get("delivery_cost"))
+            total_price = order_validator.parse_price(data.get("total_price"))
+            if total_price is None:
+                total_price = product_price * data.get("actual_quantity", quantity) + delivery_cost
+
+            return QuoteOffer(
+                product_url=product_url,
+                success=True,
+                product_name=data.get("product_name"),
+                product_price=product_price,
+                availability=not order_validator.normalize_name(data.get("availability_status")).startswith("нет"),
+                availability_status=data.get("availability_status"),
+                delivery_method=data.get("delivery_method"),
+                delivery_cost=delivery_cost,
+                total_price=total_price,
+                currency=data.get("currency", "RUB"),
+                elapsed_seconds=time.monotonic() - started_at,
+            )
 
-            # Создаем промпт для валидации и подтверждения
-            confirm_prompt = f"""
-            Твоя задача - подтвердить заказ с проверкой всех параметров.
-            
-            ЭТАП 1: 
-            1. Перейди по ссылке: TODO заполнить позже
-            2. Дождись полной загрузки страницы (включая все динамические элементы)
-            3. Закрой всплывающие окна (cookies, промо, подписки), если появятся
-
-            ЭТАП 1: ВАЛИДАЦИЯ ЗАКАЗА
-            Проверь текущие параметры заказа на странице и сравни с ожидаемыми:
-
-            ОЖИДАЕМЫЕ ПАРАМЕТРЫ:
-            - Название товара: {expected_data.get('product_name', '')}
-            - Количество: {expected_data.get('quantity', 0)} шт.
-            - Цена за единицу: {expected_data.get('product_price', 0)} руб.
-            - Стоимость доставки: {expected_data.get('delivery_cost', 0)} руб.
-            - Общая стоимость: {expected_data.get('total_price', 0)} руб.
-            - Способ доставки: {expected_data.get('delivery_method', '')}
-
-            ЭТАП 2: ПРОВЕРКА РАСХОЖДЕНИЙ
-            Если любой из параметров НЕ СОВПАДАЕТ:
-            1. Зафиксируй все расхождения
-            2. НЕ ПРОДОЛЖАЙ с оплатой
-            3. Верни информацию об ошибках валидации
-
-            ЭТАП 3: ОПЛАТА (только если валидация прошла успешно)
-            1. Выбери способ оплаты: {expected_data.get('payment_method', 'card')}
-            2. Заполни данные карты:
-               - Номер карты: card_number
-               - Срок действия: card_expiration_date
-               - CVV: card_cvv
-               - Имя держателя: cardholder_name
-            3. Подтверди оплату
-            4. Дождись результата операции
-            5. Сохрани номер заказа если он появился
-
-            ВЕРНИ РЕЗУЛЬТАТ В JSON ФОРМАТЕ:
-            {{
-                "validation_success": true/false,
-                "validation_errors": ["список ошибок валидации"],
-                "actual_product_name": "фактическое название товара",
-                "actual_quantity": фактическое_количество,
-                "actual_product_price": фактическая_цена_за_единицу,
-                "actual_delivery_cost": фактическая_стоимость_доставки,
-                "actual_total_price": фактическая_общая_стоимость,
-                "payment_success": true/false,
-                "payment_error": "ошибка оплаты если есть",
-                "order_number": "номер заказа из магазина",
-                "payment_confirmation": "подтверждение оплаты",
-                "status": "confirmed/failed/validation_failed"
-            }}
-
-            ВАЖНО:
-            - Будь очень внимателен к цифрам и ценам
-            - Не игнорируй всплывающие окна с ошибками
-            - Если валидация не прошла - сразу останавливайся
-            """
-
-            confirm_order_agent = await self.agent_factory.create_agent(confirm_prompt)
-            logger.info("Начинаю подтверждение заказа с валидацией")
-            result = await confirm_order_agent.run()
-
-            # Извлекаем результат
-            parsed_data = self.parse_json_from_text(str(result))
-
-            if not parsed_data:
-                logger.warning("Не удалось извлечь JSON из ответа подтверждения")
-                parsed_data = {
-                    "validation_success": False,
-                    "validation_errors": ["Не удалось получить ответ от агента"],
-                    "payment_success": False,
-                    "status": "failed",
-                    "actual_total_price": 0.0
-                }
-
-            # Проверяем валидацию
-            if not parsed_data.get("validation_success", False):
-                logger.error(f"Валидация не прошла: {parsed_data.get('validation_errors', [])}")
-                parsed_data["status"] = "validation_failed"
+        except Exception as e:
+            logger.error(f"Ошибка при получении предложения для {product_url}: {str(e)}")
+            return QuoteOffer(
+                product_url=product_url,
+                success=False,
+                elapsed_seconds=time.monotonic() - started_at,
+                error_message=str(e),
+            )
+
+    async def compare_offers(self, product_urls: List[str], quantity: int, delivery_info: Dict[str, Any],
+                             max_concurrency: int, deadline_seconds: float,
+                             target_total_price: Optional[float] = None) -> Dict[str, Any]:
+        """Параллельный сбор предложений с ограничением числа одновременных агентов
+
+        Сбор прекращается по дедлайну или при первом доступном предложении не дороже
+        target_total_price. Незавершенные агенты останавливаются через дескрипторы отмены
+        (отмена задачи browser-use агента не останавливает), ответ ждет их не дольше
+        QUOTE_CANCEL_GRACE_SECONDS - оставшиеся завершаются в фоне и закрывают свои браузеры
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        handles = {url: CancellationHandle(f"quote:{url}", publish_events=False) for url in product_urls}
+
+        async def limited_quote(url: str) -> QuoteOffer:
+            async with semaphore:
+                if handles[url].cancelled:
+                    # Отменен, пока ждал очереди - браузер не запускаем
+                    return QuoteOffer(product_url=url, success=False, error_message="Сбор предложения отменен")
+                return await self.quote_offer(url, quantity, delivery_info, handles[url])
+
+        tasks = {asyncio.create_task(limited_quote(url)): url for url in product_urls}
+        offers: List[QuoteOffer] = []
+        pending = set(tasks)
+        deadline = time.monotonic() + deadline_seconds
 
-            logger.info(f"Подтверждение заказа завершено со статусом: {parsed_data.get('status', 'unknown')}")
+        try:
+            while pending:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    logger.warning(f"Дедлайн сравнения предложений истек, отменяю {len(pending)} запросов")
+                    break
+
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                offers.extend(task.result() for task in done)
+
+                if target_total_price is not None and any(
+                        offer.success and offer.availability and offer.total_price <= target_total_price
+                        for offer in offers):
+                    logger.info(f"Найдено предложение не дороже {target_total_price}, отменяю {len(pending)} запросов")
+                    break
+        finally:
+            for task in pending:
+                handles[tasks[task]].cancel()
+                task.add_done_callback(_log_straggler)
+            if pending:
+                _, stragglers = await asyncio.wait(pending, timeout=config.QUOTE_CANCEL_GRACE_SECONDS)
+                if stragglers:
+                    logger.warning(f"{len(stragglers)} агентов еще останавливаются, отвечаю без них")
+
+        # Доступные предложения по возрастанию цены, затем недоступные и неудачные
+        offers.sort(key=lambda offer: (
+            not (offer.success and offer.availability),
+            offer.total_price if offer.total_price is not None else float("inf"),
+        ))
+        best_offer = offers[0] if offers and offers[0].success and offers[0].availability else None
+
+        return {
+            "offers": offers,
+            "best_offer": best_offer,
+            "cancelled_urls": [tasks[task] for task in pending],
+        }
+
+    async def extract_cart_snapshot(self, expected_data: Dict[str, Any], browser_context,
+                                    cancellation: Optional[CancellationHandle] = None,
+                                    variant: Optional[PromptVariant] = None,
+                                    memory_id: Optional[str] = None) -> Tuple[CartSnapshot, int, int]:
+        """Сбор фактических параметров корзины в структурированном виде без оплаты (и число шагов и токенов)"""
+        snapshot_prompt = (variant or get_variant()).cart_snapshot.format(
+            product_url=expected_data.get('product_url', ''),
+            quantity=expected_data.get('quantity', 1),
+            delivery_method=expected_data.get('delivery_method', ''),
+        )
+
+        logger.info("Собираю фактические параметры корзины")
+        domain = urlparse(expected_data.get("product_url", "")).netloc.lower()
+        result = await self._run_agent(
+            snapshot_prompt, output_model=CartSnapshot, browser_context=browser_context, cancellation=cancellation,
+            # Сбор корзины проходит весь путь до оформления - длинная задача, память полезна
+            memory_id=memory_id, memory_interval=config.AGENT_MEMORY_INTERVAL,
+            dead_end=create_detector(domain, "cart_snapshot", browser_context)
+        )
+
+        final_result = result.final_result()
+        if not result.is_successful() or not final_result:
+            raise InvalidAgentResponse("Агент не смог собрать параметры корзины")
+        return CartSnapshot.model_validate_json(final_result), result.number_of_steps(), result.total_input_tokens()
+
+    async def pay_order(self, expected_data: Dict[str, Any], browser_context,
+                        cancellation: Optional[CancellationHandle] = None,
+                        variant: Optional[PromptVariant] = None) -> Tuple[PaymentResult, int, int]:
+        """Оплата заказа, уже прошедшего валидацию (и число шагов и токенов)"""
+        payment_prompt = (variant or get_variant()).payment.format(
+            payment_method=expected_data.get('payment_method', 'card')
+        )
+
+        logger.info("Начинаю оплату заказа")
+        result = await self._run_agent(
+            payment_prompt, output_model=PaymentResult, browser_context=browser_context, cancellation=cancellation
+        )
+
+        final_result = result.final_result()
+        if not final_result:
+            raise InvalidAgentResponse("Агент не вернул результат оплаты")
+        return PaymentResult.model_validate_json(final_result), result.number_of_steps(), result.total_input_tokens()
+
+    async def confirm_order(self, order_data: Optional[OrderRecord], expected_data: Dict[str, Any],
+                            tolerance: float = 0.01,
+                            cancellation: Optional[CancellationHandle] = None,
+                            prompt_variant: Optional[str] = None) -> Dict[str, Any]:
+        """Подтверждение заказа: локальная сверка фактической корзины и оплата только после нее"""
+        memory_id = memory_backend.new_memory_id()
+        try:
+            result = await self._confirm_order(order_data, expected_data, tolerance, cancellation,
+                                               prompt_variant, memory_id)
+        finally:
+            memory_usage = await asyncio.to_thread(memory_backend.release, memory_id)
+        result["memory"] = memory_usage
+        return result
+
+    async def _confirm_order(self, order_data: Optional[OrderRecord], expected_data: Dict[str, Any],
+                             tolerance: float, cancellation: Optional[CancellationHandle],
+                             prompt_variant: Optional[str], memory_id: str) -> Dict[str, Any]:
+        browser_context = None
+        try:
+            variant = get_variant(prompt_variant)
+            browser_context = await self.agent_factory.create_browser_context(expected_data.get("product_url"))
+
+            if cancellation:
+                cancellation.set_stage("cart_snapshot")
+            snapshot, snapshot_steps, snapshot_tokens = await self.extract_cart_snapshot(
+                expected_data, browser_context, cancellation, variant, memory_id
+            )
+            discrepancies = order_validator.validate(expected_data, snapshot.model_dump(), tolerance)
+            if cancellation:
+                cancellation.publish("stage_completed", {
+                    "data": snapshot.model_dump(), "discrepancies": [d.model_dump() for d in discrepancies]
+                })
+
+            parsed_data = {
+                "validation_success": not discrepancies,
+                "discrepancies": [discrepancy.model_dump() for discrepancy in discrepancies],
+                "actual_product_name": snapshot.product_name,
+                "actual_quantity": snapshot.quantity,
+                "actual_product_price": self.extract_numeric_value(snapshot.product_price),
+                "actual_delivery_cost": self.extract_numeric_value(snapshot.delivery_cost),
+                "actual_total_price": self.extract_numeric_value(snapshot.total_price),
+                "payment_success": False,
+                "agent_steps": snapshot_steps,
+                "input_tokens": snapshot_tokens,
+                "prompt_variant": variant.name,
+            }
+
+            if discrepancies:
+                parsed_data["wait_seconds"] = browser_context.total_wait_seconds
+                logger.error(f"Валидация не прошла: {[d.message for d in discrepancies]}")
+                parsed_data["status"] = "validation_failed"
+                return parsed_data
+
+            if cancellation:
+                # Отмененный заказ не должен доходить до оплаты
+                cancellation.set_stage("payment")
+                cancellation.raise_if_cancelled()
+            payment, payment_steps, payment_tokens = await self.pay_order(
+                expected_data, browser_context, cancellation, variant
+            )
+            parsed_data.update(payment.model_dump())
+            parsed_data["agent_steps"] += payment_steps
+            parsed_data["input_tokens"] += payment_tokens
+            parsed_data["wait_seconds"] = browser_context.total_wait_seconds
+            parsed_data["status"] = "confirmed" if payment.payment_success else "failed"
+
+            logger.info(f"Подтверждение заказа завершено со статусом: {parsed_data['status']}")
             return parsed_data
 
+        except OrderCancelled as e:
+            logger.warning(f"Подтверждение заказа остановлено: {str(e)}")
+            return {
+                "validation_success": False,
+                "discrepancies": [],
+                "payment_success": False,
+                "status": "cancelled",
+                "cancelled": True,
+                "cancelled_at_stage": e.stage,
+                "actual_total_price": 0.0,
+                "payment_error": str(e)
+            }
+        except DeadEndDetected as e:
+            logger.error(f"Подтверждение заказа прервано: {str(e)}")
+            return {
+                "validation_success": False,
+                "discrepancies": [],
+                "validation_errors": [str(e)],
+                "payment_success": False,
+                "status": "failed",
+                "failed_stage": e.stage,
+                "abort_reason": e.reason,
+                "actual_total_price": 0.0,
+                "payment_error": str(e)
+            }
         except Exception as e:
             logger.error(f"Ошибка при подтверждении заказа: {str(e)}")
             return {
                 "validation_success": False,
+                "discrepancies": [],
                 "validation_errors": [str(e)],
                 "payment_success": False,
                 "status": "failed",
                 "actual_total_price": 0.0,
                 "payment_error": str(e)
             }
+        finally:
+            if browser_context:
+                await browser_context.close()
 
     def format_price(self, price: float) -> str:
         """Форматирование цены"""
@@ -293,4 +630,4 @@ class AIPayService:
 
     def validate_price_difference(self, expected: float, actual: float, tolerance: float = 0.01) -> bool:
         """Проверка разности цен с допустимым отклонением"""
-        return abs(expected - actual) <= tolerance
+        return order_validator.prices_match(expected, actual, tolerance)
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from typing import Dict, Any, Type, List, Optional, TYPE_CHECKING
+
+from pydantic import BaseModel
+
+from platilka.models.checkout.stage_results import (
+    ProductStageResult, AddToCartStageResult, QuantityStageResult, DeliveryStageResult
+)
+from platilka.core.config import config
+from platilka.models.common import PaymentResult
+
+if TYPE_CHECKING:
+    from platilka.agent.prompt_variants import PromptVariant
+
+STAGE_RULES = """
+            Ты - профессиональный автоматизатор покупок в интернет-магазинах. Выполняй только текущий этап.
+
+            === КРИТИЧЕСКИЕ ПРАВИЛА ===
+            1. Работай ТОЛЬКО с указанным товаром - НЕ ПЕРЕХОДИ В КАТАЛОГ
+            2. Все действия выполняй как реальный пользователь
+            3. При ошибке заверши работу и опиши проблему в error_message
+            4. Адаптируйся к интерфейсу сайта, но не отклоняйся от инструкции
+
+            ЗАКАЗ: товар {product_url}, количество {quantity}
+"""
+
+RESUME_NOTE = """
+            Ты продолжаешь оформление после сбоя. Браузер уже открыт на странице {resume_url}.
+            Предыдущие этапы выполнены, их результаты: {previous_data}
+            Не повторяй предыдущие этапы, начни с текущего.
+"""
+
+# Признаки ошибок, которые не исправить повтором этапа
+PERMANENT_FAILURE_MARKERS = (
+    "нет в наличии", "закончился", "недоступен для заказа", "не страница товара", "товар не найден",
+    "страница не найдена", "404", "out of stock", "not found", "not allowed", "недопустимый адрес",
+)
+
+
+@dataclass(frozen=True)
+class CheckoutStage:
+    """Этап оформления заказа со своим промптом и структурой результата"""
+    number: int
+    name: str
+    title: str
+    instructions: str
+    output_model: Type[BaseModel]
+    # Этап с побочными эффектами (оплата) повторять автоматически нельзя
+    retryable: bool = True
+    # Период сводок процедурной памяти агента в шагах, None - этап короткий, память не нужна
+    memory_interval: Optional[int] = None
+
+    def render(self, context: Dict[str, Any], resume_url: str | None = None,
+               previous_data: Dict[str, Any] | None = None,
+               variant: "PromptVariant | None" = None) -> str:
+        """Промпт этапа; при повторе из чекпоинта добавляется контекст продолжения
+
+        variant подменяет общие правила и инструкции этапа своими версиями
+        """
+        stage_rules = variant.stage_rules if variant else STAGE_RULES
+        resume_note = variant.resume_note if variant else RESUME_NOTE
+        stage_label = variant.stage_label if variant else "ЭТАП"
+        title, instructions = variant.stages.get(self.name, (self.title, self.instructions)) \
+            if variant else (self.title, self.instructions)
+
+        prompt = stage_rules.format(**context)
+        if resume_url:
+            prompt += resume_note.format(resume_url=resume_url, previous_data=previous_data or {})
+        return prompt + f"""
+            {stage_label} {self.number}: {title}
+{instructions.format(**context)}"""
+
+
+CHECKOUT_STAGES: List[CheckoutStage] = [
+    CheckoutStage(
+        number=1,
+        name="product",
+        title="АНАЛИЗ ТОВАРА",
+        output_model=ProductStageResult,
+        instructions="""
+            1. Перейди по ссылке: {product_url}
+               - Убедись, что это страница товара (есть цена, кнопка "Купить")
+               - Если это не товар - немедленно верни ошибку
+            2. Найди и запиши:
+               - Точное название товара (ищи в h1, product-title, item-name)
+               - Цену ровно как на странице (ищи в price-value, product-price, money-amount)
+               - Статус наличия ("В наличии", "Осталось X шт", "Под заказ")
+""",
+    ),
+    CheckoutStage(
+        number=2,
+        name="add_to_cart",
+        title="ДОБАВЛЕНИЕ В КОРЗИНУ",
+        output_model=AddToCartStageResult,
+        instructions="""
+            1. Добавление товара:
+               - Найди кнопку (ищи: "Добавить в корзину", "Купить", "В корзину", "Add to cart")
+               - Если кнопка неактивна ("Нет в наличии") - верни ошибку
+               - Нажми и дождись подтверждения (ищи изменения в иконке корзины или popup)
+            2. Переход в корзину:
+               - Найди элемент корзины (ищи: "Корзина", "Оформить", иконку корзины, "Cart")
+               - Нажми и дождись загрузки страницы корзины
+""",
+    ),
+    CheckoutStage(
+        number=3,
+        name="quantity",
+        title="УПРАВЛЕНИЕ КОЛИЧЕСТВОМ",
+        output_model=QuantityStageResult,
+        instructions="""
+            1. Найди элемент управления количеством (приоритет поиска):
+               а) Поле ввода (input[type='number'], [id*='quantity'], [name*='qty'])
+               б) Выпадающий список (select)
+               в) Кнопки +/- ("плюс", "минус", стрелки)
+               г) Слайдер количества
+            2. Проверь ограничения: минимум, максимум, шаг изменения
+            3. Установи количество {quantity}:
+               - Для поля: очисти, введи значение, нажми Enter
+               - Для dropdown: выбери значение
+               - Для кнопок: нажимай нужное количество раз
+               - Для слайдера: перетащи ползунок
+            4. Если {quantity} недоступно - установи максимально возможное и запомни фактическое количество
+            5. Убедись, что отображается верное количество, и запиши стоимость товаров
+""",
+    ),
+    CheckoutStage(
+        number=4,
+        name="delivery",
+        title="ОФОРМЛЕНИЕ ЗАКАЗА",
+        output_model=DeliveryStageResult,
+        memory_interval=config.AGENT_MEMORY_INTERVAL,
+        instructions="""
+            1. Нажми кнопку оформления (ищи: "Оформить заказ", "Checkout", "Продолжить")
+            2. Заполни данные доставки:
+               - Способ: "{delivery_method}"
+               - Адрес: "{address}"
+               - Дата: "{preferred_date}"
+            3. Контактные данные:
+               - Телефон: phone_number
+               - Email: email
+               - ФИО: full_name
+            4. Комментарий: "{notes}" (если есть поле)
+            5. Проверь все данные и остановись перед выбором способа оплаты
+            6. Запиши способ и стоимость доставки, дату доставки и общую стоимость ровно как на странице
+""",
+    ),
+    CheckoutStage(
+        number=5,
+        name="payment",
+        title="ОПЛАТА",
+        output_model=PaymentResult,
+        retryable=False,
+        instructions="""
+            1. Выбери способ оплаты: {payment_method}
+            2. Для карты:
+               - Номер: card_number
+               - Срок: card_expiry
+               - CVV: card_cvv
+               - Держатель: cardholder_name
+            3. Подтверди оплату
+            4. Сохрани номер заказа
+""",
+    ),
+]
+
+
+def get_stages(*names: str) -> List[CheckoutStage]:
+    """Этапы оформления по именам (все этапы, если имена не указаны)"""
+    if not names:
+        return list(CHECKOUT_STAGES)
+    return [stage for stage in CHECKOUT_STAGES if stage.name in names]
+
+
+def is_transient_failure(stage: CheckoutStage, message: str) -> bool:
+    """Классификация сбоя: временный (можно повторить из чекпоинта) или постоянный"""
+    if not stage.retryable:
+        return False
+    message = message.lower()
+    return not any(marker in message for marker in PERMANENT_FAILURE_MARKERS)
@@ -0,0 +1,57 @@
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from loguru import logger
+
+
+@dataclass
+class StageCheckpoint:
+    """Состояние заказа после успешно завершенного этапа"""
+    stage: str
+    data: Dict[str, Any]
+    url: str
+    storage_state: Dict[str, Any] = field(repr=False)
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def public_view(self) -> Dict[str, Any]:
+        """Представление для записи заказа (без cookies и localStorage)"""
+        return {"stage": self.stage, "data": self.data, "url": self.url, "created_at": self.created_at}
+
+
+async def capture_checkpoint(browser_context, stage: str, data: Dict[str, Any]) -> StageCheckpoint:
+    """Снимок текущего url и storage state (cookies, localStorage) контекста браузера"""
+    session = await browser_context.get_session()
+    page = await browser_context.get_current_page()
+    storage_state = await session.context.storage_state()
+    return StageCheckpoint(stage=stage, data=data, url=page.url, storage_state=storage_state)
+
+
+async def restore_checkpoint(browser_context, checkpoint: Optional[StageCheckpoint]):
+    """Восстановление cookies, localStorage и страницы чекпоинта в новом контексте браузера"""
+    if checkpoint is None:
+        return
+
+    session = await browser_context.get_session()
+    cookies = checkpoint.storage_state.get("cookies", [])
+    if cookies:
+        await session.context.add_cookies(cookies)
+
+    for origin in checkpoint.storage_state.get("origins", []):
+        items = {item["name"]: item["value"] for item in origin.get("localStorage", [])}
+        if not items:
+            continue
+        await session.context.add_init_script(f"""
+            if (window.location.origin === {json.dumps(origin["origin"])}) {{
+                const items = {json.dumps(items)};
+                for (const [name, value] of Object.entries(items)) {{
+                    window.localStorage.setItem(name, value);
+                }}
+            }}
+        """)
+
+    page = await browser_context.get_current_page()
+    await page.goto(checkpoint.url)
+    await page.wait_for_load_state()
+    logger.info(f"Состояние после этапа {checkpoint.stage} восстановлено: {checkpoint.url}")
@@ -0,0 +1,246 @@
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Optional, Tuple
+
+from loguru import logger
+
+from platilka.core.config import config
+from platilka.exceptions.core_exceptions import DeadEndDetected
+
+# Признаки страницы, снимаемые одним evaluate: заголовок, h1, текст, текст видимых модальных окон,
+# блок наличия товара, наличие активной кнопки покупки и срабатывание селекторов правил.
+# Из блоков наличия берется только первый в документе (карточка товара), а не блоки из подборок ниже
+PAGE_SIGNALS_SCRIPT = r"""
+([selectors, buyLabels, maxText]) => {
+    const visible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const schemaAvailability = document.querySelector('[itemprop="availability"]');
+    const availabilityBlock = [...document.querySelectorAll(
+        '[data-availability], [class*="availability" i], [class*="in-stock" i], [class*="out-of-stock" i], [class*="stock-status" i]'
+    )].find(visible);
+    const dialogs = [...document.querySelectorAll('[role="dialog"], [aria-modal="true"], dialog[open], .modal, .popup')]
+        .filter(visible);
+    const buyButton = [...document.querySelectorAll('button, a, input[type="submit"]')].some(el =>
+        visible(el) && !el.disabled && buyLabels.some(label => (el.innerText || el.value || '').toLowerCase().includes(label)));
+    return {
+        title: document.title || '',
+        h1: [...document.querySelectorAll('h1')].map(el => el.innerText.replace(/\s+/g, ' ')).join('\n'),
+        text: (document.body ? document.body.innerText : '').slice(0, maxText),
+        dialogText: dialogs.map(el => el.innerText).join(' ').slice(0, maxText),
+        availability: [
+            schemaAvailability ? (schemaAvailability.getAttribute('href') || schemaAvailability.getAttribute('content')
+                                  || schemaAvailability.innerText || '') : '',
+            availabilityBlock ? availabilityBlock.innerText : '',
+        ].join('\n').slice(0, maxText),
+        buyButton,
+        selectors: selectors.filter(selector => {
+            try { return [...document.querySelectorAll(selector)].some(visible); } catch (e) { return false; }
+        }),
+    };
+}
+"""
+
+BUY_BUTTON_LABELS = ("в корзину", "в корзине", "купить", "заказать", "оформить", "добавить в корзину",
+                     "add to cart", "buy now")
+MAX_SIGNAL_TEXT = 20000
+
+
+@dataclass(frozen=True)
+class DeadEndRule:
+    """Признаки тупиковой страницы, из которой агент не выберется
+
+    Правило срабатывает, если совпал хотя бы один признак (url, заголовок/h1, текст страницы,
+    текст модального окна, блок наличия товара, видимый селектор) на consecutive_steps шагах подряд
+    """
+    reason: str
+    url_patterns: Tuple[str, ...] = ()
+    title_patterns: Tuple[str, ...] = ()
+    text_patterns: Tuple[str, ...] = ()
+    dialog_patterns: Tuple[str, ...] = ()
+    availability_patterns: Tuple[str, ...] = ()
+    selectors: Tuple[str, ...] = ()
+    consecutive_steps: int = 1
+    # Этапы, на которых правило проверяется (пусто - на всех)
+    stages: Tuple[str, ...] = ()
+    # Срабатывает, только если на странице нет активной кнопки покупки
+    requires_no_buy_button: bool = False
+
+    def matches(self, url: str, signals: Dict[str, Any]) -> bool:
+        if self.requires_no_buy_button and signals.get("buyButton"):
+            return False
+        # Заголовок и каждый h1 проверяются отдельно, чтобы шаблоны с ^ привязывались к их началу
+        headings = [signals.get("title", ""), *signals.get("h1", "").split("\n")]
+        checks = (
+            (self.url_patterns, [url]),
+            (self.title_patterns, headings),
+            (self.text_patterns, [signals.get("text", "")]),
+            (self.dialog_patterns, [signals.get("dialogText", "")]),
+            (self.availability_patterns, signals.get("availability", "").split("\n")),
+        )
+        if any(re.search(pattern, value, re.IGNORECASE)
+               for patterns, values in checks for pattern in patterns for value in values):
+            return True
+        return any(selector in signals.get("selectors", ()) for selector in self.selectors)
+
+
+DEFAULT_RULES: Tuple[DeadEndRule, ...] = (
+    DeadEndRule(
+        reason="captcha",
+        url_patterns=(r"captcha", r"/challenge", r"showcaptcha"),
+        text_patterns=(r"я не робот", r"подтвердите, что вы (не робот|человек)", r"i'?m not a robot",
+                       r"verify (that )?you are (a )?human"),
+        selectors=('iframe[src*="captcha"]', ".g-recaptcha", ".h-captcha", ".smart-captcha",
+                   "#challenge-running", "#cf-challenge-running"),
+        consecutive_steps=2,
+    ),
+    DeadEndRule(
+        reason="login_wall",
+        url_patterns=(r"/(login|signin|sign-in|auth)(/|\?|$)",),
+        dialog_patterns=(r"войдите,? чтобы", r"авторизуйтесь", r"войдите или зарегистрируйтесь",
+                         r"(sign|log) in to continue"),
+        consecutive_steps=2,
+    ),
+    DeadEndRule(
+        reason="not_found",
+        # Только заголовки, которые начинаются с 404 или "не найдено": "Peugeot 404" - обычный товар
+        title_patterns=(r"^\s*(ошибка\s+|error\s+)?404\b", r"^\s*(страница|товар) не найден",
+                        r"^\s*(page |product )?not found"),
+        consecutive_steps=2,
+        requires_no_buy_button=True,
+    ),
+    DeadEndRule(
+        reason="out_of_stock",
+        # Только блок наличия карточки: "нет в наличии" в подборках и отзывах ниже - не про этот товар
+        availability_patterns=(r"нет в наличии", r"товар закончился", r"распродан", r"out of stock", r"sold out",
+                               r"schema\.org/(OutOfStock|SoldOut|Discontinued)"),
+        consecutive_steps=2,
+        stages=("product", "add_to_cart"),
+        requires_no_buy_button=True,
+    ),
+    DeadEndRule(
+        reason="region_loop",
+        dialog_patterns=(r"выберите (ваш )?(город|регион)", r"ваш город", r"укажите (ваш )?(город|регион)",
+                         r"select your (city|region)"),
+        consecutive_steps=3,
+    ),
+)
+
+
+class DeadEndRuleStore:
+    """Правила по доменам: общие правила плюс настройки домена из файла
+
+    Формат файла: {"домен": {"disabled": ["out_of_stock"], "rules": [{"reason": ..., ...}]}}.
+    Правило домена с тем же reason заменяет общее
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._overrides: Optional[Dict[str, Dict[str, Any]]] = None
+        self._cache: Dict[str, Tuple[DeadEndRule, ...]] = {}
+
+    @property
+    def overrides(self) -> Dict[str, Dict[str, Any]]:
+        if self._overrides is None:
+            self._overrides = self._load()
+        return self._overrides
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать правила тупиковых страниц {self.path}: {str(e)}")
+            return {}
+
+    def rules(self, domain: str) -> Tuple[DeadEndRule, ...]:
+        """Правила домена"""
+        if domain not in self._cache:
+            override = self.overrides.get(domain, {})
+            rules = {rule.reason: rule for rule in DEFAULT_RULES}
+            for data in override.get("rules", []):
+                data = {name: tuple(value) if isinstance(value, list) else value for name, value in data.items()}
+                base = rules.get(data["reason"])
+                rules[data["reason"]] = replace(base, **data) if base else DeadEndRule(**data)
+            disabled = set(override.get("disabled", []))
+            self._cache[domain] = tuple(rule for reason, rule in rules.items() if reason not in disabled)
+        return self._cache[domain]
+
+
+class DeadEndDetector:
+    """Проверка тупиковых страниц на каждом шаге агента, без обращения к LLM
+
+    Подключается как колбэк шага: при срабатывании останавливает агента до выполнения
+    действий шага и запоминает причину в detected
+    """
+
+    def __init__(self, domain: str, stage: str, browser_context, rules: Tuple[DeadEndRule, ...]):
+        self.domain = domain
+        self.stage = stage
+        self.browser_context = browser_context
+        self.rules = [rule for rule in rules if not rule.stages or stage in rule.stages]
+        self.selectors = sorted({selector for rule in self.rules for selector in rule.selectors})
+        self.agent = None
+        self.detected: Optional[DeadEndDetected] = None
+        self._streaks: Counter = Counter()
+
+    def attach_agent(self, agent):
+        self.agent = agent
+
+    async def _page_signals(self) -> Dict[str, Any]:
+        try:
+            page = await self.browser_context.get_current_page()
+            return await page.evaluate(PAGE_SIGNALS_SCRIPT, [self.selectors, list(BUY_BUTTON_LABELS), MAX_SIGNAL_TEXT])
+        except Exception as e:
+            logger.debug(f"Не удалось снять признаки страницы: {str(e)}")
+            return {}
+
+    async def on_step(self, state: Any, model_output: Any, step: int):
+        """Колбэк шага агента"""
+        if not self.rules:
+            return
+        url = getattr(state, "url", "") or ""
+        signals = await self._page_signals()
+
+        for rule in self.rules:
+            if not rule.matches(url, signals):
+                self._streaks[rule.reason] = 0
+                continue
+            self._streaks[rule.reason] += 1
+            if self._streaks[rule.reason] >= rule.consecutive_steps:
+                self.detected = DeadEndDetected(rule.reason, self.stage, url)
+                dead_end_stats.record(self.domain, rule.reason)
+                logger.warning(f"{self.domain}: {str(self.detected)} (шаг {step})")
+                if self.agent:
+                    self.agent.stop()
+                raise InterruptedError(str(self.detected))
+
+
+class DeadEndStats:
+    """Счетчики досрочных остановок по доменам и причинам"""
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+
+    def record(self, domain: str, reason: str):
+        self._counts[(domain, reason)] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        for (domain, reason), count in self._counts.items():
+            result.setdefault(domain, {})[reason] = count
+        return result
+
+
+dead_end_rules = DeadEndRuleStore(config.DEAD_END_RULES_PATH)
+dead_end_stats = DeadEndStats()
+
+
+def create_detector(domain: str, stage: str, browser_context) -> Optional[DeadEndDetector]:
+    """Детектор для этапа (None - если детекторы выключены)"""
+    if not config.DEAD_END_DETECTORS_ENABLED:
+        return None
+    return DeadEndDetector(domain, stage, browser_context, dead_end_rules.rules(domain))
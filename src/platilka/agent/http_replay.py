@@ -0,0 +1,188 @@
+import json
+from http.cookies import SimpleCookie
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+import httpx
+from loguru import logger
+
+from platilka.agent.network_recorder import NetworkRecording, REDACTED, REPLAYABLE_STAGES, product_id_from_url
+from platilka.core.http_client import get_http_client
+
+# Cookie, из которых берется CSRF-токен вместо вырезанного из записи заголовка
+CSRF_COOKIE_NAMES = ("csrftoken", "csrf_token", "_csrf", "xsrf-token", "x-csrf-token")
+# Значения полей форм и CSRF-токен из meta-тегов текущей страницы
+PAGE_TOKENS_SCRIPT = """
+() => {
+    const meta = document.querySelector('meta[name="csrf-token"], meta[name="csrf_token"], meta[name="_csrf"]');
+    const fields = {};
+    for (const input of document.querySelectorAll('input[name]')) {
+        if (input.type === 'hidden' || /token|csrf/i.test(input.name)) fields[input.name] = input.value;
+    }
+    return {csrf: meta ? meta.content : null, fields};
+}
+"""
+# Признаки ошибки в JSON-ответе со статусом 2xx
+ERROR_FLAGS = {"success": False, "ok": False, "result": False}
+ERROR_STATUSES = {"error", "fail", "failed"}
+
+class HttpReplayer:
+    """Воспроизведение записанных запросов корзины напрямую по HTTP с cookies сессии браузера"""
+
+    async def replay_cart(self, browser_context, recording: NetworkRecording,
+                          product_url: str, quantity: int) -> bool:
+        """Добавление товара в корзину записанными запросами; браузер переходит на страницу корзины
+
+        При любой ошибке возвращает False, и этап выполняется агентом в браузере
+        """
+        product_id = product_id_from_url(product_url)
+        if not product_id:
+            return False
+
+        # Запросы количества в старых записях не воспроизводятся: количество задает агент на своем этапе
+        calls = [call for call in recording.calls if call.stage in REPLAYABLE_STAGES]
+        if not calls:
+            return False
+
+        session = await browser_context.get_session()
+        cookies: Dict[str, Dict[str, Any]] = {
+            cookie["name"]: cookie for cookie in await session.context.cookies(product_url)
+        }
+        page = await browser_context.get_current_page()
+        user_agent = await page.evaluate("navigator.userAgent")
+        page_tokens = await page.evaluate(PAGE_TOKENS_SCRIPT)
+        client = get_http_client()
+
+        try:
+            for call in calls:
+                url = call.url.replace("{product_id}", product_id)
+                body = (call.post_data or "").replace("{product_id}", product_id).replace("{quantity}", str(quantity))
+                body = self._fill_redacted(body, call.headers.get("content-type", ""), cookies, page_tokens)
+                if body is None:
+                    logger.info(f"Воспроизведение {call.method} {url}: нет значения для вырезанного поля тела")
+                    return False
+                headers = self._headers(call.headers, cookies, user_agent, product_url)
+
+                response = await client.request(call.method, url, content=body.encode() or None, headers=headers)
+                if response.status_code >= 400 or self._response_failed(response):
+                    logger.info(f"Воспроизведение {call.method} {url} не удалось (HTTP {response.status_code})")
+                    return False
+                self._merge_set_cookies(response, cookies, urlparse(url).netloc)
+        except httpx.HTTPError as e:
+            logger.info(f"Воспроизведение запросов корзины {recording.domain} не удалось: {str(e)}")
+            return False
+
+        await session.context.add_cookies(list(cookies.values()))
+        page = await browser_context.get_current_page()
+        await page.goto(recording.cart_url)
+        logger.info(f"Товар добавлен в корзину {recording.domain} по HTTP ({len(calls)} запросов)")
+        return True
+
+    @staticmethod
+    def _csrf_token(cookies: Dict[str, Dict[str, Any]], page_tokens: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        csrf_token = next((cookie["value"] for name, cookie in cookies.items()
+                           if name.lower() in CSRF_COOKIE_NAMES), None)
+        return csrf_token or (page_tokens or {}).get("csrf")
+
+    @classmethod
+    def _fill_redacted(cls, body: str, content_type: str, cookies: Dict[str, Dict[str, Any]],
+                       page_tokens: Dict[str, Any]) -> Optional[str]:
+        """Подстановка вырезанных при записи полей тела: значение поля формы страницы или CSRF-токен
+
+        None - если для какого-то поля значения нет (тогда этап выполняет агент)
+        """
+        if "x-www-form-urlencoded" in content_type:
+            pairs = parse_qsl(body, keep_blank_values=True)
+            if all(value != REDACTED for _, value in pairs):
+                return body
+        elif REDACTED not in body:
+            return body
+        fields = page_tokens.get("fields") or {}
+        csrf_token = cls._csrf_token(cookies, page_tokens)
+
+        def value_for(key: str) -> Optional[str]:
+            if key in fields:
+                return fields[key]
+            return csrf_token if any(marker in key.lower() for marker in ("csrf", "xsrf", "token")) else None
+
+        if "x-www-form-urlencoded" in content_type:
+            filled = []
+            for key, value in pairs:
+                if value == REDACTED:
+                    value = value_for(key)
+                    if value is None:
+                        return None
+                filled.append((key, value))
+            return urlencode(filled)
+        if "json" in content_type:
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                return None
+            missing = []
+
+            def fill(item: Any) -> Any:
+                if isinstance(item, dict):
+                    filled = {}
+                    for key, value in item.items():
+                        if value == REDACTED:
+                            value = value_for(str(key))
+                            if value is None:
+                                missing.append(key)
+                        filled[key] = fill(value)
+                    return filled
+                if isinstance(item, list):
+                    return [fill(value) for value in item]
+                return item
+
+            data = fill(data)
+            return None if missing else json.dumps(data, ensure_ascii=False)
+        return None
+
+    @staticmethod
+    def _response_failed(response: httpx.Response) -> bool:
+        """Ответ 2xx, в JSON которого магазин сообщает об ошибке"""
+        if "json" not in response.headers.get("content-type", ""):
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            return True
+        if not isinstance(data, dict):
+            return False
+        if any(data.get(key) is value for key, value in ERROR_FLAGS.items()):
+            return True
+        if str(data.get("status", "")).lower() in ERROR_STATUSES:
+            return True
+        return bool(data.get("error") or data.get("errors"))
+
+    @staticmethod
+    def _headers(recorded: Dict[str, str], cookies: Dict[str, Dict[str, Any]],
+                 user_agent: str, referer: str) -> Dict[str, str]:
+        headers = {"user-agent": user_agent, "referer": referer,
+                   "cookie": "; ".join(f"{name}={cookie['value']}" for name, cookie in cookies.items())}
+        csrf_token = HttpReplayer._csrf_token(cookies)
+        for name, value in recorded.items():
+            if value != REDACTED:
+                headers[name] = value
+            elif csrf_token:
+                headers[name] = csrf_token
+        return headers
+
+    @staticmethod
+    def _merge_set_cookies(response: httpx.Response, cookies: Dict[str, Dict[str, Any]], domain: str):
+        """Обновление cookies сессии из Set-Cookie ответа"""
+        for header in response.headers.get_list("set-cookie"):
+            parsed = SimpleCookie()
+            parsed.load(header)
+            for name, morsel in parsed.items():
+                cookies[name] = {
+                    **cookies.get(name, {}),
+                    "name": name,
+                    "value": morsel.value,
+                    "domain": morsel["domain"] or cookies.get(name, {}).get("domain") or domain,
+                    "path": morsel["path"] or "/",
+                }
+
+
+http_replayer = HttpReplayer()
@@ -0,0 +1,139 @@
+import resource
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+from langchain_core.language_models import BaseChatModel
+from loguru import logger
+
+from platilka.core.config import config
+
+try:
+    from browser_use.agent.memory import Memory, MemoryConfig
+    from mem0 import Memory as Mem0Memory
+except ImportError:
+    # Память агента требует browser-use[memory]
+    Memory = MemoryConfig = Mem0Memory = None
+
+
+@dataclass
+class MemoryUsage:
+    """Затраты на процедурную память в рамках одного заказа"""
+    summaries: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"summaries": self.summaries, "seconds": round(self.seconds, 3)}
+
+
+if Memory is not None:
+    class SharedProceduralMemory(Memory):
+        """Процедурная память агента поверх общего бэкенда вместо собственного mem0 на каждого агента"""
+
+        def __init__(self, message_manager, llm: BaseChatModel, memory_config: "MemoryConfig", mem0,
+                     usage: MemoryUsage):
+            # Memory.__init__ не вызываем: он загружает модель эмбеддингов и создает индекс
+            self.message_manager = message_manager
+            self.llm = llm
+            self.config = memory_config
+            self.mem0 = mem0
+            self.usage = usage
+
+        def create_procedural_memory(self, current_step: int) -> None:
+            started_at = time.perf_counter()
+            try:
+                super().create_procedural_memory(current_step)
+            finally:
+                self.usage.summaries += 1
+                self.usage.seconds += time.perf_counter() - started_at
+
+
+class AgentMemoryBackend:
+    """Один на процесс бэкенд памяти агентов (модель эмбеддингов + индекс faiss)
+
+    Инициализируется при первом агенте, которому нужна память. Состояние заказов разделено
+    по memory_id (agent_id в mem0) и удаляется вызовом release по завершении заказа
+    """
+
+    def __init__(self):
+        self._mem0 = None
+        self._lock = threading.Lock()
+        self._usage: Dict[str, MemoryUsage] = {}
+        self.init_seconds: Optional[float] = None
+        self.init_rss_mb: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return config.AGENT_MEMORY_ENABLED and Memory is not None
+
+    @property
+    def initialized(self) -> bool:
+        return self._mem0 is not None
+
+    def _memory_config(self, llm: BaseChatModel, memory_id: str, interval: int) -> "MemoryConfig":
+        return MemoryConfig(
+            agent_id=memory_id,
+            memory_interval=interval,
+            llm_instance=llm,
+            embedder_provider=config.AGENT_MEMORY_EMBEDDER_PROVIDER,
+            embedder_model=config.AGENT_MEMORY_EMBEDDER_MODEL,
+            embedder_dims=config.AGENT_MEMORY_EMBEDDER_DIMS,
+            vector_store_base_path=config.AGENT_MEMORY_PATH,
+        )
+
+    def get(self, llm: BaseChatModel):
+        """Общий экземпляр mem0; первая инициализация блокирующая, вызывать вне event loop"""
+        if self._mem0 is None:
+            with self._lock:
+                if self._mem0 is None:
+                    started_at = time.perf_counter()
+                    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                    memory_config = self._memory_config(llm, "platilka", config.AGENT_MEMORY_INTERVAL)
+                    self._mem0 = Mem0Memory.from_config(config_dict=memory_config.full_config_dict)
+                    self.init_seconds = time.perf_counter() - started_at
+                    self.init_rss_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+                    logger.info(f"Память агентов инициализирована за {self.init_seconds:.2f} сек "
+                                f"(+{self.init_rss_mb:.0f} МБ RSS)")
+        return self._mem0
+
+    @staticmethod
+    def new_memory_id() -> str:
+        return f"order_memory_{uuid.uuid4().hex}"
+
+    def attach(self, agent, memory_id: str, interval: int):
+        """Подключение общей памяти к агенту с периодом сводок interval шагов"""
+        usage = self._usage.setdefault(memory_id, MemoryUsage())
+        agent.memory = SharedProceduralMemory(
+            message_manager=agent._message_manager,
+            llm=agent.llm,
+            memory_config=self._memory_config(agent.llm, memory_id, interval),
+            mem0=self._mem0,
+            usage=usage,
+        )
+        agent.enable_memory = True
+
+    def release(self, memory_id: str) -> Dict[str, Any]:
+        """Удаление памяти заказа; возвращает затраты на нее"""
+        usage = self._usage.pop(memory_id, None)
+        if usage is None:
+            return MemoryUsage().as_dict()
+        if self._mem0 is not None and usage.summaries:
+            try:
+                self._mem0.delete_all(agent_id=memory_id)
+            except Exception as e:
+                logger.warning(f"Ошибка очистки памяти {memory_id}: {str(e)}")
+        return usage.as_dict()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.available,
+            "initialized": self.initialized,
+            "init_seconds": self.init_seconds,
+            "init_rss_mb": self.init_rss_mb,
+            "active_orders": len(self._usage),
+        }
+
+
+memory_backend = AgentMemoryBackend()
@@ -0,0 +1,264 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from loguru import logger
+
+from platilka.core.config import config, sensitive_data
+
+# Запросы корзины и оформления, которые имеет смысл записывать
+CART_URL_PATTERN = re.compile(r"cart|basket|korzin|checkout|order|delivery|shipping|quantity|qty", re.IGNORECASE)
+# Заголовки, которые записываются (остальные - браузерный шум)
+RECORDED_HEADERS = {"content-type", "accept", "x-requested-with", "x-csrf-token", "x-xsrf-token", "x-csrftoken"}
+SECRET_HEADERS = {"x-csrf-token", "x-xsrf-token", "x-csrftoken"}
+# Сегменты имен полей (card_number, cardNumber -> card, number) с персональными и платежными данными
+SECRET_KEY_SEGMENTS = {"card", "cvv", "cvc", "pan", "password", "passwd", "pwd", "phone", "tel", "email", "mail",
+                       "address", "addr", "token", "fio", "firstname", "lastname", "surname", "patronymic"}
+SECRET_KEY_SUFFIXES = ("token", "password")
+# name - секрет, только если это имя человека (name, first_name, customerName), а не product_name
+PERSON_NAME_PREFIXES = {"first", "last", "middle", "full", "customer", "user", "recipient", "contact", "buyer",
+                        "client"}
+# Поля, значение которых - количество товара
+QUANTITY_KEY_SEGMENTS = {"quantity", "qty", "count", "kolvo"}
+REDACTED = "<redacted>"
+PRODUCT_ID_PLACEHOLDER = "{product_id}"
+QUANTITY_PLACEHOLDER = "{quantity}"
+# Метка числового JSON-значения: после сериализации плейсхолдер подставляется без кавычек
+_RAW_MARKER = "__raw__"
+# Этапы, запросы которых воспроизводятся без браузера (количество по-прежнему задает агент)
+REPLAYABLE_STAGES = ("add_to_cart",)
+
+
+@dataclass
+class RecordedCall:
+    """Записанный XHR/fetch-запрос (HAR-подобная запись без секретов)"""
+    stage: str
+    method: str
+    url: str
+    headers: Dict[str, str]
+    post_data: Optional[str]
+    status: int
+    response_content_type: Optional[str]
+
+
+@dataclass
+class NetworkRecording:
+    """Запросы корзины одного домена, параметризованные товаром и количеством"""
+    domain: str
+    calls: List[RecordedCall]
+    cart_url: str
+    recorded_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+
+def product_id_from_url(product_url: str) -> Optional[str]:
+    """Идентификатор товара: последний числовой фрагмент пути или последний сегмент пути"""
+    path = urlparse(product_url).path.rstrip("/")
+    numbers = re.findall(r"\d{3,}", path)
+    if numbers:
+        return numbers[-1]
+    segment = path.rsplit("/", 1)[-1]
+    return segment or None
+
+
+def _key_segments(key: Any) -> List[str]:
+    key = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(key)).lower()
+    return [segment for segment in re.split(r"[^a-z0-9]+", key) if segment]
+
+
+def is_secret_key(key: Any) -> bool:
+    """Поле с персональными или платежными данными (по целым сегментам имени, а не по подстроке)"""
+    segments = _key_segments(key)
+    if any(segment in SECRET_KEY_SEGMENTS or segment.endswith(SECRET_KEY_SUFFIXES) for segment in segments):
+        return True
+    if "name" in segments:
+        index = segments.index("name")
+        return segments == ["name"] or (index > 0 and segments[index - 1] in PERSON_NAME_PREFIXES)
+    return False
+
+
+def _is_quantity_key(key: Any) -> bool:
+    return any(segment in QUANTITY_KEY_SEGMENTS for segment in _key_segments(key))
+
+
+def _template_value(key: Any, value: Any, product_id: Optional[str], quantity: int) -> Tuple[Any, bool]:
+    """Плейсхолдер вместо значения поля, если поле хранит идентификатор товара или количество
+
+    Идентификатор товара - по точному совпадению значения, количество - только в полях количества.
+    Второе значение - подставлен ли плейсхолдер
+    """
+    if value is None or isinstance(value, (bool, dict, list)):
+        return value, False
+    if product_id and str(value) == product_id:
+        return PRODUCT_ID_PLACEHOLDER, True
+    if _is_quantity_key(key) and str(value) == str(quantity):
+        return QUANTITY_PLACEHOLDER, True
+    return value, False
+
+
+def _template_json(value: Any, product_id: Optional[str], quantity: int, key: Any = None) -> Any:
+    if isinstance(value, dict):
+        return {item_key: _template_json(item, product_id, quantity, item_key) for item_key, item in value.items()}
+    if isinstance(value, list):
+        return [_template_json(item, product_id, quantity, key) for item in value]
+    templated, replaced = _template_value(key, value, product_id, quantity)
+    if replaced and isinstance(value, (int, float)):
+        return f"{_RAW_MARKER}{templated}"
+    return templated
+
+
+def _template_pairs(query: str, product_id: Optional[str], quantity: int) -> str:
+    pairs = [(key, _template_value(key, value, product_id, quantity)[0])
+             for key, value in parse_qsl(query, keep_blank_values=True)]
+    return urlencode(pairs, safe="{}")
+
+
+def template_url(url: str, product_id: Optional[str], quantity: int) -> str:
+    """Плейсхолдеры в сегментах пути, равных идентификатору товара, и в параметрах запроса"""
+    parts = urlsplit(url)
+    path = "/".join(PRODUCT_ID_PLACEHOLDER if product_id and segment == product_id else segment
+                    for segment in parts.path.split("/"))
+    query = _template_pairs(parts.query, product_id, quantity) if parts.query else parts.query
+    return urlunsplit(parts._replace(path=path, query=query))
+
+
+def template_body(post_data: Optional[str], content_type: str,
+                  product_id: Optional[str], quantity: int) -> Optional[str]:
+    """Плейсхолдеры в полях тела запроса (None - если тело нельзя надежно параметризовать)"""
+    if not post_data:
+        return post_data
+    if "json" in content_type:
+        try:
+            body = json.dumps(_template_json(json.loads(post_data), product_id, quantity), ensure_ascii=False)
+        except json.JSONDecodeError:
+            return None
+        for placeholder in (PRODUCT_ID_PLACEHOLDER, QUANTITY_PLACEHOLDER):
+            body = body.replace(json.dumps(f"{_RAW_MARKER}{placeholder}"), placeholder)
+        return body
+    if "x-www-form-urlencoded" in content_type:
+        return _template_pairs(post_data, product_id, quantity)
+    # Тело неизвестного формата с идентификатором товара воспроизводить нельзя
+    return None if product_id and product_id in post_data else post_data
+
+
+def redact_body(post_data: Optional[str], content_type: str) -> Optional[str]:
+    """Удаление персональных и платежных данных из тела запроса"""
+    if not post_data:
+        return post_data
+
+    for value in sensitive_data.values():
+        if value and len(value) >= 4:
+            post_data = post_data.replace(value, REDACTED)
+
+    if "json" in content_type:
+        try:
+            return json.dumps(_redact_json(json.loads(post_data)), ensure_ascii=False)
+        except json.JSONDecodeError:
+            return post_data
+    if "x-www-form-urlencoded" in content_type:
+        return urlencode([(key, REDACTED if is_secret_key(key) else value)
+                          for key, value in parse_qsl(post_data, keep_blank_values=True)])
+    return post_data
+
+
+def _redact_json(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: REDACTED if is_secret_key(key) else _redact_json(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact_json(item) for item in value]
+    return value
+
+
+class NetworkRecorder:
+    """Запись XHR/fetch-запросов корзины и оформления в сессии агента"""
+
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.stage: Optional[str] = None
+        self.calls: List[RecordedCall] = []
+
+    async def attach(self, browser_context):
+        """Подписка на завершенные запросы контекста браузера"""
+        session = await browser_context.get_session()
+        session.context.on("requestfinished", self._on_request_finished)
+
+    async def _on_request_finished(self, request):
+        if request.resource_type not in ("xhr", "fetch") or not CART_URL_PATTERN.search(request.url):
+            return
+        if urlparse(request.url).netloc.lower() != self.domain:
+            return
+
+        try:
+            response = await request.response()
+            headers = await request.all_headers()
+            content_type = headers.get("content-type", "")
+            self.calls.append(RecordedCall(
+                stage=self.stage or "unknown",
+                method=request.method,
+                url=request.url,
+                headers={name: REDACTED if name in SECRET_HEADERS else value
+                         for name, value in headers.items() if name in RECORDED_HEADERS},
+                post_data=redact_body(request.post_data, content_type),
+                status=response.status if response else 0,
+                response_content_type=response.headers.get("content-type") if response else None,
+            ))
+        except Exception as e:
+            logger.debug(f"Не удалось записать запрос {request.url}: {str(e)}")
+
+    def recording(self, product_url: str, quantity: int, cart_url: str) -> Optional[NetworkRecording]:
+        """Успешные запросы воспроизводимых этапов, параметризованные товаром и количеством"""
+        product_id = product_id_from_url(product_url)
+        calls = []
+        for call in self.calls:
+            if call.stage not in REPLAYABLE_STAGES or not 200 <= call.status < 400 or call.method == "GET":
+                continue
+            content_type = call.headers.get("content-type", "")
+            post_data = template_body(call.post_data, content_type, product_id, quantity)
+            if call.post_data and post_data is None:
+                logger.info(f"Запросы корзины {self.domain} не записаны: тело {call.method} {call.url} "
+                            f"не удалось параметризовать")
+                return None
+            url = template_url(call.url, product_id, quantity)
+            calls.append(RecordedCall(**{**asdict(call), "url": url, "post_data": post_data or None}))
+
+        if not calls:
+            return None
+        return NetworkRecording(domain=self.domain, calls=calls, cart_url=cart_url)
+
+
+class NetworkRecordingStore:
+    """Хранилище записей по доменам на диске"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, domain: str) -> str:
+        return os.path.join(self.directory, f"{re.sub(r'[^a-z0-9.-]', '_', domain)}.json")
+
+    def load(self, domain: str) -> Optional[NetworkRecording]:
+        """Запись домена, если она есть"""
+        path = self._path(domain)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            data["calls"] = [RecordedCall(**call) for call in data["calls"]]
+            return NetworkRecording(**data)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать запись запросов {path}: {str(e)}")
+            return None
+
+    def save(self, recording: NetworkRecording):
+        """Сохранение (перезапись) записи домена"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(recording.domain), "w", encoding="utf-8") as file:
+            json.dump(asdict(recording), file, ensure_ascii=False, indent=2)
+        logger.info(f"Записано {len(recording.calls)} запросов корзины для {recording.domain}")
+
+
+network_recordings = NetworkRecordingStore(config.NETWORK_RECORDINGS_DIR)
@@ -0,0 +1,262 @@
+import hashlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Tuple, Optional
+
+from loguru import logger
+
+from platilka.agent.checkout_stages import STAGE_RULES, RESUME_NOTE
+from platilka.core.config import config
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CART_SNAPSHOT_PROMPT = """
+            Твоя задача - собрать фактические параметры заказа. НЕ ОПЛАЧИВАЙ заказ.
+
+            ЭТАП 1: КОРЗИНА
+            1. Перейди по ссылке: {product_url}
+            2. Дождись полной загрузки страницы, закрой всплывающие окна (cookies, промо, подписки)
+            3. Добавь товар в корзину и установи количество {quantity} шт.
+            4. Перейди в корзину
+
+            ЭТАП 2: ОФОРМЛЕНИЕ
+            1. Нажми кнопку оформления заказа
+            2. Выбери способ доставки: "{delivery_method}"
+            3. Остановись перед выбором способа оплаты
+
+            ЭТАП 3: СБОР ДАННЫХ
+            Перепиши значения ровно так, как они показаны на странице (вместе с валютой и пробелами):
+            - название товара
+            - количество
+            - цену за единицу
+            - стоимость доставки (если не указана - оставь пустой)
+            - общую стоимость
+            - способ доставки
+            """
+
+PAYMENT_PROMPT = """
+            Ты находишься на странице оформления заказа. Параметры заказа уже проверены.
+
+            ЭТАП 1: ОПЛАТА
+            1. Выбери способ оплаты: {payment_method}
+            2. Заполни данные карты:
+               - Номер карты: card_number
+               - Срок действия: card_expiry
+               - CVV: card_cvv
+               - Имя держателя: cardholder_name
+            3. Подтверди оплату
+            4. Дождись результата операции
+            5. Сохрани номер заказа если он появился
+
+            ВАЖНО:
+            - Не меняй состав заказа и способ доставки
+            - Не игнорируй всплывающие окна с ошибками
+            """
+
+
+@dataclass(frozen=True)
+class PromptVariant:
+    """Именованная версия промптов агента
+
+    stages переопределяет заголовок и инструкции этапов оформления по имени этапа,
+    этапы без переопределения используют инструкции из CHECKOUT_STAGES
+    """
+    name: str
+    description: str
+    stage_rules: str = STAGE_RULES
+    resume_note: str = RESUME_NOTE
+    stage_label: str = "ЭТАП"
+    stages: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    cart_snapshot: str = CART_SNAPSHOT_PROMPT
+    payment: str = PAYMENT_PROMPT
+
+
+PROMPT_VARIANTS: Dict[str, PromptVariant] = {}
+
+
+def register_variant(variant: PromptVariant) -> PromptVariant:
+    """Регистрация варианта промптов"""
+    PROMPT_VARIANTS[variant.name] = variant
+    return variant
+
+
+register_variant(PromptVariant(
+    name="ru_v1",
+    description="Исходные подробные инструкции на русском",
+))
+
+register_variant(PromptVariant(
+    name="ru_short_v1",
+    description="Сокращенные инструкции на русском",
+    stage_rules="""
+            Ты оформляешь покупку в интернет-магазине. Выполняй только текущий этап, только с этим товаром.
+            При ошибке заверши работу и опиши проблему в error_message.
+            ЗАКАЗ: товар {product_url}, количество {quantity}
+""",
+    resume_note="""
+            Продолжение после сбоя: браузер открыт на {resume_url}, прошлые этапы выполнены ({previous_data}).
+""",
+    stages={
+        "product": ("ТОВАР", """
+            Открой {product_url}. Если это не страница товара - верни ошибку.
+            Запиши название, цену как на странице и статус наличия.
+"""),
+        "add_to_cart": ("КОРЗИНА", """
+            Нажми "В корзину" ("Купить", "Add to cart"), если кнопка неактивна - верни ошибку. Перейди в корзину.
+"""),
+        "quantity": ("КОЛИЧЕСТВО", """
+            Установи количество {quantity} (поле, список или кнопки +/-).
+            Если столько нет - поставь максимум. Запиши фактическое количество и стоимость товаров.
+"""),
+        "delivery": ("ДОСТАВКА", """
+            Перейди к оформлению. Доставка: "{delivery_method}", адрес: "{address}", дата: "{preferred_date}".
+            Телефон phone_number, email email, ФИО full_name, комментарий: "{notes}".
+            Остановись перед оплатой. Запиши способ, стоимость и дату доставки и общую стоимость как на странице.
+"""),
+        "payment": ("ОПЛАТА", """
+            Способ оплаты: {payment_method}. Карта: card_number, срок card_expiry,
+            CVV card_cvv, держатель cardholder_name. Подтверди оплату и запиши номер заказа.
+"""),
+    },
+    cart_snapshot="""
+            Собери фактические параметры заказа, НЕ ОПЛАЧИВАЙ.
+            Открой {product_url}, добавь в корзину {quantity} шт., перейди к оформлению,
+            выбери доставку "{delivery_method}" и остановись перед оплатой.
+            Перепиши как на странице: название, количество, цену за единицу, стоимость доставки
+            (пусто, если не указана), общую стоимость, способ доставки.
+            """,
+    payment="""
+            Параметры заказа проверены. Способ оплаты: {payment_method}.
+            Карта: card_number, срок card_expiry, CVV card_cvv, держатель cardholder_name.
+            Подтверди оплату, дождись результата и запиши номер заказа. Не меняй состав заказа и доставку.
+            """,
+))
+
+register_variant(PromptVariant(
+    name="en_v1",
+    description="Инструкции на английском, значения со страницы - на языке сайта",
+    stage_rules="""
+            You automate a purchase in an online shop. Do only the current stage, only with this product,
+            never browse the catalog. On failure finish and describe the problem in error_message.
+            Copy values exactly as shown on the page, in the page's language.
+            ORDER: product {product_url}, quantity {quantity}
+""",
+    stage_label="STAGE",
+    resume_note="""
+            Resuming after a failure: the browser is already on {resume_url}.
+            Previous stages are done, their results: {previous_data}. Start with the current stage.
+""",
+    stages={
+        "product": ("PRODUCT", """
+            1. Open {product_url}. If it is not a product page (price, buy button) - return an error.
+            2. Record the exact product name, the price as shown and the availability status.
+"""),
+        "add_to_cart": ("ADD TO CART", """
+            1. Click the add-to-cart button ("В корзину", "Купить", "Add to cart"). If it is disabled - return an error.
+            2. Wait for confirmation and open the cart.
+"""),
+        "quantity": ("QUANTITY", """
+            1. Set quantity {quantity} using the input, select or +/- buttons.
+            2. If {quantity} is not available, set the maximum and record the actual quantity.
+            3. Record the items subtotal.
+"""),
+        "delivery": ("DELIVERY", """
+            1. Proceed to checkout ("Оформить заказ", "Checkout").
+            2. Delivery method "{delivery_method}", address "{address}", date "{preferred_date}".
+            3. Phone phone_number, email email, full name full_name, comment "{notes}" if there is a field.
+            4. Stop before choosing the payment method. Record delivery method, cost, date and total as shown.
+"""),
+        "payment": ("PAYMENT", """
+            1. Payment method: {payment_method}.
+            2. Card: number card_number, expiry card_expiry, CVV card_cvv, holder cardholder_name.
+            3. Confirm the payment and record the order number.
+"""),
+    },
+    cart_snapshot="""
+            Collect the actual order parameters. DO NOT PAY.
+            1. Open {product_url}, close popups, add the product to the cart, set quantity {quantity}.
+            2. Proceed to checkout, choose delivery "{delivery_method}", stop before payment.
+            3. Copy exactly as shown on the page (with currency): product name, quantity, unit price,
+               delivery cost (empty if not shown), total price, delivery method.
+            """,
+    payment="""
+            You are on the checkout page, the order is already validated.
+            1. Payment method: {payment_method}.
+            2. Card: number card_number, expiry card_expiry, CVV card_cvv, holder cardholder_name.
+            3. Confirm, wait for the result and record the order number if shown.
+            Do not change the order contents or delivery. Do not ignore error popups.
+            """,
+))
+
+
+@lru_cache(maxsize=8)
+def _parse_split(split: str) -> Tuple[Tuple[str, int], ...]:
+    """Разбор распределения трафика вида "ru_v1:90,en_v1:10" (один раз на значение настройки)
+
+    Ошибочные элементы пропускаются с предупреждением: опечатка в настройке не должна ломать заказы
+    """
+    weights = []
+    for item in filter(None, (part.strip() for part in split.split(","))):
+        name, _, weight = item.partition(":")
+        name, weight = name.strip(), weight.strip()
+        if name not in PROMPT_VARIANTS or not weight.isdigit() or int(weight) <= 0:
+            logger.warning(f"PROMPT_VARIANT_SPLIT: элемент '{item}' пропущен, "
+                           f"ожидается вариант:вес, варианты: {', '.join(PROMPT_VARIANTS)}")
+            continue
+        weights.append((name, int(weight)))
+    return tuple(weights)
+
+
+def get_variant(name: Optional[str] = None) -> PromptVariant:
+    """Вариант промптов по имени (по умолчанию - PROMPT_VARIANT_DEFAULT)"""
+    name = name or config.PROMPT_VARIANT_DEFAULT
+    if name not in PROMPT_VARIANTS:
+        raise ValueError(f"Неизвестный вариант промптов: {name}. Доступны: {', '.join(PROMPT_VARIANTS)}")
+    return PROMPT_VARIANTS[name]
+
+
+def select_variant(name: Optional[str] = None, key: str = "") -> PromptVariant:
+    """Вариант для запроса: явно указанный, иначе по распределению трафика PROMPT_VARIANT_SPLIT
+
+    Распределение детерминировано по key (ID заказа), поэтому checkout и confirm одного заказа
+    получают один и тот же вариант
+    """
+    if name:
+        return get_variant(name)
+
+    weights = _parse_split(config.PROMPT_VARIANT_SPLIT)
+    if not weights:
+        return get_variant()
+
+    bucket = int(hashlib.sha256(key.encode()).hexdigest(), 16) % sum(weight for _, weight in weights)
+    for variant_name, weight in weights:
+        if bucket < weight:
+            return PROMPT_VARIANTS[variant_name]
+        bucket -= weight
+    return get_variant()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Кодировка tiktoken; загружается при первой оценке, а не при импорте (файл кодировки качается из сети)"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Кодировка tiktoken недоступна, токены оцениваются по байтам: {str(e)}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Число токенов текста: через tiktoken, если установлен, иначе по байтам UTF-8
+
+    Оценка по байтам учитывает, что кириллица дороже латиницы
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text.encode("utf-8")) // 4
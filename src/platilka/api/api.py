@@ -1,23 +1,43 @@
 import os
+import secrets
 from contextlib import asynccontextmanager
+from itertools import islice
 from datetime import datetime
 from locale import currency
+from typing import Optional
 
+import orjson
 from fastapi import FastAPI, APIRouter
-from fastapi import HTTPException, BackgroundTasks
+from fastapi import HTTPException, BackgroundTasks, Depends, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from patchright.async_api import async_playwright as async_patchright
 
 from platilka.agent.agent_factory import AgentFactory
 from platilka.agent.ai_pay_service import AIPayService
+from platilka.agent.dead_ends import dead_end_stats
+from platilka.agent.memory_backend import memory_backend
+from platilka.agent.prompt_variants import select_variant
+from platilka.core.cancellation import cancellation_registry
 from platilka.core.config import config
+from platilka.core.http_client import close_http_client
 from platilka.core.logging import logger
+from platilka.core.loop_monitor import loop_lag_monitor
+from platilka.core.order_events import order_events
 from platilka.core.order_manager import orders_storage, order_manager
+from platilka.core.profiler import sampling_profiler, PROFILE_MODES
+from platilka.core.wait_profiles import wait_profiles
+from platilka.exceptions.core_exceptions import OrderAlreadyRunning
 from platilka.models.checkout.checkout_request import CheckoutRequest
 from platilka.models.checkout.checkout_response import CheckoutResponse
 from platilka.models.common import ProductInfo, DeliveryDetails, ValidationError
 from platilka.models.confirm.confirm_request import ConfirmRequest
 from platilka.models.confirm.confirm_response import ConfirmResponse
+from platilka.models.quote.quote_request import QuoteRequest
+from platilka.models.quote.quote_response import QuoteResponse
+from platilka.models.watch.watch_request import WatchRequest
+from platilka.models.watch.watch_response import WatchResponse
+from platilka.monitor.price_monitor import price_monitor
 
 # Создаем роутер
 router = APIRouter()
@@ -45,13 +65,21 @@ async def lifespan(app: FastAPI):
                                  # patchright
                                  )
     ai_pay_service = AIPayService(agent_factory)
+    loop_lag_monitor.start()
+    if config.WATCH_ENABLED:
+        price_monitor.start()
     logger.info("Сервис автоматизации покупок запущен")
 
     yield
 
     # Очистка при завершении
+    if config.WATCH_ENABLED:
+        await price_monitor.stop()
     if agent_factory:
         await agent_factory.cleanup()
+    await close_http_client()
+    await loop_lag_monitor.stop()
+    wait_profiles.save()
     logger.info("Сервис автоматизации покупок остановлен")
 
 
@@ -105,6 +133,7 @@ async def checkout_endpoint(request: CheckoutRequest, background_tasks: Backgrou
     Принимает ссылку на товар и информацию о доставке,
     возвращает детальную информацию о заказе без оплаты
     """
+    order_id = None
     try:
         global ai_pay_service
 
@@ -118,18 +147,46 @@ async def checkout_endpoint(request: CheckoutRequest, background_tasks: Backgrou
         logger.info(f"URL товара: {request.product_url}")
         logger.info(f"Количество: {request.quantity}")
 
+        try:
+            prompt_variant = select_variant(request.prompt_variant, order_id).name
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Сохраняем заказ сразу, чтобы его можно было отменить во время работы агента
+        order_manager.save_order(order_id, {
+            "checkout_request": request,
+            "prompt_variant": prompt_variant,
+            "status": "checkout_in_progress"
+        })
+        cancellation = cancellation_registry.register(order_id)
+
         # Вызываем детальное создание корзины
-        checkout_result = await ai_pay_service.checkout(
-            request=request,
-            product_url=str(request.product_url),
-            quantity=request.quantity,
-            delivery_info=request.delivery_info.model_dump(),
-            notes=request.notes
-        )
+        try:
+            checkout_result = await ai_pay_service.checkout(
+                request=request,
+                product_url=str(request.product_url),
+                quantity=request.quantity,
+                delivery_info=request.delivery_info.model_dump(),
+                notes=request.notes,
+                cancellation=cancellation,
+                prompt_variant=prompt_variant
+            )
+        finally:
+            cancellation_registry.release(order_id, cancellation)
+
+        if checkout_result.get("cancelled", False):
+            stage = checkout_result.get("cancelled_at_stage")
+            order_manager.update_order_status(order_id, "cancelled", {"cancelled_at_stage": stage})
+            raise HTTPException(status_code=409, detail=f"Заказ {order_id} отменен на этапе: {stage or 'неизвестно'}")
 
         if not checkout_result.get("success", False):
             error_message = checkout_result.get("error_message", "Неизвестная ошибка при создании корзины")
             logger.error(f"Ошибка создания корзины для заказа {order_id}: {error_message}")
+            order_manager.update_order_status(order_id, "checkout_failed", {
+                "checkout_result": checkout_result,
+                "failed_stage": checkout_result.get("failed_stage"),
+                "abort_reason": checkout_result.get("abort_reason")
+            })
             raise HTTPException(status_code=400, detail=error_message)
 
         # Создаем объекты ответа
@@ -144,7 +201,7 @@ async def checkout_endpoint(request: CheckoutRequest, background_tasks: Backgrou
         )
 
         delivery_details = DeliveryDetails(
-            cost=0.0, #TODO - исправить
+            cost=checkout_result.get("delivery_cost") or 0.0,
             estimated_date=checkout_result.get("estimated_delivery_date", "Неизвестно"),
             method=checkout_result.get("delivery_method", "Стандартная доставка"),
             # address=request.delivery_info.address
@@ -168,12 +225,11 @@ async def checkout_endpoint(request: CheckoutRequest, background_tasks: Backgrou
             warnings=warnings
         )
 
-        # Сохраняем заказ
-        order_manager.save_order(order_id, {
-            "checkout_request": request.model_dump(),
-            "checkout_response": response.model_dump(),
-            "checkout_raw_data": checkout_result,
-            "status": "checkout_completed"
+        # Сохраняем результат заказа
+        order_manager.update_order_status(order_id, "checkout_completed", {
+            "checkout_response": response,
+            "checkout_result": checkout_result,
+            "total_price": response.total_price
         })
 
         logger.info(f"Корзина успешно создана для заказа {order_id}. Сумма: {response.total_price} {product_info.currency}")
@@ -183,6 +239,9 @@ async def checkout_endpoint(request: CheckoutRequest, background_tasks: Backgrou
         raise
     except Exception as e:
         logger.error(f"Неожиданная ошибка в checkout: {str(e)}")
+        if order_id:
+            # Завершаем запуск, чтобы подписчики потока событий не ждали его вечно
+            order_manager.update_order_status(order_id, "checkout_failed")
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
 
 
@@ -200,15 +259,28 @@ async def confirm_endpoint(request: ConfirmRequest):
             raise HTTPException(status_code=500, detail="Сервис автоматизации не инициализирован")
 
         # Проверяем существование заказа
-        # TODO допилить логику с order_data
         order_data = order_manager.get_order(request.order_id)
-        # if not order_data:
-        #     raise HTTPException(status_code=404, detail="Заказ не найден")
+        if not order_data:
+            raise HTTPException(status_code=404, detail="Заказ не найден")
+        if order_data.status in ("cancelled", "confirmed"):
+            raise HTTPException(status_code=409, detail=f"Заказ {request.order_id} в статусе {order_data.status}, "
+                                                        f"подтверждение невозможно")
+        if order_data.status.endswith("_in_progress"):
+            # Повторное подтверждение во время работы агента - риск двойной оплаты
+            raise HTTPException(status_code=409, detail=f"Заказ {request.order_id} в статусе {order_data.status}, "
+                                                        f"дождитесь завершения")
 
         logger.info(f"Начинаю подтверждение заказа {request.order_id}")
 
+        prompt_variant = request.prompt_variant or (order_data.prompt_variant if order_data else None)
+        try:
+            prompt_variant = select_variant(prompt_variant, request.order_id).name
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         # Подготавливаем данные для валидации
         expected_data = {
+            "product_url": str(request.product_url),
             "product_name": request.product.name,
             "quantity": request.product.quantity,
             "product_price": request.product.price,
@@ -218,31 +290,41 @@ async def confirm_endpoint(request: ConfirmRequest):
             "payment_method": request.payment_method
         }
 
-        # Вызываем детальное подтверждение заказа
-        confirm_result = await ai_pay_service.confirm_order(
-            order_data=order_data,
-            expected_data=expected_data
-        )
-
-        # Обрабатываем ошибки валидации
-        validation_errors = []
-        if not confirm_result.get("validation_success", False):
-            raw_errors = confirm_result.get("validation_errors", [])
-            for error in raw_errors:
-                if isinstance(error, str):
-                    validation_errors.append(ValidationError(
-                        field="general",
-                        expected="",
-                        actual="",
-                        message=error
-                    ))
+        try:
+            cancellation = cancellation_registry.register(request.order_id)
+        except OrderAlreadyRunning as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        order_manager.update_order_status(request.order_id, "confirm_in_progress")
+
+        # Сначала локальная сверка фактической корзины, оплата - только если она прошла
+        try:
+            confirm_result = await ai_pay_service.confirm_order(
+                order_data=order_data,
+                expected_data=expected_data,
+                tolerance=request.validation_tolerance,
+                cancellation=cancellation,
+                prompt_variant=prompt_variant
+            )
+        finally:
+            cancellation_registry.release(request.order_id, cancellation)
+
+        discrepancies = [ValidationError(**discrepancy) for discrepancy in confirm_result.get("discrepancies", [])]
+        for error in confirm_result.get("validation_errors", []):
+            discrepancies.append(ValidationError(
+                field="general",
+                expected="",
+                actual="",
+                message=str(error)
+            ))
 
         # Определяем статус операции
         success = confirm_result.get("payment_success", False) and confirm_result.get("validation_success", False)
         status_message = "Заказ успешно подтвержден и оплачен"
 
-        if not confirm_result.get("validation_success", False):
-            status_message = "Ошибка валидации заказа"
+        if confirm_result.get("cancelled", False):
+            status_message = f"Заказ отменен на этапе: {confirm_result.get('cancelled_at_stage') or 'неизвестно'}"
+        elif not confirm_result.get("validation_success", False):
+            status_message = "Ошибка валидации заказа: " + "; ".join(d.message for d in discrepancies)
         elif not confirm_result.get("payment_success", False):
             status_message = f"Ошибка оплаты: {confirm_result.get('payment_error', 'Неизвестная ошибка')}"
 
@@ -250,7 +332,8 @@ async def confirm_endpoint(request: ConfirmRequest):
             success=success,
             order_id=request.order_id,
             validation_success=confirm_result.get("validation_success", False),
-            validation_errors=validation_errors,
+            payment_success=confirm_result.get("payment_success", False),
+            discrepancies=discrepancies,
             actual_total_price=confirm_result.get("actual_total_price", 0.0),
             payment_status=confirm_result.get("status", "failed"),
             order_number=confirm_result.get("order_number"),
@@ -258,11 +341,17 @@ async def confirm_endpoint(request: ConfirmRequest):
         )
 
         # Обновляем статус заказа
-        order_manager.update_order_status(request.order_id, response.payment_status, {
-            "confirm_request": request.model_dump(),
-            "confirm_response": response.model_dump(),
-            "confirm_raw_data": confirm_result
-        })
+        confirm_data = {
+            "confirm_request": request,
+            "confirm_response": response,
+            "confirm_result": confirm_result
+        }
+        if confirm_result.get("cancelled", False):
+            confirm_data["cancelled_at_stage"] = confirm_result.get("cancelled_at_stage")
+        if confirm_result.get("abort_reason"):
+            confirm_data["failed_stage"] = confirm_result.get("failed_stage")
+            confirm_data["abort_reason"] = confirm_result.get("abort_reason")
+        order_manager.update_order_status(request.order_id, response.payment_status, confirm_data)
 
         logger.info(f"Подтверждение заказа {request.order_id} завершено. Статус: {response.payment_status}")
         return response
@@ -271,56 +360,213 @@ async def confirm_endpoint(request: ConfirmRequest):
         raise
     except Exception as e:
         logger.error(f"Неожиданная ошибка в confirm: {str(e)}")
+        order_manager.update_order_status(request.order_id, "failed")
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+
+
+@app.post("/quote", response_model=QuoteResponse)
+async def quote_endpoint(request: QuoteRequest):
+    """
+    Эндпоинт для сравнения предложений одного товара в разных магазинах
+
+    Параллельно собирает цену, наличие и стоимость доставки без оплаты,
+    возвращает предложения от самого дешевого доступного к худшему
+    """
+    try:
+        global ai_pay_service
+
+        if not ai_pay_service:
+            raise HTTPException(status_code=500, detail="Сервис автоматизации не инициализирован")
+
+        logger.info(f"Начинаю сравнение предложений для {len(request.product_urls)} ссылок")
+
+        quote_result = await ai_pay_service.compare_offers(
+            product_urls=[str(url) for url in request.product_urls],
+            quantity=request.quantity,
+            delivery_info=request.delivery_info.model_dump(),
+            max_concurrency=request.max_concurrency or config.QUOTE_MAX_CONCURRENCY,
+            deadline_seconds=request.deadline_seconds or config.QUOTE_DEADLINE_SECONDS,
+            target_total_price=request.target_total_price
+        )
+
+        response = QuoteResponse(**quote_result)
+        logger.info(f"Сравнение завершено. Лучшее предложение: "
+                    f"{response.best_offer.product_url if response.best_offer else 'не найдено'}")
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка в quote: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
 
 
-@app.get("/orders/{order_id}")
+@app.post("/watch", response_model=WatchResponse)
+async def watch_endpoint(request: WatchRequest):
+    """
+    Эндпоинт для добавления товаров в мониторинг цены и наличия
+
+    Проверки идут по HTTP без браузерного агента, изменения доступны в GET /watch
+    """
+    if not config.WATCH_ENABLED:
+        raise HTTPException(status_code=503, detail="Мониторинг цен отключен")
+
+    products = price_monitor.watch(
+        product_urls=[str(url) for url in request.product_urls],
+        interval_seconds=request.interval_seconds
+    )
+    return WatchResponse(products=products, total=len(price_monitor))
+
+
+@app.get("/watch", response_model=WatchResponse)
+async def list_watched(limit: int = 50, offset: int = 0, events_limit: int = 100):
+    """Отслеживаемые товары и последние изменения цен и наличия"""
+    return WatchResponse(
+        products=price_monitor.products(limit, offset),
+        events=price_monitor.recent_events(events_limit),
+        total=len(price_monitor)
+    )
+
+
+@app.get("/orders/{order_id}", response_class=ORJSONResponse)
 async def get_order_status(order_id: str):
     """Получить детальную информацию о заказе"""
     order_data = order_manager.get_order(order_id)
     if not order_data:
         raise HTTPException(status_code=404, detail="Заказ не найден")
 
-    return {
-        "order_id": order_id,
-        "status": order_data.get("status", "unknown"),
-        "created_at": order_data.get("created_at"),
-        "updated_at": order_data.get("updated_at"),
-        "checkout_data": order_data.get("checkout_response"),
-        "confirm_data": order_data.get("confirm_response")
-    }
+    # Ответ отдается напрямую, минуя jsonable_encoder: сохраненные данные уже в JSON
+    return ORJSONResponse(order_data.details())
 
 
-@app.get("/orders")
+@app.get("/orders", response_class=ORJSONResponse)
 async def list_orders(limit: int = 50, offset: int = 0):
     """Получить список всех заказов"""
-    orders = list(orders_storage.items())[offset:offset + limit]
-    return {
-        "orders": [
-            {
-                "order_id": order_id,
-                "status": data.get("status", "unknown"),
-                "created_at": data.get("created_at"),
-                "total_price": data.get("checkout_response", {}).get("total_price", 0)
-            }
-            for order_id, data in orders
-        ],
+    orders = islice(orders_storage.values(), offset, offset + limit)
+    return ORJSONResponse({
+        "orders": [order.summary() for order in orders],
         "total": len(orders_storage),
         "limit": limit,
         "offset": offset
-    }
+    })
+
+
+def _sse_message(event) -> bytes:
+    """Событие заказа в формате Server-Sent Events"""
+    if event is None:
+        return b": keep-alive\n\n"
+    data = orjson.dumps(event.data, default=str)
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event.id, event.type.encode(), data)
+
+
+@app.get("/orders/{order_id}/events")
+async def stream_order_events(order_id: str, last_event_id: Optional[int] = Header(None)):
+    """
+    Поток хода выполнения заказа (Server-Sent Events)
+
+    Этапы, шаги агента (url, цель, действия), промежуточные данные этапов и итоговый статус.
+    Сначала отдается накопленная история, поток закрывается событием finished.
+    При переподключении учитывается заголовок Last-Event-ID
+    """
+    if not order_manager.get_order(order_id):
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+
+    async def event_stream():
+        async for event in order_events.subscribe(order_id, last_event_id or 0,
+                                                  heartbeat=config.ORDER_EVENTS_HEARTBEAT_SECONDS):
+            yield _sse_message(event)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.websocket("/orders/{order_id}/ws")
+async def order_events_websocket(websocket: WebSocket, order_id: str, last_event_id: int = 0):
+    """Поток хода выполнения заказа через WebSocket (те же события, что и в /events)"""
+    if not order_manager.get_order(order_id):
+        await websocket.close(code=4404, reason="Заказ не найден")
+        return
+
+    await websocket.accept()
+    try:
+        async for event in order_events.subscribe(order_id, last_event_id,
+                                                  heartbeat=config.ORDER_EVENTS_HEARTBEAT_SECONDS):
+            if event is None:
+                await websocket.send_text('{"type": "keep-alive"}')
+            else:
+                await websocket.send_text(orjson.dumps(event.as_dict(), default=str).decode())
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.debug(f"Подписчик событий заказа {order_id} отключился")
 
 
 @app.delete("/orders/{order_id}")
 async def cancel_order(order_id: str):
-    """Отменить заказ"""
-    if order_id not in orders_storage:
+    """Отменить заказ
+
+    Если по заказу работает агент, он останавливается на границе следующего шага
+    и не переходит к оплате, а браузерный контекст заказа освобождается
+    """
+    order_data = order_manager.get_order(order_id)
+    if not order_data:
         raise HTTPException(status_code=404, detail="Заказ не найден")
+    if order_data.status == "confirmed":
+        raise HTTPException(status_code=409, detail=f"Заказ {order_id} уже оплачен, отмена невозможна")
+
+    cancellation = cancellation_registry.get(order_id)
+    stage = cancellation.cancel() if cancellation else None
+
+    order_manager.update_order_status(order_id, "cancelled", {"cancelled_at_stage": stage} if cancellation else None)
+    logger.info(f"Заказ {order_id} отменен" + (f" на этапе {stage}" if cancellation else ""))
+
+    return {
+        "message": f"Заказ {order_id} успешно отменен",
+        "agent_stopped": cancellation is not None,
+        "cancelled_at_stage": stage
+    }
 
-    order_manager.update_order_status(order_id, "cancelled")
-    logger.info(f"Заказ {order_id} отменен")
 
-    return {"message": f"Заказ {order_id} успешно отменен"}
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Доступ к диагностическим эндпоинтам только по ADMIN_TOKEN"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Диагностические эндпоинты отключены")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+
+
+@app.get("/admin/loop-lag", dependencies=[Depends(require_admin)])
+async def get_loop_lag():
+    """Гистограмма задержек event loop и число его остановок дольше порога"""
+    return loop_lag_monitor.snapshot()
+
+
+@app.get("/admin/dead-ends", dependencies=[Depends(require_admin)])
+async def get_dead_ends():
+    """Число досрочных остановок агента на тупиковых страницах по доменам и причинам"""
+    return dead_end_stats.snapshot()
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+async def get_profile(seconds: float = 10, mode: str = "wall", interval: float = 0.01):
+    """
+    Сэмплирующий профиль сервиса за seconds секунд
+
+    mode=wall - стеки всех потоков (видно блокирующий синхронный код),
+    mode=async - цепочки await задач asyncio. Ответ - свернутые стеки для flamegraph.pl/speedscope
+    """
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode должен быть одним из: {', '.join(PROFILE_MODES)}")
+    if not 0 < seconds <= config.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds должно быть от 0 до {config.PROFILE_MAX_SECONDS}")
+    if not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=400, detail="interval должен быть от 0.001 до 1")
+    if sampling_profiler.busy:
+        raise HTTPException(status_code=409, detail="Профилирование уже выполняется")
+
+    logger.info(f"Профилирование ({mode}) на {seconds} сек")
+    folded = await sampling_profiler.profile(seconds=seconds, interval=interval, mode=mode)
+    filename = f"profile-{mode}-{datetime.now():%Y%m%d-%H%M%S}.folded"
+    return PlainTextResponse(folded, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 @app.get("/health")
@@ -333,6 +579,10 @@ async def health_check():
         "timestamp": datetime.now(),
         "automation_ready": agent_factory is not None,
         "orders_count": len(orders_storage),
+        "running_orders_count": len(cancellation_registry),
+        "order_event_subscribers": order_events.subscribers_count(),
+        "event_loop_max_lag_seconds": round(loop_lag_monitor.max_lag, 6),
+        "agent_memory": memory_backend.stats(),
         "version": "2.0.0"
     }
 
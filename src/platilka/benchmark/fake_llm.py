@@ -0,0 +1,197 @@
+import asyncio
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from platilka.benchmark.fixture_shop import CATALOG, LAYOUTS
+
+_URL_PATTERN = re.compile(r"Current url:\s*(\S+)")
+_PRODUCT_URL_PATTERN = re.compile(r"https?://[^\s\"'<>]+/product/(\w+)")
+_QUANTITY_PATTERN = re.compile(r"(?:количество|quantity)[ \t:]*(\d+)", re.IGNORECASE)
+_ELEMENT_PATTERN = re.compile(r"\[(\d+)\]<(\w+)([^>]*)>([^\n]*)")
+_ORDER_NUMBER_PATTERN = re.compile(r"№\s*(\d+)")
+
+# Структура результата (по имени модели) и страница магазина, на которой агент ее возвращает
+DONE_PAGES = {
+    "ProductStageResult": "product",
+    "AddToCartStageResult": "cart",
+    "QuantityStageResult": "cart",
+    "DeliveryStageResult": "checkout",
+    "PaymentResult": "order",
+    "CartSnapshot": "checkout",
+}
+
+
+def _message_text(message: BaseMessage) -> str:
+    """Текст сообщения без картинок (при use_vision контент - список частей)"""
+    if isinstance(message.content, str):
+        return message.content
+    return "\n".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Скриптовая модель для AgentFactory: проходит локальный магазин по фиксированному сценарию
+
+    Решение принимается по текущему url и интерактивным элементам из последнего сообщения
+    браузерного агента, поэтому один экземпляр можно делить между параллельными агентами.
+    Агент должен работать с tool_calling_method="raw"
+    """
+
+    latency: float = 0.0
+    _verified_api_keys: bool = PrivateAttr(default=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._to_result(self.respond(messages))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._to_result(self.respond(messages))
+
+    @staticmethod
+    def _to_result(content: str) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def respond(self, messages: List[BaseMessage]) -> str:
+        """Следующее действие агента в формате AgentOutput"""
+        texts = [_message_text(message) for message in messages]
+        conversation, state = "\n".join(texts), texts[-1]
+
+        if "capital of France" in state:
+            return "Paris"
+
+        url_match = _URL_PATTERN.search(state)
+        product_match = _PRODUCT_URL_PATTERN.search(conversation)
+        quantity_match = _QUANTITY_PATTERN.search(conversation)
+        url = url_match.group(1) if url_match else ""
+        quantity = int(quantity_match.group(1)) if quantity_match else 1
+        page = next((name for name in ("product", "cart", "checkout", "order") if f"/{name}" in url), None)
+
+        # Какую структуру ждет действие done, видно по описанию действий в системном промпте
+        output_model = next((name for name in DONE_PAGES if name in texts[0]), None)
+
+        if output_model and page == DONE_PAGES[output_model]:
+            data = self._summary(url, state, product_match, quantity, output_model)
+            actions = []
+            if output_model == "DeliveryStageResult":
+                address_input = self._find_element(state, "input", 'name="address"')
+                if address_input is not None:
+                    actions.append({"input_text": {"index": address_input, "text": "Москва, ул. Тестовая, 1"}})
+            return self._action("Завершаю этап", actions + [{"done": {"success": True, "data": data}}])
+
+        if page == "product":
+            quantity_input = self._find_element(state, "input", 'name="quantity"', 'type="number"')
+            add_button = self._find_element(state, "button", *(layout.add_to_cart_label for layout in LAYOUTS.values()))
+            if quantity_input is None or add_button is None:
+                return self._fail("Не найдена кнопка добавления в корзину")
+            return self._action("Добавляю товар в корзину", [
+                {"input_text": {"index": quantity_input, "text": str(quantity)}},
+                {"click_element_by_index": {"index": add_button}},
+            ])
+
+        if page == "cart":
+            checkout_link = self._find_element(state, "a", *(layout.checkout_label for layout in LAYOUTS.values()))
+            if checkout_link is None:
+                return self._fail("Корзина пуста")
+            return self._action("Перехожу к оформлению", [{"click_element_by_index": {"index": checkout_link}}])
+
+        if page == "checkout" and output_model == "PaymentResult":
+            actions = []
+            for attribute, value in (("address", "Москва, ул. Тестовая, 1"), ("phone", "phone_number"),
+                                     ("card_number", "card_number"), ("card_cvv", "card_cvv")):
+                index = self._find_element(state, "input", f'name="{attribute}"')
+                if index is not None:
+                    actions.append({"input_text": {"index": index, "text": value}})
+            pay_button = self._find_element(state, "button", *(layout.pay_label for layout in LAYOUTS.values()))
+            if pay_button is None:
+                return self._fail("Не найдена кнопка оплаты")
+            actions.append({"click_element_by_index": {"index": pay_button}})
+            return self._action("Заполняю форму и оплачиваю", actions)
+
+        if page is None and product_match:
+            return self._action("Открываю страницу товара", [{"go_to_url": {"url": product_match.group(0)}}])
+        return self._fail(f"Неожиданная страница {url}")
+
+    @staticmethod
+    def _find_element(state: str, tag: str, *needles: str) -> Optional[int]:
+        """Индекс первого интерактивного элемента с тегом tag, содержащего одну из подстрок"""
+        for match in _ELEMENT_PATTERN.finditer(state):
+            index, element_tag, attributes, text = match.groups()
+            if element_tag.lower() != tag:
+                continue
+            haystack = f"{attributes} {text}".lower()
+            if any(needle.lower() in haystack for needle in needles):
+                return int(index)
+        return None
+
+    @staticmethod
+    def _summary(url: str, state: str, product_match: Optional[re.Match], quantity: int,
+                 output_model: str) -> Dict[str, Any]:
+        """Значения, которые агент "прочитал бы" со страницы локального магазина"""
+        if output_model == "PaymentResult":
+            order_match = _ORDER_NUMBER_PATTERN.search(state)
+            order_number = order_match.group(1) if order_match else None
+            return {"payment_success": True, "order_number": order_number,
+                    "payment_confirmation": f"Заказ №{order_number} оплачен"}
+        if output_model == "AddToCartStageResult":
+            return {"added_to_cart": True}
+
+        layout_name = url.split("://", 1)[-1].split("/")[1] if "://" in url else ""
+        layout = LAYOUTS.get(layout_name, LAYOUTS["classic"])
+        product = CATALOG.get(product_match.group(1)) if product_match else None
+        if product is None:
+            return {"error_message": "Товар не найден"}
+
+        quantity = min(quantity, product.stock)
+        subtotal = product.price * quantity
+        summaries = {
+            "ProductStageResult": {
+                "product_name": product.name,
+                "product_price": layout.format_price(product.price),
+                "availability_status": "в наличии",
+                "max_available_quantity": product.stock,
+            },
+            "QuantityStageResult": {
+                "actual_quantity": quantity,
+                "max_available_quantity": product.stock,
+                "subtotal": layout.format_price(subtotal),
+            },
+            "DeliveryStageResult": {
+                "delivery_method": layout.delivery_method,
+                "delivery_cost": layout.format_price(layout.delivery_cost),
+                "total_price": layout.format_price(subtotal + layout.delivery_cost),
+            },
+            "CartSnapshot": {
+                "product_name": product.name,
+                "quantity": quantity,
+                "product_price": layout.format_price(product.price),
+                "delivery_method": layout.delivery_method,
+                "delivery_cost": layout.format_price(layout.delivery_cost),
+                "total_price": layout.format_price(subtotal + layout.delivery_cost),
+            },
+        }
+        return summaries[output_model]
+
+    @staticmethod
+    def _action(next_goal: str, actions: List[Dict[str, Any]]) -> str:
+        return json.dumps({
+            "current_state": {"evaluation_previous_goal": "Success", "memory": "", "next_goal": next_goal},
+            "action": actions,
+        }, ensure_ascii=False)
+
+    def _fail(self, message: str) -> str:
+        return self._action(message, [{"done": {"success": False, "data": {"error_message": message}}}])
@@ -0,0 +1,238 @@
+import asyncio
+import html
+import itertools
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse
+
+
+@dataclass(frozen=True)
+class FixtureProduct:
+    """Товар локального магазина"""
+    sku: str
+    name: str
+    price: float
+    stock: int
+
+
+@dataclass(frozen=True)
+class ShopLayout:
+    """Вариант верстки магазина"""
+    name: str
+    product_template: str
+    add_to_cart_label: str
+    cart_label: str
+    checkout_label: str
+    pay_label: str
+    delivery_method: str
+    delivery_cost: float
+
+    def format_price(self, price: float) -> str:
+        """Цена в формате, принятом в этой верстке"""
+        if self.name == "marketplace":
+            return f"{price:,.0f} ₽".replace(",", " ")
+        if self.name == "minimal":
+            return f"{price:.2f} RUB"
+        return f"{price:,.2f}".replace(",", " ").replace(".", ",") + " руб."
+
+
+CATALOG: Dict[str, FixtureProduct] = {
+    product.sku: product for product in (
+        FixtureProduct("1001", "Настольная игра «Каркассон»", 2490.0, 12),
+        FixtureProduct("1002", "Шины Hankook K127A Ventus S1 Evo3 315/40 R21", 34970.0, 10),
+        FixtureProduct("1003", "Сыр пармезан 24 мес., 200 г", 899.9, 40),
+        FixtureProduct("1004", "Крем для лица увлажняющий, 50 мл", 1299.0, 3),
+    )
+}
+
+# Типичные варианты страниц товара: классический магазин, маркетплейс и минималистичная верстка
+LAYOUTS: Dict[str, ShopLayout] = {
+    "classic": ShopLayout(
+        name="classic",
+        product_template="""
+            <h1 class="product-title">{name}</h1>
+            <div class="product-price"><span class="price-value">{price}</span></div>
+            <div class="stock">В наличии: осталось {stock} шт.</div>
+            {form}
+        """,
+        add_to_cart_label="Добавить в корзину",
+        cart_label="Корзина",
+        checkout_label="Оформить заказ",
+        pay_label="Оплатить",
+        delivery_method="Курьерская доставка",
+        delivery_cost=300.0,
+    ),
+    "marketplace": ShopLayout(
+        name="marketplace",
+        product_template="""
+            <div class="card">
+              <div class="item-name">{name}</div>
+              <div class="money-amount" data-price>{price}</div>
+              <div class="badge">В наличии</div>
+              {form}
+            </div>
+        """,
+        add_to_cart_label="В корзину",
+        cart_label="Перейти в корзину",
+        checkout_label="Перейти к оформлению",
+        pay_label="Оплатить заказ",
+        delivery_method="Пункт выдачи",
+        delivery_cost=0.0,
+    ),
+    "minimal": ShopLayout(
+        name="minimal",
+        product_template="""
+            <main><h2>{name}</h2><p>{price}</p><p>In stock: {stock}</p>{form}</main>
+        """,
+        add_to_cart_label="Add to cart",
+        cart_label="Cart",
+        checkout_label="Checkout",
+        pay_label="Pay",
+        delivery_method="Курьерская доставка",
+        delivery_cost=490.0,
+    ),
+}
+
+CART_COOKIE = "fixture_cart"
+
+
+def _page(title: str, body: str) -> HTMLResponse:
+    """Простая HTML-страница"""
+    return HTMLResponse(
+        f"<!doctype html><html lang='ru'><head><meta charset='utf-8'><title>{html.escape(title)}</title></head>"
+        f"<body>{body}</body></html>"
+    )
+
+
+def _get_layout(layout: str) -> ShopLayout:
+    if layout not in LAYOUTS:
+        raise HTTPException(status_code=404, detail="Верстка не найдена")
+    return LAYOUTS[layout]
+
+
+def _parse_cart(request: Request) -> Optional[tuple]:
+    """Корзина хранится в cookie в виде "sku:количество" """
+    raw_cart = request.cookies.get(CART_COOKIE, "")
+    sku, _, quantity = raw_cart.partition(":")
+    if sku not in CATALOG or not quantity.isdigit():
+        return None
+    return CATALOG[sku], int(quantity)
+
+
+def create_fixture_shop(latency: float = 0.0) -> FastAPI:
+    """Локальный магазин для нагрузочного тестирования без обращения к реальным сайтам
+
+    latency - искусственная задержка ответа сервера в секундах
+    """
+    shop = FastAPI(title="Fixture shop")
+    order_numbers = itertools.count(100000)
+
+    @shop.middleware("http")
+    async def simulate_latency(request: Request, call_next):
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @shop.get("/{layout}/product/{sku}")
+    async def product_page(layout: str, sku: str):
+        shop_layout = _get_layout(layout)
+        product = CATALOG.get(sku)
+        if not product:
+            return _page("404", "<h1>Страница не найдена</h1>")
+
+        form = f"""
+            <form method="post" action="/{layout}/cart/add">
+              <input type="hidden" name="sku" value="{product.sku}">
+              <label>Количество <input type="number" name="quantity" value="1" min="1" max="{product.stock}"></label>
+              <button type="submit">{shop_layout.add_to_cart_label}</button>
+            </form>
+            <a href="/{layout}/cart">{shop_layout.cart_label}</a>
+        """
+        return _page(product.name, shop_layout.product_template.format(
+            name=html.escape(product.name),
+            price=shop_layout.format_price(product.price),
+            stock=product.stock,
+            form=form,
+        ))
+
+    @shop.post("/{layout}/cart/add")
+    async def add_to_cart(layout: str, request: Request):
+        _get_layout(layout)
+        form = parse_qs((await request.body()).decode())
+        sku = form.get("sku", [""])[0]
+        if sku not in CATALOG:
+            raise HTTPException(status_code=404, detail="Товар не найден")
+
+        quantity = form.get("quantity", ["1"])[0]
+        quantity = min(int(quantity) if quantity.isdigit() else 1, CATALOG[sku].stock)
+        response = RedirectResponse(f"/{layout}/cart", status_code=303)
+        response.set_cookie(CART_COOKIE, f"{sku}:{max(quantity, 1)}")
+        return response
+
+    @shop.get("/{layout}/cart")
+    async def cart_page(layout: str, request: Request):
+        shop_layout = _get_layout(layout)
+        cart = _parse_cart(request)
+        if not cart:
+            return _page("Корзина", "<h1>Корзина пуста</h1>")
+
+        product, quantity = cart
+        return _page("Корзина", f"""
+            <h1>Корзина</h1>
+            <div class="cart-item">
+              <span class="item-name">{html.escape(product.name)}</span>
+              <span class="qty">{quantity} шт.</span>
+              <span class="price">{shop_layout.format_price(product.price)}</span>
+            </div>
+            <div class="subtotal">Товары: {shop_layout.format_price(product.price * quantity)}</div>
+            <a href="/{layout}/checkout">{shop_layout.checkout_label}</a>
+        """)
+
+    @shop.get("/{layout}/checkout")
+    async def checkout_page(layout: str, request: Request):
+        shop_layout = _get_layout(layout)
+        cart = _parse_cart(request)
+        if not cart:
+            return RedirectResponse(f"/{layout}/cart", status_code=303)
+
+        product, quantity = cart
+        total = product.price * quantity + shop_layout.delivery_cost
+        return _page("Оформление заказа", f"""
+            <h1>Оформление заказа</h1>
+            <div class="summary">
+              <div>{html.escape(product.name)} × {quantity}</div>
+              <div>Доставка ({shop_layout.delivery_method}): {shop_layout.format_price(shop_layout.delivery_cost)}</div>
+              <div>Итого: {shop_layout.format_price(total)}</div>
+            </div>
+            <form method="post" action="/{layout}/checkout">
+              <select name="delivery_method"><option>{shop_layout.delivery_method}</option></select>
+              <input name="address" placeholder="Адрес доставки">
+              <input name="phone" placeholder="Телефон">
+              <input name="card_number" placeholder="Номер карты">
+              <input name="card_cvv" placeholder="CVV">
+              <button type="submit">{shop_layout.pay_label}</button>
+            </form>
+        """)
+
+    @shop.post("/{layout}/checkout")
+    async def place_order(layout: str, request: Request):
+        _get_layout(layout)
+        if not _parse_cart(request):
+            return RedirectResponse(f"/{layout}/cart", status_code=303)
+
+        response = RedirectResponse(f"/{layout}/order/{next(order_numbers)}", status_code=303)
+        response.delete_cookie(CART_COOKIE)
+        return response
+
+    @shop.get("/{layout}/order/{order_number}")
+    async def order_page(layout: str, order_number: str):
+        _get_layout(layout)
+        return _page("Заказ оформлен", f"""
+            <h1>Спасибо!</h1>
+            <a href="/{layout}/order/{order_number}">Заказ №{order_number} оплачен</a>
+        """)
+
+    return shop
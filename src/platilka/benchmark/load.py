@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import socket
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from platilka.agent.agent_factory import AgentFactory
+from platilka.agent.ai_pay_service import AIPayService
+from platilka.api import api
+from platilka.benchmark.fake_llm import ScriptedChatModel
+from platilka.benchmark.fixture_shop import CATALOG, LAYOUTS, create_fixture_shop
+from platilka.core.logging import logger
+from platilka.core.order_manager import order_manager
+
+DEFAULT_BASELINE_DIR = Path("benchmark_baselines")
+# Модель агента: scripted - скриптовая (не читает промпт, для пропускной способности и размера промптов),
+# real - настоящая LLM сервиса (для качества: доля успешных заказов и число шагов)
+LLM_MODES = ("scripted", "real")
+
+# Метрики, по которым сравниваем с сохраненным базовым прогоном (True - чем больше, тем лучше)
+COMPARED_METRICS = {
+    "throughput_orders_per_sec": True,
+    "latency.checkout.p50": False,
+    "latency.checkout.p95": False,
+    "latency.checkout.p99": False,
+    "latency.confirm.p50": False,
+    "latency.confirm.p95": False,
+    "latency.confirm.p99": False,
+    "steps_per_order": False,
+    "tokens_per_order": False,
+    "checkout_wait_seconds_per_order": False,
+    "peak_rss_mb.service": False,
+}
+
+
+class FixtureShopServer:
+    """Локальный магазин, запущенный в отдельном потоке"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1"):
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            self.port = sock.getsockname()[1]
+        self.host = host
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_stats(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Пиковый RSS сервиса и завершившихся дочерних процессов (браузера) в МБ"""
+    return {
+        "service": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+async def run_load(orders: int, concurrency: int, confirm: bool, layouts: List[str],
+                   llm_latency: float = 0.0, shop_latency: float = 0.0,
+                   prompt_variant: Optional[str] = None, llm: str = "scripted") -> Dict[str, Any]:
+    """Конкурентная нагрузка /checkout (и /confirm) на сервис с локальным магазином
+
+    llm=scripted - скриптовая модель, llm=real - настоящая LLM сервиса (нужен GROQ_API_KEY)
+    """
+    if llm not in LLM_MODES:
+        raise ValueError(f"llm должен быть одним из: {', '.join(LLM_MODES)}")
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    if llm == "real" and not groq_api_key:
+        raise ValueError("Для прогона с настоящей LLM нужен GROQ_API_KEY")
+
+    shop = FixtureShopServer(create_fixture_shop(latency=shop_latency))
+    shop.start()
+
+    if llm == "real":
+        factory = AgentFactory(groq_api_key, allowed_domains=[shop.host])
+    else:
+        factory = AgentFactory(
+            llm=ScriptedChatModel(latency=llm_latency),
+            allowed_domains=[shop.host],
+            tool_calling_method="raw",
+        )
+    api.agent_factory = factory
+    api.ai_pay_service = AIPayService(factory)
+
+    skus = list(CATALOG)
+    semaphore = asyncio.Semaphore(concurrency)
+    checkout_latencies: List[float] = []
+    confirm_latencies: List[float] = []
+    steps: List[int] = []
+    tokens: List[int] = []
+    wait_seconds: List[float] = []
+    failures: Dict[str, int] = {"checkout": 0, "confirm": 0}
+
+    async def run_order(client: httpx.AsyncClient, number: int):
+        layout = layouts[number % len(layouts)]
+        product_url = f"{shop.base_url}/{layout}/product/{skus[number % len(skus)]}"
+        quantity = 1 + number % 2
+        delivery_info = {"address": "Москва, ул. Тестовая, 1", "delivery_method": LAYOUTS[layout].delivery_method}
+
+        async with semaphore:
+            started_at = time.perf_counter()
+            response = await client.post("/checkout", json={
+                "product_url": product_url,
+                "quantity": quantity,
+                "delivery_info": delivery_info,
+                "prompt_variant": prompt_variant,
+            })
+            checkout_latencies.append(time.perf_counter() - started_at)
+            if response.status_code != 200:
+                failures["checkout"] += 1
+                return
+
+            checkout = response.json()
+            checkout_raw_data = order_manager.get_order(checkout["order_id"]).load("checkout_result")
+            order_steps = checkout_raw_data.get("agent_steps", 0)
+            order_tokens = checkout_raw_data.get("input_tokens", 0)
+            wait_seconds.append(checkout_raw_data.get("wait_seconds", 0.0))
+            if confirm:
+                started_at = time.perf_counter()
+                response = await client.post("/confirm", json={
+                    "product_url": product_url,
+                    "quantity": quantity,
+                    "delivery_info": delivery_info,
+                    "order_id": checkout["order_id"],
+                    "product": checkout["product"],
+                    "delivery": checkout["delivery"],
+                    "total_price": checkout["total_price"],
+                })
+                confirm_latencies.append(time.perf_counter() - started_at)
+                if response.status_code != 200 or not response.json().get("success"):
+                    failures["confirm"] += 1
+                confirm_raw_data = order_manager.get_order(checkout["order_id"]).load("confirm_result")
+                order_steps += confirm_raw_data.get("agent_steps", 0)
+                order_tokens += confirm_raw_data.get("input_tokens", 0)
+            steps.append(order_steps)
+            tokens.append(order_tokens)
+
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            started_at = time.perf_counter()
+            await asyncio.gather(*(run_order(client, number) for number in range(orders)))
+            elapsed = time.perf_counter() - started_at
+    finally:
+        await factory.cleanup()
+        shop.stop()
+
+    succeeded = orders - failures["checkout"] - failures["confirm"]
+    return {
+        "orders": orders,
+        "concurrency": concurrency,
+        "confirm": confirm,
+        "layouts": layouts,
+        "llm_latency": llm_latency,
+        "shop_latency": shop_latency,
+        "prompt_variant": prompt_variant,
+        "llm": llm,
+        "elapsed_seconds": elapsed,
+        "throughput_orders_per_sec": orders / elapsed if elapsed else 0.0,
+        "success_rate": succeeded / orders if orders else 0.0,
+        "failures": failures,
+        "latency": {"checkout": latency_stats(checkout_latencies), "confirm": latency_stats(confirm_latencies)},
+        "steps_per_order": statistics.fmean(steps) if steps else 0.0,
+        "tokens_per_order": statistics.fmean(tokens) if tokens else 0.0,
+        "checkout_wait_seconds_per_order": statistics.fmean(wait_seconds) if wait_seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _get_metric(report: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Изменение метрик относительно базового прогона в процентах (положительное - улучшение)"""
+    comparison = {}
+    for path, higher_is_better in COMPARED_METRICS.items():
+        current, previous = _get_metric(report, path), _get_metric(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous * 100
+        comparison[path] = {
+            "baseline": previous,
+            "current": current,
+            "improvement_percent": change if higher_is_better else -change,
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн нагрузочный тест сервиса на локальном магазине")
+    parser.add_argument("--orders", type=int, default=20, help="Количество заказов")
+    parser.add_argument("--concurrency", type=int, default=4, help="Одновременных заказов")
+    parser.add_argument("--confirm", action="store_true", help="Подтверждать заказы через /confirm")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="Верстки магазина через запятую")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Задержка ответа модели, сек")
+    parser.add_argument("--shop-latency", type=float, default=0.0, help="Задержка ответа магазина, сек")
+    parser.add_argument("--prompt-variant", help="Вариант промптов агента")
+    parser.add_argument("--llm", choices=LLM_MODES, default="scripted",
+                        help="Модель агента: скриптовая или настоящая LLM сервиса")
+    parser.add_argument("--baseline-dir", type=Path, default=DEFAULT_BASELINE_DIR, help="Каталог базовых прогонов")
+    parser.add_argument("--save-baseline", help="Сохранить результат как базовый прогон с этим именем")
+    parser.add_argument("--compare", help="Сравнить с сохраненным базовым прогоном")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(
+        orders=args.orders,
+        concurrency=args.concurrency,
+        confirm=args.confirm,
+        layouts=args.layouts.split(","),
+        llm_latency=args.llm_latency,
+        shop_latency=args.shop_latency,
+        prompt_variant=args.prompt_variant,
+        llm=args.llm,
+    ))
+
+    if args.compare:
+        baseline = json.loads((args.baseline_dir / f"{args.compare}.json").read_text(encoding="utf-8"))
+        report["comparison"] = compare_with_baseline(report, baseline)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        args.baseline_dir.mkdir(parents=True, exist_ok=True)
+        baseline_path = args.baseline_dir / f"{args.save_baseline}.json"
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info(f"Базовый прогон сохранен в {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
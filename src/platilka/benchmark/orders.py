@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, Callable
+
+import httpx
+
+from platilka.api import api
+from platilka.core.order_manager import orders_storage, OrderRecord
+from platilka.models.checkout.checkout_request import CheckoutRequest
+from platilka.models.checkout.checkout_response import CheckoutResponse
+from platilka.models.common import ProductInfo, DeliveryDetails
+
+
+def sample_order(number: int) -> Dict[str, Any]:
+    """Запрос, ответ и сырой результат агента типичного размера для одного заказа"""
+    request = CheckoutRequest(
+        product_url=f"https://shop.example.ru/product/{number}",
+        quantity=1 + number % 3,
+        delivery_info={"address": "Москва, ул. Тестовая, 1", "delivery_method": "Курьерская доставка"},
+    )
+    response = CheckoutResponse(
+        order_id=f"order_{number}",
+        success=True,
+        product=ProductInfo(name=f"Товар {number}", price=1299.9, quantity=request.quantity,
+                            availability=True, currency="RUB"),
+        delivery=DeliveryDetails(cost=300.0, estimated_date="Завтра", method="Курьерская доставка"),
+        subtotal=1299.9 * request.quantity,
+        total_price=1299.9 * request.quantity + 300.0,
+        availability_status="в наличии",
+    )
+    checkpoints = [
+        {"stage": stage, "url": f"https://shop.example.ru/{stage}", "created_at": datetime.now().isoformat()}
+        for stage in ("product", "add_to_cart", "quantity", "delivery", "payment")
+    ]
+    result = {
+        "success": True, "product_name": response.product.name, "product_price": 1299.9,
+        "requested_quantity": request.quantity, "actual_quantity": request.quantity,
+        "delivery_cost": 300.0, "total_price": response.total_price, "agent_steps": 24,
+        "input_tokens": 52000, "wait_seconds": 3.5, "checkpoints": checkpoints, "retries": [],
+    }
+    return {"request": request, "response": response, "result": result}
+
+
+def store_legacy(order_id: str, sample: Dict[str, Any]) -> Dict[str, Any]:
+    """Прежнее представление заказа: вложенные словари с дублями данных"""
+    return {
+        "checkout_request": sample["request"].model_dump(),
+        "status": "checkout_completed",
+        "checkout_response": sample["response"].model_dump(),
+        "checkout_raw_data": dict(sample["result"]),
+        "checkpoints": list(sample["result"]["checkpoints"]),
+        "retries": list(sample["result"]["retries"]),
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+    }
+
+
+def store_compact(order_id: str, sample: Dict[str, Any]) -> OrderRecord:
+    """Текущее представление заказа
+
+    Запись собирается напрямую, без order_manager: история событий статуса в шине
+    не должна попадать в замер памяти хранилища
+    """
+    now = time.time()
+    record = OrderRecord(order_id=order_id, status=sys.intern("checkout_completed"), created_at=now, updated_at=now)
+    record.update({
+        "checkout_request": sample["request"],
+        "checkout_response": sample["response"],
+        "checkout_result": sample["result"],
+        "total_price": sample["response"].total_price,
+    })
+    orders_storage[order_id] = record
+    return record
+
+
+def memory_per_order(orders: int, store: Callable[[str, Dict[str, Any]], Any]) -> float:
+    """Прирост памяти Python на один сохраненный заказ, байт"""
+    samples = [sample_order(number) for number in range(100)]
+    kept = {}
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for number in range(orders):
+        order_id = f"order_{number:08d}"
+        kept[order_id] = store(order_id, samples[number % len(samples)])
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return allocated / orders
+
+
+async def list_throughput(requests: int, limit: int, concurrency: int) -> Dict[str, float]:
+    """Запросов в секунду к GET /orders и GET /orders/{id} при заполненном хранилище"""
+    order_ids = list(orders_storage)
+    transport = httpx.ASGITransport(app=api.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name, make_url in (
+            ("list", lambda: f"/orders?limit={limit}&offset={random.randrange(len(order_ids))}"),
+            ("details", lambda: f"/orders/{random.choice(order_ids)}"),
+        ):
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def call():
+                async with semaphore:
+                    response = await client.get(make_url())
+                    response.raise_for_status()
+
+            started_at = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(requests)))
+            results[f"{name}_requests_per_sec"] = requests / (time.perf_counter() - started_at)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на заказ и пропускная способность эндпоинтов заказов")
+    parser.add_argument("--orders", type=int, default=100_000, help="Заказов в хранилище")
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов к каждому эндпоинту")
+    parser.add_argument("--limit", type=int, default=50, help="Размер страницы списка")
+    parser.add_argument("--concurrency", type=int, default=16, help="Одновременных запросов")
+    args = parser.parse_args()
+
+    legacy_bytes = memory_per_order(args.orders, store_legacy)
+    orders_storage.clear()
+    compact_bytes = memory_per_order(args.orders, store_compact)
+
+    report = {
+        "orders": args.orders,
+        "memory_per_order_bytes": {"legacy": round(legacy_bytes), "compact": round(compact_bytes)},
+        **asyncio.run(list_throughput(args.requests, args.limit, args.concurrency)),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from platilka.agent.checkout_stages import get_stages
+from platilka.agent.prompt_variants import PROMPT_VARIANTS, get_variant, estimate_tokens
+from platilka.benchmark.fixture_shop import LAYOUTS
+from platilka.benchmark.load import run_load, LLM_MODES
+from platilka.core.logging import logger
+
+# Подстановки для оценки длины промптов без запуска агента
+SAMPLE_CONTEXT = {
+    "product_url": "https://shop.example.ru/product/12345",
+    "quantity": 2,
+    "delivery_method": "Курьерская доставка",
+    "address": "Москва, ул. Тестовая, 1",
+    "preferred_date": "Ближайшая доступная",
+    "notes": "",
+    "payment_method": "card",
+}
+
+
+def prompt_tokens(variant_name: str) -> Dict[str, int]:
+    """Размер промптов варианта в токенах: этапы оформления, сбор корзины и оплата"""
+    variant = get_variant(variant_name)
+    checkout = sum(estimate_tokens(stage.render(SAMPLE_CONTEXT, variant=variant)) for stage in get_stages())
+    return {
+        "checkout": checkout,
+        "cart_snapshot": estimate_tokens(variant.cart_snapshot.format(**SAMPLE_CONTEXT)),
+        "payment": estimate_tokens(variant.payment.format(**SAMPLE_CONTEXT)),
+    }
+
+
+async def evaluate_variants(variants: List[str], orders: int, concurrency: int, confirm: bool,
+                            layouts: List[str], llm_latency: float = 0.0,
+                            shop_latency: float = 0.0, llm: str = "real") -> Dict[str, Dict[str, Any]]:
+    """Прогон одинаковой нагрузки на локальном магазине для каждого варианта промптов
+
+    Качество (доля успешных заказов, шаги) измеряется только с настоящей LLM: скриптовая модель
+    проходит магазин одинаково при любом промпте и дает лишь базовую линию по токенам
+    """
+    results = {}
+    for variant in variants:
+        logger.info(f"Оцениваю вариант промптов {variant} (llm={llm})")
+        report = await run_load(
+            orders=orders,
+            concurrency=concurrency,
+            confirm=confirm,
+            layouts=layouts,
+            llm_latency=llm_latency,
+            shop_latency=shop_latency,
+            prompt_variant=variant,
+            llm=llm,
+        )
+        result = {
+            "description": PROMPT_VARIANTS[variant].description,
+            "llm": llm,
+            "tokens_per_order": report["tokens_per_order"],
+            "prompt_tokens": prompt_tokens(variant),
+        }
+        if llm == "real":
+            result.update({
+                "success_rate": report["success_rate"],
+                "steps_per_order": report["steps_per_order"],
+                "wall_seconds_per_order": report["latency"]["checkout"]["mean"]
+                                          + report["latency"]["confirm"]["mean"],
+                "latency": report["latency"],
+            })
+        results[variant] = result
+    return results
+
+
+def recommend(results: Dict[str, Dict[str, Any]], min_success_rate: float) -> Optional[str]:
+    """Самый дешевый по токенам вариант, сохранивший долю успешных заказов (только для прогона с настоящей LLM)"""
+    eligible = [name for name, result in results.items()
+                if result.get("success_rate") is not None and result["success_rate"] >= min_success_rate]
+    return min(eligible, key=lambda name: (results[name]["tokens_per_order"],
+                                           results[name]["wall_seconds_per_order"]), default=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн сравнение вариантов промптов на локальном магазине")
+    parser.add_argument("--variants", default=",".join(PROMPT_VARIANTS), help="Варианты промптов через запятую")
+    parser.add_argument("--orders", type=int, default=20, help="Заказов на вариант")
+    parser.add_argument("--concurrency", type=int, default=4, help="Одновременных заказов")
+    parser.add_argument("--confirm", action="store_true", help="Подтверждать заказы через /confirm")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="Верстки магазина через запятую")
+    parser.add_argument("--llm", choices=LLM_MODES, default="real",
+                        help="real - качество на настоящей LLM, scripted - только базовая линия по токенам")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Задержка ответа скриптовой модели, сек")
+    parser.add_argument("--shop-latency", type=float, default=0.0, help="Задержка ответа магазина, сек")
+    parser.add_argument("--min-success-rate", type=float, default=0.95,
+                        help="Минимальная доля успешных заказов для рекомендации")
+    parser.add_argument("--output", type=Path, help="Сохранить отчет в файл")
+    args = parser.parse_args()
+
+    variants = args.variants.split(",")
+    for variant in variants:
+        get_variant(variant)
+
+    results = asyncio.run(evaluate_variants(
+        variants=variants,
+        orders=args.orders,
+        concurrency=args.concurrency,
+        confirm=args.confirm,
+        layouts=args.layouts.split(","),
+        llm_latency=args.llm_latency,
+        shop_latency=args.shop_latency,
+        llm=args.llm,
+    ))
+    report = {"variants": results, "recommended": recommend(results, args.min_success_rate)}
+    if args.llm == "scripted":
+        logger.warning("Скриптовая модель не проверяет качество вариантов, рекомендация не выдается")
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info(f"Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Dict, Optional, Any
+
+from loguru import logger
+
+from platilka.core.order_events import order_events, describe_step
+from platilka.exceptions.core_exceptions import OrderCancelled, OrderAlreadyRunning
+
+
+class CancellationHandle:
+    """Дескриптор выполняющегося заказа: позволяет остановить агента на границе шага"""
+
+    def __init__(self, order_id: str, publish_events: bool = True):
+        self.order_id = order_id
+        # Без событий - для запусков, на которые никто не подписывается (сбор предложений /quote)
+        self.publish_events = publish_events
+        self.cancelled = False
+        self.cancelled_at: Optional[str] = None
+        self.stage: Optional[str] = None
+        self.agent: Optional[Any] = None
+
+    def set_stage(self, stage: str):
+        """Запоминает этап, на котором сейчас находится заказ"""
+        self.stage = stage
+        self.publish("stage_started")
+
+    def publish(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        """Событие хода выполнения заказа для подписчиков /orders/{id}/events"""
+        if not self.publish_events:
+            return
+        order_events.publish(self.order_id, event_type, {"stage": self.stage, **(data or {})})
+
+    def attach_agent(self, agent: Any):
+        """Привязывает агента текущего этапа; если заказ уже отменен - сразу останавливает его"""
+        self.agent = agent
+        if self.cancelled:
+            agent.stop()
+
+    def cancel(self) -> Optional[str]:
+        """Отмена заказа: агент остановится перед выполнением действий следующего шага"""
+        if not self.cancelled:
+            self.cancelled = True
+            self.cancelled_at = datetime.now().isoformat()
+            if self.agent:
+                self.agent.stop()
+            logger.info(f"Заказ {self.order_id} отменяется на этапе {self.stage}")
+        return self.stage
+
+    def raise_if_cancelled(self):
+        """Прерывает обработку заказа, если он отменен"""
+        if self.cancelled:
+            raise OrderCancelled(self.stage)
+
+    async def on_step(self, state: Any, model_output: Any, step: int):
+        """Колбэк нового шага агента: вызывается до выполнения действий шага
+
+        InterruptedError browser-use обрабатывает как остановку, поэтому действия шага,
+        в том числе оплата, после отмены уже не выполняются
+        """
+        if self.cancelled:
+            raise InterruptedError(f"Заказ {self.order_id} отменен")
+        self.publish("step", describe_step(state, model_output, step))
+
+
+class CancellationRegistry:
+    """Реестр выполняющихся заказов"""
+
+    def __init__(self):
+        self._handles: Dict[str, CancellationHandle] = {}
+
+    def register(self, order_id: str) -> CancellationHandle:
+        """Регистрация заказа перед запуском агента
+
+        Второй запуск по тому же заказу не регистрируется: иначе он подменил бы дескриптор первого,
+        и отмена перестала бы останавливать первый запуск
+        """
+        if order_id in self._handles:
+            raise OrderAlreadyRunning(order_id)
+        handle = CancellationHandle(order_id)
+        self._handles[order_id] = handle
+        return handle
+
+    def get(self, order_id: str) -> Optional[CancellationHandle]:
+        """Дескриптор выполняющегося заказа"""
+        return self._handles.get(order_id)
+
+    def release(self, order_id: str, handle: Optional[CancellationHandle] = None):
+        """Удаление заказа из реестра после завершения работы агента (только своего дескриптора)"""
+        if handle is None or self._handles.get(order_id) is handle:
+            self._handles.pop(order_id, None)
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+
+cancellation_registry = CancellationRegistry()
@@ -13,6 +13,9 @@ class Config:
     # Настройки браузера
     BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "false").lower() == "true"
     BROWSER_TIMEOUT = int(os.getenv("BROWSER_TIMEOUT", "30000"))
+    ALLOWED_DOMAINS = os.getenv(
+        "ALLOWED_DOMAINS", "www.delikateska.ru,hobbygames.ru,www.cosmall.ru,*.ru,*.shop"
+    ).split(",")
 
     APP_HOST: str = "localhost"
     APP_PORT: int = 8001
@@ -22,6 +25,71 @@ class Config:
     LLM_MODEL_NAME: str = "meta-llama/llama-4-maverick-17b-128e-instruct"
     LLM_TEMPERATURE: float = 0.0
 
+    # Общая на процесс процедурная память агентов (browser-use[memory]), включается поэтапно
+    AGENT_MEMORY_ENABLED = os.getenv("AGENT_MEMORY_ENABLED", "true").lower() == "true"
+    AGENT_MEMORY_INTERVAL: int = int(os.getenv("AGENT_MEMORY_INTERVAL", "10"))
+    AGENT_MEMORY_EMBEDDER_PROVIDER: str = os.getenv("AGENT_MEMORY_EMBEDDER_PROVIDER", "huggingface")
+    AGENT_MEMORY_EMBEDDER_MODEL: str = os.getenv("AGENT_MEMORY_EMBEDDER_MODEL", "all-MiniLM-L6-v2")
+    AGENT_MEMORY_EMBEDDER_DIMS: int = int(os.getenv("AGENT_MEMORY_EMBEDDER_DIMS", "384"))
+    AGENT_MEMORY_PATH: str = os.getenv("AGENT_MEMORY_PATH", "data/agent_memory")
+
+    # Варианты промптов агента: по умолчанию и распределение трафика вида "ru_v1:90,en_v1:10"
+    PROMPT_VARIANT_DEFAULT: str = os.getenv("PROMPT_VARIANT_DEFAULT", "ru_v1")
+    PROMPT_VARIANT_SPLIT: str = os.getenv("PROMPT_VARIANT_SPLIT", "")
+
+    # Профили ожидания загрузки страниц по доменам
+    WAIT_PROFILES_PATH: str = os.getenv("WAIT_PROFILES_PATH", "data/wait_profiles.json")
+    WAIT_PROFILE_MIN_SAMPLES: int = int(os.getenv("WAIT_PROFILE_MIN_SAMPLES", "5"))
+    # Не чаще одной записи профилей на диск за этот период, сек
+    WAIT_PROFILES_SAVE_INTERVAL_SECONDS: float = float(os.getenv("WAIT_PROFILES_SAVE_INTERVAL_SECONDS", "60"))
+    # Тишина в DOM, после которой страница считается стабильной, сек
+    DOM_SETTLE_QUIET_SECONDS: float = float(os.getenv("DOM_SETTLE_QUIET_SECONDS", "0.15"))
+
+    # Запись запросов корзины и их воспроизведение по HTTP без браузера
+    NETWORK_RECORDER_ENABLED = os.getenv("NETWORK_RECORDER_ENABLED", "false").lower() == "true"
+    HTTP_REPLAY_ENABLED = os.getenv("HTTP_REPLAY_ENABLED", "false").lower() == "true"
+    NETWORK_RECORDINGS_DIR: str = os.getenv("NETWORK_RECORDINGS_DIR", "data/network_recordings")
+
+    # Общий пул HTTP-соединений (воспроизведение запросов, мониторинг цен)
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "10"))
+    HTTP_POOL_MAX_CONNECTIONS: int = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+
+    # Мониторинг цен и наличия (/watch)
+    WATCH_ENABLED = os.getenv("WATCH_ENABLED", "true").lower() == "true"
+    WATCH_DEFAULT_INTERVAL_SECONDS: int = int(os.getenv("WATCH_DEFAULT_INTERVAL_SECONDS", "3600"))
+    WATCH_MAX_CONCURRENCY: int = int(os.getenv("WATCH_MAX_CONCURRENCY", "50"))
+    WATCH_DOMAIN_MIN_INTERVAL_SECONDS: float = float(os.getenv("WATCH_DOMAIN_MIN_INTERVAL_SECONDS", "1.0"))
+    WATCH_PARSER_PROCESSES: int = int(os.getenv("WATCH_PARSER_PROCESSES", "2"))
+    WATCH_MAX_EVENTS: int = int(os.getenv("WATCH_MAX_EVENTS", "10000"))
+
+    # Поток событий выполнения заказа (/orders/{id}/events)
+    ORDER_EVENTS_HISTORY: int = int(os.getenv("ORDER_EVENTS_HISTORY", "200"))
+    ORDER_EVENTS_QUEUE_SIZE: int = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", "100"))
+    ORDER_EVENTS_MAX_CHANNELS: int = int(os.getenv("ORDER_EVENTS_MAX_CHANNELS", "10000"))
+    ORDER_EVENTS_HEARTBEAT_SECONDS: float = float(os.getenv("ORDER_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+    # Досрочная остановка агента на тупиковых страницах (капча, вход, 404, нет в наличии, выбор региона)
+    DEAD_END_DETECTORS_ENABLED = os.getenv("DEAD_END_DETECTORS_ENABLED", "true").lower() == "true"
+    DEAD_END_RULES_PATH: str = os.getenv("DEAD_END_RULES_PATH", "data/dead_end_rules.json")
+
+    # Повторы этапов оформления из последнего чекпоинта при временных сбоях
+    CHECKOUT_MAX_RETRIES: int = int(os.getenv("CHECKOUT_MAX_RETRIES", "2"))
+
+    # Сравнение предложений (/quote)
+    QUOTE_MAX_CONCURRENCY: int = int(os.getenv("QUOTE_MAX_CONCURRENCY", "3"))
+    QUOTE_DEADLINE_SECONDS: float = float(os.getenv("QUOTE_DEADLINE_SECONDS", "300"))
+    # Ограничения одного запроса: ссылок и одновременных браузеров
+    QUOTE_MAX_URLS: int = int(os.getenv("QUOTE_MAX_URLS", "10"))
+    QUOTE_MAX_CONCURRENCY_LIMIT: int = int(os.getenv("QUOTE_MAX_CONCURRENCY_LIMIT", "5"))
+    # Сколько ждать остановки отмененных агентов перед ответом, сек
+    QUOTE_CANCEL_GRACE_SECONDS: float = float(os.getenv("QUOTE_CANCEL_GRACE_SECONDS", "5"))
+
+    # Диагностика: задержки event loop и профилирование (/admin), без токена эндпоинты отключены
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    LOOP_LAG_INTERVAL_SECONDS: float = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.1"))
+    LOOP_STALL_THRESHOLD_SECONDS: float = float(os.getenv("LOOP_STALL_THRESHOLD_SECONDS", "0.5"))
+    PROFILE_MAX_SECONDS: int = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
     # Логирование
     LOG_LEVEL: str = "DEBUG"
 
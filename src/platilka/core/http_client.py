@@ -0,0 +1,40 @@
+from http.cookiejar import CookieJar
+from typing import Optional
+
+import httpx
+
+from platilka.core.config import config
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+class _DiscardingCookieJar(CookieJar):
+    """Cookie jar, который ничего не сохраняет: общий клиент обслуживает сессии разных клиентов и мониторинг"""
+
+    def set_cookie(self, cookie):
+        pass
+
+    def extract_cookies(self, response, request):
+        pass
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий пул HTTP-соединений процесса (cookies передаются явно в каждом запросе)"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=config.HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=config.HTTP_POOL_MAX_CONNECTIONS,
+                                max_keepalive_connections=config.HTTP_POOL_MAX_CONNECTIONS),
+            follow_redirects=False,
+            cookies=_DiscardingCookieJar(),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Закрытие общего пула соединений"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,113 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Any, List, Optional
+
+from loguru import logger
+
+from platilka.core.config import config
+
+# Верхние границы корзин гистограммы задержек, сек
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+
+class EventLoopLagMonitor:
+    """Измерение задержек event loop и поиск кода, который его блокирует
+
+    Корутина-пульс засыпает на interval секунд и фиксирует, насколько позже она проснулась.
+    Сторожевой поток следит за пульсом: если loop не отвечает дольше stall_threshold,
+    в лог пишется стек потока loop, т.е. синхронный код, который его держит
+    """
+
+    def __init__(self, interval: float, stall_threshold: float):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.bucket_counts: List[int] = [0] * len(LAG_BUCKETS)
+        self.count = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Запуск пульса в текущем event loop и сторожевого потока"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._pulse())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Мониторинг задержек event loop запущен (порог {self.stall_threshold} сек)")
+
+    async def stop(self):
+        """Остановка мониторинга"""
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog:
+            await asyncio.to_thread(self._watchdog.join)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Гистограмма задержек в формате кумулятивных корзин"""
+        buckets, cumulative = {}, 0
+        for bound, count in zip(LAG_BUCKETS, self.bucket_counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "interval_seconds": self.interval,
+            "stall_threshold_seconds": self.stall_threshold,
+            "buckets": buckets,
+            "count": self.count,
+            "sum_seconds": round(self.total_lag, 6),
+            "max_seconds": round(self.max_lag, 6),
+            "stalls": self.stalls,
+        }
+
+    def _observe(self, lag: float):
+        self.count += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        for index, bound in enumerate(LAG_BUCKETS):
+            if lag <= bound:
+                self.bucket_counts[index] += 1
+                break
+
+    async def _pulse(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._observe(max(0.0, now - started - self.interval))
+
+    def _watch(self):
+        """Сторожевой поток: по одному отчету на каждую остановку loop"""
+        reported_heartbeat = None
+        poll_interval = min(self.interval, self.stall_threshold / 2)
+        while not self._stopped.wait(poll_interval):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.stall_threshold or heartbeat == reported_heartbeat:
+                continue
+
+            reported_heartbeat = heartbeat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            # Только стек потока loop: API задач asyncio не потокобезопасны и из этого потока не вызываются
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(f"Event loop заблокирован дольше {blocked_for:.2f} сек:\n{stack}")
+
+
+loop_lag_monitor = EventLoopLagMonitor(
+    interval=config.LOOP_LAG_INTERVAL_SECONDS,
+    stall_threshold=config.LOOP_STALL_THRESHOLD_SECONDS,
+)
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, AsyncIterator, Set, Deque
+
+from platilka.core.config import config
+
+# Событие, которым заканчивается очередной запуск агента по заказу (checkout или confirm)
+FINISHED_EVENT = "finished"
+
+
+@dataclass(slots=True)
+class OrderEvent:
+    """Событие хода выполнения заказа"""
+    id: int
+    type: str
+    data: Dict[str, Any]
+    created_at: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "type": self.type, "data": self.data, "created_at": self.created_at}
+
+
+class _Subscriber:
+    """Очередь подписчика; при переполнении отбрасываются самые старые события"""
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def offer(self, event: OrderEvent):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class _Channel:
+    __slots__ = ("history", "subscribers", "next_id", "active")
+
+    def __init__(self, history_size: int):
+        self.history: Deque[OrderEvent] = deque(maxlen=history_size)
+        self.subscribers: Set[_Subscriber] = set()
+        self.next_id = 1
+        self.active = True
+
+
+class OrderEventBus:
+    """Рассылка событий хода выполнения заказов подписчикам (SSE, WebSocket)
+
+    Публикация никогда не ждет подписчиков: у каждого своя ограниченная очередь,
+    медленный подписчик теряет промежуточные события, но последнее (итоговое) получает всегда.
+    Опоздавший подписчик сначала получает историю заказа
+    """
+
+    def __init__(self, history_size: int, queue_size: int, max_channels: int):
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self.max_channels = max_channels
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+
+    def publish(self, order_id: str, event_type: str, data: Optional[Dict[str, Any]] = None) -> OrderEvent:
+        """Публикация события заказа всем подписчикам"""
+        channel = self._channels.get(order_id)
+        if channel is None:
+            channel = self._channels[order_id] = _Channel(self.history_size)
+            self._evict()
+        self._channels.move_to_end(order_id)
+
+        event = OrderEvent(id=channel.next_id, type=event_type, data=data or {}, created_at=time.time())
+        channel.next_id += 1
+        channel.history.append(event)
+        channel.active = event_type != FINISHED_EVENT
+        for subscriber in channel.subscribers:
+            subscriber.offer(event)
+        return event
+
+    def _evict(self):
+        """Удаление самых давних каналов без подписчиков и активных запусков"""
+        while len(self._channels) > self.max_channels:
+            order_id = next((order_id for order_id, channel in self._channels.items()
+                             if not channel.active and not channel.subscribers), None)
+            if order_id is None:
+                break
+            del self._channels[order_id]
+
+    async def subscribe(self, order_id: str, last_event_id: int = 0,
+                        heartbeat: Optional[float] = None) -> AsyncIterator[Optional[OrderEvent]]:
+        """События заказа после last_event_id до конца текущего запуска агента
+
+        Если за heartbeat секунд событий не было, выдается None (для keep-alive)
+        """
+        channel = self._channels.get(order_id)
+        if channel is None:
+            return
+
+        subscriber = _Subscriber(self.queue_size)
+        channel.subscribers.add(subscriber)
+        try:
+            for event in list(channel.history):
+                if event.id > last_event_id:
+                    last_event_id = event.id
+                    yield event
+            if not channel.active and last_event_id >= channel.next_id - 1:
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event.id <= last_event_id:
+                    continue
+                last_event_id = event.id
+                yield event
+                if event.type == FINISHED_EVENT:
+                    return
+        finally:
+            channel.subscribers.discard(subscriber)
+
+    def subscribers_count(self) -> int:
+        return sum(len(channel.subscribers) for channel in self._channels.values())
+
+
+order_events = OrderEventBus(
+    history_size=config.ORDER_EVENTS_HISTORY,
+    queue_size=config.ORDER_EVENTS_QUEUE_SIZE,
+    max_channels=config.ORDER_EVENTS_MAX_CHANNELS,
+)
+
+
+def describe_step(state: Any, model_output: Any, step: int) -> Dict[str, Any]:
+    """Шаг агента browser-use: номер, url, цель и имена действий (без параметров - в них бывают данные клиента)"""
+    actions = []
+    for action in getattr(model_output, "action", None) or []:
+        actions.extend(action.model_dump(exclude_unset=True))
+    current_state = getattr(model_output, "current_state", None)
+    return {
+        "step": step,
+        "url": getattr(state, "url", None),
+        "goal": getattr(current_state, "next_goal", None),
+        "actions": actions,
+    }
@@ -1,8 +1,124 @@
+import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+import orjson
+from pydantic import BaseModel
+
+from platilka.core.order_events import order_events, FINISHED_EVENT
+
+# Поля заказа с объемными данными: хранятся один раз, сериализованными в JSON (bytes)
+PAYLOAD_FIELDS = frozenset({
+    "checkout_request", "checkout_response", "checkout_result",
+    "confirm_request", "confirm_response", "confirm_result",
+})
+
+
+def _dump_payload(value: Any) -> Optional[bytes]:
+    if value is None or isinstance(value, bytes):
+        return value
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json")
+    # orjson отдает bytes поверх буфера записи (от 4 КБ); копия точного размера - для долгого хранения
+    return memoryview(orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)).tobytes()
+
+
+def _fragment(payload: Optional[bytes]) -> Optional[orjson.Fragment]:
+    """Готовый JSON для вставки в ответ без повторной сериализации"""
+    return orjson.Fragment(payload) if payload is not None else None
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+@dataclass(slots=True)
+class OrderRecord:
+    """Компактная запись заказа
+
+    Статус интернирован, время хранится числом, запросы, ответы и сырые результаты агента -
+    по одной копии в виде JSON. Часто читаемые значения вынесены в отдельные поля
+    """
+    order_id: str
+    status: str
+    created_at: float
+    updated_at: float
+    prompt_variant: Optional[str] = None
+    total_price: Optional[float] = None
+    cancelled_at_stage: Optional[str] = None
+    failed_stage: Optional[str] = None
+    # Причина досрочной остановки агента на тупиковой странице (captcha, login_wall, ...)
+    abort_reason: Optional[str] = None
+    # Сводка сырых результатов агента для детальной карточки, снимается при сохранении,
+    # чтобы GET /orders/{id} не разбирал checkout_result целиком
+    retries_count: int = 0
+    wait_seconds: Optional[float] = None
+    retries: Optional[bytes] = None
+    checkpoints: Optional[bytes] = None
+    checkout_memory: Optional[bytes] = None
+    confirm_memory: Optional[bytes] = None
+    checkout_request: Optional[bytes] = None
+    checkout_response: Optional[bytes] = None
+    checkout_result: Optional[bytes] = None
+    confirm_request: Optional[bytes] = None
+    confirm_response: Optional[bytes] = None
+    confirm_result: Optional[bytes] = None
+
+    def update(self, data: Dict[str, Any]):
+        for name, value in data.items():
+            if name == "checkout_result" and isinstance(value, dict):
+                retries = value.get("retries") or []
+                self.retries_count = len(retries)
+                self.wait_seconds = value.get("wait_seconds")
+                self.retries = _dump_payload(retries)
+                self.checkpoints = _dump_payload(value.get("checkpoints") or [])
+                self.checkout_memory = _dump_payload(value.get("memory"))
+            elif name == "confirm_result" and isinstance(value, dict):
+                self.confirm_memory = _dump_payload(value.get("memory"))
+            setattr(self, name, _dump_payload(value) if name in PAYLOAD_FIELDS else value)
+
+    def load(self, name: str) -> Dict[str, Any]:
+        """Разобранный JSON поля с данными (пустой словарь, если данных нет)"""
+        payload = getattr(self, name)
+        return orjson.loads(payload) if payload is not None else {}
+
+    def summary(self) -> Dict[str, Any]:
+        """Строка списка заказов"""
+        return {
+            "order_id": self.order_id,
+            "status": self.status,
+            "created_at": _isoformat(self.created_at),
+            "total_price": self.total_price or 0,
+        }
+
+    def details(self) -> Dict[str, Any]:
+        """Детальная информация о заказе (вложенные данные - готовым JSON, без разбора)"""
+        return {
+            "order_id": self.order_id,
+            "status": self.status,
+            "created_at": _isoformat(self.created_at),
+            "updated_at": _isoformat(self.updated_at),
+            "prompt_variant": self.prompt_variant,
+            "cancelled_at_stage": self.cancelled_at_stage,
+            "failed_stage": self.failed_stage,
+            "abort_reason": self.abort_reason,
+            "retries_count": self.retries_count,
+            "wait_seconds": self.wait_seconds,
+            "memory": {
+                "checkout": _fragment(self.checkout_memory),
+                "confirm": _fragment(self.confirm_memory),
+            },
+            "retries": _fragment(self.retries) or [],
+            "checkpoints": _fragment(self.checkpoints) or [],
+            "checkout_data": _fragment(self.checkout_response),
+            "confirm_data": _fragment(self.confirm_response),
+        }
+
+
 # Хранилище заказов (в продакшене использовать Redis или базу данных)
-orders_storage: Dict[str, Dict[str, Any]] = {}
+orders_storage: Dict[str, OrderRecord] = {}
 
 
 class OrderManager:
@@ -16,25 +132,40 @@ class OrderManager:
     @staticmethod
     def save_order(order_id: str, data: Dict[str, Any]):
         """Сохранение заказа"""
-        orders_storage[order_id] = {
-            **data,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
+        now = time.time()
+        record = OrderRecord(order_id=order_id, status=sys.intern(data.get("status", "created")),
+                             created_at=now, updated_at=now)
+        record.update({name: value for name, value in data.items() if name != "status"})
+        orders_storage[order_id] = record
+        OrderManager._publish_status(record)
 
     @staticmethod
-    def get_order(order_id: str) -> Optional[Dict[str, Any]]:
+    def get_order(order_id: str) -> Optional[OrderRecord]:
         """Получение заказа"""
         return orders_storage.get(order_id)
 
     @staticmethod
     def update_order_status(order_id: str, status: str, additional_data: Dict[str, Any] = None):
         """Обновление статуса заказа"""
-        if order_id in orders_storage:
-            orders_storage[order_id]["status"] = status
-            orders_storage[order_id]["updated_at"] = datetime.now().isoformat()
+        record = orders_storage.get(order_id)
+        if record is not None:
+            record.status = sys.intern(status)
+            record.updated_at = time.time()
             if additional_data:
-                orders_storage[order_id].update(additional_data)
+                record.update(additional_data)
+            OrderManager._publish_status(record)
+
+    @staticmethod
+    def _publish_status(record: OrderRecord):
+        """Смена статуса в потоке событий заказа; любой статус кроме *_in_progress завершает запуск"""
+        event_type = "status" if record.status.endswith("_in_progress") else FINISHED_EVENT
+        order_events.publish(record.order_id, event_type, {
+            "status": record.status,
+            "total_price": record.total_price,
+            "failed_stage": record.failed_stage,
+            "abort_reason": record.abort_reason,
+            "cancelled_at_stage": record.cancelled_at_stage,
+        })
 
 
 order_manager = OrderManager()
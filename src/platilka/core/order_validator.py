@@ -0,0 +1,160 @@
+import re
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from platilka.models.common import ValidationError
+
+# Число с возможными разделителями разрядов: пробелы (в т.ч. неразрывные), точки, запятые, апострофы
+_NUMBER_PATTERN = re.compile(r"\d[\d\s.,']*")
+_GROUPING_CHARS = re.compile(r"[\s']")
+# Валюта сразу после или перед числом: "1 299 ₽", "1299 руб.", "$1,299.90"
+_CURRENCY_AFTER = re.compile(r"\s*(₽|руб|р\.|р\b|rub\b|\$|€|usd\b|eur\b)", re.IGNORECASE)
+_CURRENCY_BEFORE = re.compile(r"(₽|\$|€|rub|usd|eur)\s*$", re.IGNORECASE)
+_NAME_NOISE_PATTERN = re.compile(r"[\"'«»“”„`´()\[\]{}:;,.!?/\\|_-]+")
+_SPACES_PATTERN = re.compile(r"\s+")
+# Начало уточнения, которое магазин дописывает к названию: "Товар (черный, 128 ГБ)", "Товар, арт. 123",
+# "Товар - 2 шт"; запятая между цифрами ("3,2%") - десятичная, а не разделитель
+_QUALIFIER_PATTERN = re.compile(r"\s[-–—|]\s|[(\[;]|,(?!\d)")
+
+
+class OrderValidator:
+    """Детерминированная сверка ожидаемых и фактических параметров заказа"""
+
+    @staticmethod
+    def parse_price(value: Any) -> Optional[float]:
+        """Разбор цены с учетом локали ("1 299,90 ₽", "1,299.90", "1.299,90 руб.")
+
+        Из нескольких чисел ("2 шт × 1 299 ₽") берется стоящее рядом со знаком валюты, иначе последнее
+        """
+        if value is None or isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+
+        text = str(value)
+        matches = list(_NUMBER_PATTERN.finditer(text))
+        if not matches:
+            return None
+        match = next((match for match in reversed(matches)
+                      if _CURRENCY_AFTER.match(text, match.end()) or _CURRENCY_BEFORE.search(text, 0, match.start())),
+                     matches[-1])
+
+        number = _GROUPING_CHARS.sub("", match.group(0)).rstrip(".,")
+        if not number:
+            return None
+
+        last_dot, last_comma = number.rfind("."), number.rfind(",")
+        if last_dot != -1 and last_comma != -1:
+            # Десятичный разделитель - тот, что встречается последним
+            decimal_sep = "." if last_dot > last_comma else ","
+            grouping_sep = "," if decimal_sep == "." else "."
+            number = number.replace(grouping_sep, "").replace(decimal_sep, ".")
+        elif last_dot != -1 or last_comma != -1:
+            sep = "." if last_dot != -1 else ","
+            integer_part, _, fraction = number.rpartition(sep)
+            if number.count(sep) > 1 or len(fraction) == 3:
+                # "1.299.000" или "1,299" - разделители разрядов
+                number = number.replace(sep, "")
+            else:
+                number = f"{integer_part.replace(sep, '')}.{fraction}"
+
+        try:
+            return float(number)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def normalize_name(value: Any) -> str:
+        """Нормализация названия для сравнения (регистр, ё, кавычки, пунктуация, пробелы)"""
+        text = str(value or "").casefold().replace("ё", "е")
+        text = _NAME_NOISE_PATTERN.sub(" ", text)
+        return _SPACES_PATTERN.sub(" ", text).strip()
+
+    def _name_tokens(self, value: Any) -> Tuple[Set[str], Set[str]]:
+        """Слова основного названия и слова уточнения, дописанного после скобки, запятой или тире"""
+        base, *qualifier = _QUALIFIER_PATTERN.split(str(value or ""), maxsplit=1)
+        return set(self.normalize_name(base).split()), set(self.normalize_name(" ".join(qualifier)).split())
+
+    def names_match(self, expected: Any, actual: Any) -> bool:
+        """Совпадение названий с точностью до нормализации и дописанных магазином уточнений
+
+        Слова сравниваются после нормализации пунктуации, порядок не важен. Все слова ожидаемого
+        названия должны быть в фактическом, а лишние слова фактического допустимы только в уточнении
+        (после скобки, запятой или тире): "iPhone 15" и "iPhone 15 Pro Max" - разные товары,
+        фрагмент названия не совпадает с полным
+        """
+        expected_words = set(self.normalize_name(expected).split())
+        actual_base, actual_qualifier = self._name_tokens(actual)
+        if not expected_words or not actual_base:
+            return False
+        return expected_words <= actual_base | actual_qualifier and actual_base <= expected_words
+
+    @staticmethod
+    def prices_match(expected: float, actual: float, tolerance: float = 0.01) -> bool:
+        """Проверка разности цен с допустимым отклонением"""
+        return abs(expected - actual) <= tolerance
+
+    def validate(self, expected: Dict[str, Any], actual: Dict[str, Any],
+                 tolerance: float = 0.01) -> List[ValidationError]:
+        """Пополевая сверка ожидаемых параметров заказа с фактическими данными корзины"""
+        discrepancies: List[ValidationError] = []
+
+        if not self.names_match(expected.get("product_name"), actual.get("product_name")):
+            discrepancies.append(ValidationError(
+                field="product_name",
+                expected=str(expected.get("product_name") or ""),
+                actual=str(actual.get("product_name") or ""),
+                message="Название товара не совпадает"
+            ))
+
+        expected_quantity = expected.get("quantity")
+        actual_quantity = self.parse_price(actual.get("quantity"))
+        if expected_quantity is not None and actual_quantity != float(expected_quantity):
+            discrepancies.append(ValidationError(
+                field="quantity",
+                expected=int(expected_quantity),
+                actual=int(actual_quantity) if actual_quantity is not None else str(actual.get("quantity") or ""),
+                message="Количество товара не совпадает"
+            ))
+
+        price_fields = {
+            "product_price": "Цена за единицу",
+            "delivery_cost": "Стоимость доставки",
+            "total_price": "Общая стоимость",
+        }
+        for field, title in price_fields.items():
+            expected_value = self.parse_price(expected.get(field))
+            if expected_value is None:
+                continue
+
+            actual_value = self.parse_price(actual.get(field))
+            if actual_value is None:
+                # Бесплатная доставка часто вообще не выводится на странице
+                if field == "delivery_cost" and expected_value == 0:
+                    continue
+                discrepancies.append(ValidationError(
+                    field=field,
+                    expected=expected_value,
+                    actual=str(actual.get(field) or ""),
+                    message=f"{title}: не удалось определить фактическое значение"
+                ))
+            elif not self.prices_match(expected_value, actual_value, tolerance):
+                discrepancies.append(ValidationError(
+                    field=field,
+                    expected=expected_value,
+                    actual=actual_value,
+                    message=f"{title} отличается на {actual_value - expected_value:+.2f}"
+                ))
+
+        expected_method = expected.get("delivery_method")
+        if expected_method and not self.names_match(expected_method, actual.get("delivery_method")):
+            discrepancies.append(ValidationError(
+                field="delivery_method",
+                expected=str(expected_method),
+                actual=str(actual.get("delivery_method") or ""),
+                message="Способ доставки не совпадает"
+            ))
+
+        return discrepancies
+
+
+order_validator = OrderValidator()
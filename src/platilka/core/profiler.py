@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import List, Optional
+
+# Режимы профилирования: стеки всех потоков или цепочки await всех задач asyncio
+PROFILE_MODES = ("wall", "async")
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[str]:
+    """Стек потока от внешнего вызова к внутреннему"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return labels[::-1]
+
+
+def _task_stack(task: asyncio.Task) -> List[str]:
+    """Цепочка await задачи от внешней корутины к той, что сейчас ожидает"""
+    labels = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return labels
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер без сторонних зависимостей
+
+    Результат - свернутые стеки ("a;b;c count"), которые принимают flamegraph.pl,
+    speedscope и inferno. Режим wall снимает стеки всех потоков из отдельного потока
+    и видит в том числе блокирующий синхронный код; режим async снимает цепочки await
+    задач asyncio и показывает, чего ждут корутины
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, interval: float = 0.01, mode: str = "wall") -> str:
+        """Сбор профиля в течение seconds секунд"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {mode}")
+
+        async with self._lock:
+            if mode == "wall":
+                samples = await asyncio.to_thread(self._sample_threads, seconds, interval)
+            else:
+                samples = await self._sample_tasks(seconds, interval)
+
+        return "\n".join(f"{stack} {count}" for stack, count in samples.most_common()) + "\n"
+
+    @staticmethod
+    def _sample_threads(seconds: float, interval: float) -> Counter:
+        samples: Counter = Counter()
+        own_thread_id = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = [f"thread:{thread_names.get(thread_id, thread_id)}", *_thread_stack(frame)]
+                samples[";".join(stack)] += 1
+            time.sleep(interval)
+        return samples
+
+    @staticmethod
+    async def _sample_tasks(seconds: float, interval: float) -> Counter:
+        samples: Counter = Counter()
+        own_task = asyncio.current_task()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for task in asyncio.all_tasks():
+                if task is own_task:
+                    continue
+                stack = _task_stack(task)
+                if stack:
+                    samples[";".join(["asyncio", *stack])] += 1
+            await asyncio.sleep(interval)
+        return samples
+
+
+sampling_profiler = SamplingProfiler()
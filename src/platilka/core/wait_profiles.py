@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional
+
+from loguru import logger
+
+from platilka.core.config import config
+
+
+@dataclass
+class WaitProfile:
+    """Наблюдаемые тайминги страниц одного домена"""
+    samples: int = 0
+    # Скользящее среднее времени до затихания сети и до стабилизации DOM после загрузки, сек
+    load_seconds: float = 0.0
+    settle_seconds: float = 0.0
+    # Селектор, появление которого означает готовность страницы (задается вручную в файле)
+    ready_selector: Optional[str] = None
+
+
+class WaitProfileStore:
+    """Профили ожидания по доменам, обучаемые на прошлых запусках и хранящиеся на диске"""
+
+    # Вес нового замера в скользящем среднем
+    SMOOTHING = 0.2
+
+    def __init__(self, path: str, save_interval: float = 0.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._profiles: Optional[Dict[str, WaitProfile]] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+
+    @property
+    def profiles(self) -> Dict[str, WaitProfile]:
+        if self._profiles is None:
+            self._profiles = self._load()
+        return self._profiles
+
+    def _load(self) -> Dict[str, WaitProfile]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return {domain: WaitProfile(**data) for domain, data in json.load(file).items()}
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать профили ожидания {self.path}: {str(e)}")
+            return {}
+
+    def get(self, domain: str) -> WaitProfile:
+        """Профиль домена (пустой, если домен еще не встречался)"""
+        return self.profiles.get(domain) or WaitProfile()
+
+    def record(self, domain: str, load_seconds: float, settle_seconds: float):
+        """Учет замера загрузки страницы домена"""
+        profile = self.profiles.setdefault(domain, WaitProfile())
+        if profile.samples == 0:
+            profile.load_seconds, profile.settle_seconds = load_seconds, settle_seconds
+        else:
+            profile.load_seconds += self.SMOOTHING * (load_seconds - profile.load_seconds)
+            profile.settle_seconds += self.SMOOTHING * (settle_seconds - profile.settle_seconds)
+        profile.samples += 1
+        self._dirty = True
+
+    def context_overrides(self, domain: str) -> Dict[str, Any]:
+        """Параметры ожидания BrowserContextConfig для домена
+
+        Для незнакомых доменов остаются консервативные значения по умолчанию,
+        для изученных ожидания подстраиваются под наблюдаемую скорость магазина
+        """
+        profile = self.get(domain)
+        if profile.samples < config.WAIT_PROFILE_MIN_SAMPLES:
+            return {"minimum_wait_page_load_time": 0.0}
+        return {
+            "minimum_wait_page_load_time": 0.0,
+            "wait_for_network_idle_page_load_time": min(max(profile.load_seconds / 4, 0.2), 1.0),
+            "maximum_wait_page_load_time": min(max(profile.load_seconds * 3, 2.0), 10.0),
+            "wait_between_actions": min(max(profile.settle_seconds, 0.1), 1.0),
+        }
+
+    def snapshot(self, force: bool = False) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Копия профилей для записи на диск (None - если сохранять нечего или рано)
+
+        Вызывается в потоке event loop, где профили изменяются; запись копии - в отдельном потоке
+        """
+        if self._profiles is None or not self._dirty:
+            return None
+        if not force and time.monotonic() - self._saved_at < self.save_interval:
+            return None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        return {domain: asdict(profile) for domain, profile in self._profiles.items()}
+
+    def write(self, snapshot: Optional[Dict[str, Dict[str, Any]]]):
+        """Запись снимка профилей на диск"""
+        if snapshot is None:
+            return
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def save(self):
+        """Немедленное сохранение профилей на диск (при остановке сервиса)"""
+        self.write(self.snapshot(force=True))
+
+
+wait_profiles = WaitProfileStore(config.WAIT_PROFILES_PATH, config.WAIT_PROFILES_SAVE_INTERVAL_SECONDS)
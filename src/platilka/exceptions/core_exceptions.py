@@ -4,4 +4,39 @@ class CheckoutException(Exception):
 
 class InvalidAgentResponse(Exception):
     """Кастомная ошибка для случаев, когда browser-use не удалось извлечь структурированный ответ"""
-    pass
\ No newline at end of file
+    pass
+
+class OrderCancelled(Exception):
+    """Заказ отменен пользователем во время работы агента"""
+
+    def __init__(self, stage: str | None = None):
+        self.stage = stage
+        super().__init__(f"Заказ отменен на этапе: {stage or 'неизвестно'}")
+
+
+class OrderAlreadyRunning(Exception):
+    """По заказу уже работает агент"""
+
+    def __init__(self, order_id: str):
+        self.order_id = order_id
+        super().__init__(f"По заказу {order_id} уже выполняется операция")
+
+
+class StageFailed(Exception):
+    """Этап оформления заказа завершился ошибкой"""
+
+    def __init__(self, stage: str, message: str, transient: bool, reason: str | None = None):
+        self.stage = stage
+        self.transient = transient
+        self.reason = reason
+        super().__init__(f"Этап {stage}: {message}")
+
+
+class DeadEndDetected(Exception):
+    """Агент попал на тупиковую страницу (капча, вход, 404, нет в наличии, зацикленный выбор региона)"""
+
+    def __init__(self, reason: str, stage: str, url: str | None = None):
+        self.reason = reason
+        self.stage = stage
+        self.url = url
+        super().__init__(f"Тупиковая страница ({reason}) на этапе {stage}: {url or 'неизвестно'}")
@@ -11,4 +11,5 @@ class CheckoutRequest(BaseModel):
     quantity: int = Field(1, ge=1, description="Желаемое количество товара")
     delivery_info: DeliveryInfo = Field(..., description="Информация о доставке")
     notes: Optional[str] = Field(None, description="Дополнительные заметки")
-    payment_method: str = Field("card", description="Метод оплаты") #TODO - временно здесь
\ No newline at end of file
+    payment_method: str = Field("card", description="Метод оплаты") #TODO - временно здесь
+    prompt_variant: Optional[str] = Field(None, description="Вариант промптов агента (по умолчанию - по распределению трафика)")
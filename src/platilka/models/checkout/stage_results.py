@@ -0,0 +1,37 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class StageResult(BaseModel):
+    """Базовый результат этапа оформления"""
+    error_message: Optional[str] = Field(None, description="Описание проблемы, если этап не удался")
+
+
+class ProductStageResult(StageResult):
+    """Этап 1: анализ товара"""
+    product_name: str = Field(..., description="Точное название товара")
+    product_price: str = Field(..., description="Цена за единицу как на странице, например '1 299,90 ₽'")
+    availability_status: str = Field(..., description="Статус наличия: в наличии/ограничено/нет")
+    max_available_quantity: Optional[int] = Field(None, description="Максимальное доступное количество")
+    currency: str = Field("RUB", description="Валюта")
+
+
+class AddToCartStageResult(StageResult):
+    """Этап 2: добавление в корзину"""
+    added_to_cart: bool = Field(..., description="Товар добавлен и открыта страница корзины")
+
+
+class QuantityStageResult(StageResult):
+    """Этап 3: управление количеством"""
+    actual_quantity: int = Field(..., description="Фактически установленное количество")
+    max_available_quantity: Optional[int] = Field(None, description="Максимальное доступное количество")
+    subtotal: Optional[str] = Field(None, description="Стоимость товаров как на странице")
+
+
+class DeliveryStageResult(StageResult):
+    """Этап 4: оформление и доставка"""
+    delivery_method: str = Field(..., description="Выбранный способ доставки")
+    delivery_cost: Optional[str] = Field(None, description="Стоимость доставки как на странице")
+    estimated_delivery_date: Optional[str] = Field(None, description="Дата доставки")
+    total_price: Optional[str] = Field(None, description="Общая стоимость как на странице")
@@ -36,3 +36,20 @@ class ValidationError(BaseModel):
     message: str = Field(..., description="Описание ошибки")
 
     model_config = ConfigDict(arbitrary_types_allowed=True) # TODO пофиксить
+
+class CartSnapshot(BaseModel):
+    """Фактические параметры корзины в том виде, в котором они показаны на странице"""
+    product_name: str = Field(..., description="Название товара в корзине")
+    quantity: int = Field(..., description="Количество товара в корзине")
+    product_price: str = Field(..., description="Цена за единицу как на странице, например '1 299,90 ₽'")
+    delivery_cost: Optional[str] = Field(None, description="Стоимость доставки как на странице")
+    total_price: str = Field(..., description="Общая стоимость как на странице")
+    delivery_method: Optional[str] = Field(None, description="Выбранный способ доставки")
+    currency: str = Field("RUB", description="Валюта")
+
+class PaymentResult(BaseModel):
+    """Результат этапа оплаты"""
+    payment_success: bool = Field(..., description="Успешность оплаты")
+    payment_error: Optional[str] = Field(None, description="Ошибка оплаты, если есть")
+    order_number: Optional[str] = Field(None, description="Номер заказа из магазина")
+    payment_confirmation: Optional[str] = Field(None, description="Подтверждение оплаты")
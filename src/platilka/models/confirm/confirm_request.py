@@ -17,4 +17,5 @@ class ConfirmRequest(BaseModel):
     # subtotal: Optional[float] = Field(..., description="Ожидаемая стоимость товаров")
     total_price: float = Field(..., description="Ожидаемая общая стоимость")
     payment_method: str = Field("card", description="Метод оплаты")
-    validation_tolerance: float = Field(0.01, description="Допустимая погрешность для валидации цен")
\ No newline at end of file
+    validation_tolerance: float = Field(0.01, description="Допустимая погрешность для валидации цен")
+    prompt_variant: Optional[str] = Field(None, description="Вариант промптов агента (по умолчанию - как в checkout)")
@@ -0,0 +1,20 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, HttpUrl
+
+from platilka.core.config import config
+from platilka.models.common import DeliveryInfo
+
+
+class QuoteRequest(BaseModel):
+    """Запрос на сравнение предложений одного товара в разных магазинах"""
+    product_urls: List[HttpUrl] = Field(..., min_length=1, max_length=config.QUOTE_MAX_URLS,
+                                        description="Ссылки на товар в разных магазинах")
+    quantity: int = Field(1, ge=1, description="Желаемое количество товара")
+    delivery_info: DeliveryInfo = Field(..., description="Информация о доставке")
+    max_concurrency: Optional[int] = Field(None, ge=1, le=config.QUOTE_MAX_CONCURRENCY_LIMIT,
+                                           description="Сколько магазинов опрашивать одновременно")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="Максимальное время сбора предложений")
+    target_total_price: Optional[float] = Field(
+        None, description="Достаточно хорошая цена: при ее достижении остальные запросы отменяются"
+    )
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional, List
+
+from pydantic import BaseModel, Field
+
+
+class QuoteOffer(BaseModel):
+    """Предложение одного магазина"""
+    product_url: str = Field(..., description="Ссылка на товар")
+    success: bool = Field(..., description="Удалось ли получить предложение")
+    product_name: Optional[str] = Field(None, description="Название товара")
+    product_price: Optional[float] = Field(None, description="Цена за единицу")
+    availability: bool = Field(False, description="Доступность товара")
+    availability_status: Optional[str] = Field(None, description="Статус наличия товара")
+    delivery_method: Optional[str] = Field(None, description="Способ доставки")
+    delivery_cost: Optional[float] = Field(None, description="Стоимость доставки")
+    total_price: Optional[float] = Field(None, description="Общая стоимость с доставкой")
+    currency: str = Field("RUB", description="Валюта")
+    elapsed_seconds: float = Field(0.0, description="Время получения предложения")
+    error_message: Optional[str] = Field(None, description="Сообщение об ошибке")
+
+
+class QuoteResponse(BaseModel):
+    """Ранжированное сравнение предложений"""
+    offers: List[QuoteOffer] = Field(default_factory=list, description="Предложения от лучшего к худшему")
+    best_offer: Optional[QuoteOffer] = Field(None, description="Самое дешевое доступное предложение")
+    cancelled_urls: List[str] = Field(default_factory=list, description="Ссылки, опрос которых был отменен")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Время сравнения")
@@ -0,0 +1,9 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, HttpUrl
+
+
+class WatchRequest(BaseModel):
+    """Запрос на отслеживание цены и наличия товаров"""
+    product_urls: List[HttpUrl] = Field(..., min_length=1, description="Ссылки на товары")
+    interval_seconds: Optional[int] = Field(None, ge=60, description="Период проверки, сек")
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Optional, List
+
+from pydantic import BaseModel, Field
+
+
+class WatchedProduct(BaseModel):
+    """Отслеживаемый товар и его последнее известное состояние"""
+    product_url: str = Field(..., description="Ссылка на товар")
+    interval_seconds: int = Field(..., description="Период проверки, сек")
+    price: Optional[float] = Field(None, description="Последняя известная цена")
+    currency: Optional[str] = Field(None, description="Валюта")
+    available: Optional[bool] = Field(None, description="Последнее известное наличие")
+    last_checked_at: Optional[datetime] = Field(None, description="Время последней проверки")
+    last_changed_at: Optional[datetime] = Field(None, description="Время последнего изменения")
+    last_status_code: Optional[int] = Field(None, description="HTTP-статус последней проверки")
+    error: Optional[str] = Field(None, description="Ошибка последней проверки")
+
+
+class PriceEvent(BaseModel):
+    """Изменение цены или наличия товара"""
+    product_url: str = Field(..., description="Ссылка на товар")
+    field: str = Field(..., description="Изменившееся поле: price или available")
+    old_value: Optional[float | bool] = Field(None, description="Прежнее значение")
+    new_value: Optional[float | bool] = Field(None, description="Новое значение")
+    detected_at: datetime = Field(default_factory=datetime.now, description="Время обнаружения")
+
+
+class WatchResponse(BaseModel):
+    """Состояние мониторинга"""
+    products: List[WatchedProduct] = Field(default_factory=list, description="Отслеживаемые товары")
+    events: List[PriceEvent] = Field(default_factory=list, description="Последние изменения")
+    total: int = Field(0, description="Всего отслеживаемых товаров")
@@ -0,0 +1,78 @@
+import json
+from typing import Dict, Any, Optional, Iterator
+
+from bs4 import BeautifulSoup
+
+from platilka.core.order_validator import order_validator
+
+# Признаки отсутствия товара в тексте страницы
+OUT_OF_STOCK_MARKERS = ("нет в наличии", "товар закончился", "распродан", "out of stock", "sold out")
+
+
+def _iter_json_ld(soup: BeautifulSoup) -> Iterator[Dict[str, Any]]:
+    """Объекты JSON-LD страницы, включая вложенные в @graph и списки"""
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except json.JSONDecodeError:
+            continue
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                stack.extend(item.get("@graph", []))
+                yield item
+
+
+def _offer_from_json_ld(soup: BeautifulSoup) -> Optional[Dict[str, Any]]:
+    for item in _iter_json_ld(soup):
+        item_type = item.get("@type")
+        if item_type != "Product" and not (isinstance(item_type, list) and "Product" in item_type):
+            continue
+        offers = item.get("offers")
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        if not isinstance(offers, dict):
+            continue
+        availability = offers.get("availability")
+        return {
+            "price": order_validator.parse_price(offers.get("price") or offers.get("lowPrice")),
+            "currency": offers.get("priceCurrency"),
+            "available": None if availability is None else "InStock" in str(availability),
+        }
+    return None
+
+
+def parse_product_html(html: str) -> Dict[str, Any]:
+    """Цена, валюта и наличие товара из HTML страницы
+
+    Функция верхнего уровня: выполняется в пуле процессов мониторинга
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    offer = _offer_from_json_ld(soup) or {"price": None, "currency": None, "available": None}
+
+    if offer["price"] is None:
+        price_tag = (soup.find(attrs={"itemprop": "price"})
+                     or soup.find("meta", property="product:price:amount")
+                     or soup.find("meta", property="og:price:amount"))
+        if price_tag:
+            offer["price"] = order_validator.parse_price(price_tag.get("content") or price_tag.get_text())
+
+    if offer["currency"] is None:
+        currency_tag = (soup.find(attrs={"itemprop": "priceCurrency"})
+                        or soup.find("meta", property="product:price:currency"))
+        if currency_tag:
+            offer["currency"] = currency_tag.get("content") or currency_tag.get_text(strip=True)
+
+    if offer["available"] is None:
+        availability_tag = soup.find(attrs={"itemprop": "availability"})
+        if availability_tag:
+            offer["available"] = "InStock" in (availability_tag.get("href") or availability_tag.get("content") or "")
+        else:
+            text = soup.get_text(" ", strip=True).lower()
+            offer["available"] = not any(marker in text for marker in OUT_OF_STOCK_MARKERS)
+
+    return offer
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Deque
+from urllib.parse import urlparse
+
+import httpx
+from loguru import logger
+
+from platilka.core.config import config
+from platilka.core.http_client import get_http_client
+from platilka.models.watch.watch_response import WatchedProduct, PriceEvent
+from platilka.monitor.html_parser import parse_product_html
+
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/124.0 Safari/537.36")
+# Период, с которым планировщик ищет товары, которые пора проверить, сек
+SCHEDULER_TICK_SECONDS = 1.0
+
+
+@dataclass
+class _WatchState:
+    """Внутреннее состояние отслеживаемого товара"""
+    product: WatchedProduct
+    domain: str
+    next_check_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class DomainRateLimiter:
+    """Не чаще одного запроса к домену за min_interval секунд"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, domain: str):
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(domain, 0.0))
+        self._next_slot[domain] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class PriceMonitor:
+    """Фоновая проверка цен и наличия по HTTP без запуска браузерного агента
+
+    Страницы запрашиваются условными запросами (ETag / If-Modified-Since) через общий пул
+    соединений с ограничением частоты по доменам, HTML разбирается в пуле процессов
+    """
+
+    def __init__(self):
+        self._items: Dict[str, _WatchState] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.events: Deque[PriceEvent] = deque(maxlen=config.WATCH_MAX_EVENTS)
+        self._semaphore = asyncio.Semaphore(config.WATCH_MAX_CONCURRENCY)
+        self._rate_limiter = DomainRateLimiter(config.WATCH_DOMAIN_MIN_INTERVAL_SECONDS)
+        self._scheduler: Optional[asyncio.Task] = None
+        self._parser_pool: Optional[ProcessPoolExecutor] = None
+
+    def watch(self, product_urls: List[str], interval_seconds: Optional[int] = None) -> List[WatchedProduct]:
+        """Добавление товаров в мониторинг (или изменение периода); первая проверка - сразу"""
+        interval_seconds = interval_seconds or config.WATCH_DEFAULT_INTERVAL_SECONDS
+        products = []
+        for url in product_urls:
+            state = self._items.get(url)
+            if state is None:
+                state = _WatchState(
+                    product=WatchedProduct(product_url=url, interval_seconds=interval_seconds),
+                    domain=urlparse(url).netloc.lower(),
+                    next_check_at=time.monotonic(),
+                )
+                self._items[url] = state
+            else:
+                state.product.interval_seconds = interval_seconds
+            products.append(state.product)
+        logger.info(f"В мониторинге {len(self._items)} товаров")
+        return products
+
+    def products(self, limit: int, offset: int) -> List[WatchedProduct]:
+        """Отслеживаемые товары"""
+        return [state.product for state in list(self._items.values())[offset:offset + limit]]
+
+    def recent_events(self, limit: int) -> List[PriceEvent]:
+        """Последние изменения цен и наличия, новые первыми"""
+        return list(self.events)[-limit:][::-1]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def start(self):
+        """Запуск планировщика проверок"""
+        self._parser_pool = ProcessPoolExecutor(max_workers=config.WATCH_PARSER_PROCESSES)
+        self._scheduler = asyncio.create_task(self._run())
+        logger.info("Мониторинг цен запущен")
+
+    async def stop(self):
+        """Остановка планировщика и незавершенных проверок"""
+        tasks = [task for task in [self._scheduler, *self._in_flight.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._parser_pool:
+            self._parser_pool.shutdown(cancel_futures=True)
+        logger.info("Мониторинг цен остановлен")
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            for url, state in list(self._items.items()):
+                if state.next_check_at <= now and url not in self._in_flight:
+                    self._in_flight[url] = asyncio.create_task(self._check(state))
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+    async def _check(self, state: _WatchState):
+        product = state.product
+        try:
+            headers = {"user-agent": USER_AGENT, "accept": "text/html"}
+            if state.etag:
+                headers["if-none-match"] = state.etag
+            if state.last_modified:
+                headers["if-modified-since"] = state.last_modified
+
+            # Ожидание лимита домена - вне семафора, иначе один домен с большим списком занимает все слоты
+            await self._rate_limiter.wait(state.domain)
+            async with self._semaphore:
+                response = await get_http_client().get(product.product_url, headers=headers, follow_redirects=True)
+
+            product.last_status_code = response.status_code
+            product.error = None
+            if response.status_code == 304:
+                return
+            if response.status_code != 200:
+                product.error = f"HTTP {response.status_code}"
+                return
+
+            state.etag = response.headers.get("etag")
+            state.last_modified = response.headers.get("last-modified")
+            parsed = await asyncio.get_running_loop().run_in_executor(
+                self._parser_pool, parse_product_html, response.text
+            )
+            self._apply(product, parsed)
+
+        except httpx.HTTPError as e:
+            product.error = str(e) or e.__class__.__name__
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Ошибка проверки {product.product_url}: {str(e)}")
+            product.error = str(e)
+        finally:
+            product.last_checked_at = datetime.now()
+            state.next_check_at = time.monotonic() + product.interval_seconds
+            self._in_flight.pop(product.product_url, None)
+
+    def _apply(self, product: WatchedProduct, parsed: Dict):
+        """Сохранение результата проверки и событий об изменениях"""
+        first_check = product.last_changed_at is None and product.price is None and product.available is None
+        changed = False
+        for field in ("price", "available"):
+            old_value, new_value = getattr(product, field), parsed.get(field)
+            if new_value is None or old_value == new_value:
+                continue
+            if not first_check:
+                self.events.append(PriceEvent(
+                    product_url=product.product_url, field=field, old_value=old_value, new_value=new_value
+                ))
+                logger.info(f"{product.product_url}: {field} {old_value} -> {new_value}")
+            setattr(product, field, new_value)
+            changed = True
+
+        if parsed.get("currency"):
+            product.currency = parsed["currency"]
+        if changed:
+            product.last_changed_at = datetime.now()
+
+
+price_monitor = PriceMonitor()
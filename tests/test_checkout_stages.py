@@ -0,0 +1,31 @@
+import pytest
+
+from platilka.agent.checkout_stages import get_stages, is_transient_failure
+
+
+@pytest.mark.parametrize("stage, message", [
+    ("product", "Timeout 30000ms exceeded"),
+    ("add_to_cart", "Кнопка не нажалась, страница не ответила"),
+    ("delivery", "Element is not attached to the DOM"),
+    ("quantity", ""),
+])
+def test_transient_failure(stage, message):
+    assert is_transient_failure(get_stages(stage)[0], message)
+
+
+@pytest.mark.parametrize("stage, message", [
+    ("product", "Товара НЕТ В НАЛИЧИИ"),
+    ("product", "Это не страница товара"),
+    ("product", "HTTP 404"),
+    ("add_to_cart", "Product is out of stock"),
+    ("delivery", "Недопустимый адрес доставки"),
+    # Оплата не повторяется ни при каком сбое: повтор может списать деньги дважды
+    ("payment", "Timeout 30000ms exceeded"),
+])
+def test_permanent_failure(stage, message):
+    assert not is_transient_failure(get_stages(stage)[0], message)
+
+
+def test_get_stages_keeps_checkout_order():
+    assert [stage.name for stage in get_stages("delivery", "product")] == ["product", "delivery"]
+    assert [stage.name for stage in get_stages()] == ["product", "add_to_cart", "quantity", "delivery", "payment"]
@@ -0,0 +1,90 @@
+import asyncio
+
+from platilka.agent.checkpoints import capture_checkpoint, restore_checkpoint
+
+STORAGE_STATE = {
+    "cookies": [{"name": "cart_id", "value": "42", "domain": "shop.ru", "path": "/"}],
+    "origins": [
+        {"origin": "https://shop.ru", "localStorage": [{"name": "region", "value": "77"}]},
+        {"origin": "https://cdn.shop.ru", "localStorage": []},
+    ],
+}
+
+
+class FakePlaywrightContext:
+    def __init__(self):
+        self.cookies = []
+        self.init_scripts = []
+
+    async def storage_state(self):
+        return STORAGE_STATE
+
+    async def add_cookies(self, cookies):
+        self.cookies.extend(cookies)
+
+    async def add_init_script(self, script):
+        self.init_scripts.append(script)
+
+
+class FakePage:
+    def __init__(self, url):
+        self.url = url
+        self.loaded = False
+
+    async def goto(self, url):
+        self.url = url
+
+    async def wait_for_load_state(self):
+        self.loaded = True
+
+
+class FakeSession:
+    def __init__(self):
+        self.context = FakePlaywrightContext()
+
+
+class FakeBrowserContext:
+    def __init__(self, url="about:blank"):
+        self.session = FakeSession()
+        self.page = FakePage(url)
+
+    async def get_session(self):
+        return self.session
+
+    async def get_current_page(self):
+        return self.page
+
+
+def test_capture_checkpoint():
+    context = FakeBrowserContext("https://shop.ru/cart")
+    checkpoint = asyncio.run(capture_checkpoint(context, "add_to_cart", {"added": True}))
+
+    assert checkpoint.stage == "add_to_cart"
+    assert checkpoint.url == "https://shop.ru/cart"
+    assert checkpoint.storage_state == STORAGE_STATE
+    assert checkpoint.public_view() == {
+        "stage": "add_to_cart", "data": {"added": True}, "url": "https://shop.ru/cart",
+        "created_at": checkpoint.created_at,
+    }
+
+
+def test_restore_checkpoint_into_new_context():
+    checkpoint = asyncio.run(capture_checkpoint(FakeBrowserContext("https://shop.ru/cart"), "add_to_cart", {}))
+    context = FakeBrowserContext()
+    asyncio.run(restore_checkpoint(context, checkpoint))
+
+    assert context.session.context.cookies == STORAGE_STATE["cookies"]
+    # localStorage восстанавливается только для origin с данными
+    [script] = context.session.context.init_scripts
+    assert '"https://shop.ru"' in script
+    assert '{"region": "77"}' in script
+    assert context.page.url == "https://shop.ru/cart"
+    assert context.page.loaded
+
+
+def test_restore_without_checkpoint_does_nothing():
+    context = FakeBrowserContext()
+    asyncio.run(restore_checkpoint(context, None))
+
+    assert context.session.context.cookies == []
+    assert context.page.url == "about:blank"
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+from platilka.agent.dead_ends import DEFAULT_RULES, DeadEndDetector, DeadEndRuleStore
+
+RULES = {rule.reason: rule for rule in DEFAULT_RULES}
+
+
+@pytest.mark.parametrize("reason, url, signals", [
+    ("out_of_stock", "https://shop.ru/p/1", {"availability": "Нет в наличии"}),
+    ("out_of_stock", "https://shop.ru/p/1", {"availability": "https://schema.org/OutOfStock\n"}),
+    ("not_found", "https://shop.ru/p/1", {"title": "404 - страница не найдена"}),
+    ("not_found", "https://shop.ru/p/1", {"title": "Магазин", "h1": "Каталог\nТовар не найден"}),
+    ("captcha", "https://shop.ru/showcaptcha?retpath=1", {}),
+    ("captcha", "https://shop.ru/p/1", {"selectors": [".smart-captcha"]}),
+    ("login_wall", "https://shop.ru/p/1", {"dialogText": "Войдите, чтобы продолжить"}),
+    ("region_loop", "https://shop.ru/p/1", {"dialogText": "Выберите ваш город"}),
+])
+def test_rule_matches(reason, url, signals):
+    assert RULES[reason].matches(url, signals)
+
+
+@pytest.mark.parametrize("reason, signals", [
+    # Текст страницы вне блока наличия (подборки, отзывы) не учитывается
+    ("out_of_stock", {"text": "Похожие товары: нет в наличии", "availability": "В наличии"}),
+    ("out_of_stock", {"availability": "Нет в наличии", "buyButton": True}),
+    ("not_found", {"title": "Peugeot 404 - купить модель"}),
+    ("not_found", {"title": "404", "buyButton": True}),
+    ("login_wall", {"text": "Войдите, чтобы увидеть бонусы"}),
+])
+def test_rule_does_not_match(reason, signals):
+    assert not RULES[reason].matches("https://shop.ru/p/1", signals)
+
+
+def test_rule_store_without_file_uses_defaults(tmp_path):
+    store = DeadEndRuleStore(str(tmp_path / "missing.json"))
+    assert store.rules("shop.ru") == DEFAULT_RULES
+
+
+def test_rule_store_domain_overrides(tmp_path):
+    path = tmp_path / "dead_end_rules.json"
+    path.write_text(json.dumps({"shop.ru": {
+        "disabled": ["region_loop"],
+        "rules": [
+            {"reason": "out_of_stock", "consecutive_steps": 3},
+            {"reason": "preorder", "availability_patterns": ["предзаказ"], "stages": ["product"]},
+        ],
+    }}), encoding="utf-8")
+    store = DeadEndRuleStore(str(path))
+
+    rules = {rule.reason: rule for rule in store.rules("shop.ru")}
+    assert "region_loop" not in rules
+    assert rules["out_of_stock"].consecutive_steps == 3
+    assert rules["out_of_stock"].availability_patterns == RULES["out_of_stock"].availability_patterns
+    assert rules["preorder"].availability_patterns == ("предзаказ",)
+    assert rules["preorder"].stages == ("product",)
+    assert store.rules("other.ru") == DEFAULT_RULES
+
+
+class FakePage:
+    def __init__(self, signals):
+        self.signals = signals
+
+    async def evaluate(self, script, args):
+        return self.signals.pop(0)
+
+
+class FakeBrowserContext:
+    def __init__(self, signals):
+        self.page = FakePage(signals)
+
+    async def get_current_page(self):
+        return self.page
+
+
+class FakeAgent:
+    stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeState:
+    url = "https://shop.ru/p/1"
+
+
+def test_detector_stops_agent_after_consecutive_steps():
+    out_of_stock = {"availability": "Нет в наличии"}
+    context = FakeBrowserContext([out_of_stock, {"availability": "В наличии"}, out_of_stock, out_of_stock])
+    detector = DeadEndDetector("shop.ru", "product", context, DEFAULT_RULES)
+    agent = FakeAgent()
+    detector.attach_agent(agent)
+
+    async def run():
+        for step in range(1, 4):
+            await detector.on_step(FakeState(), None, step)
+        with pytest.raises(InterruptedError):
+            await detector.on_step(FakeState(), None, 4)
+
+    asyncio.run(run())
+    assert agent.stopped
+    assert detector.detected.reason == "out_of_stock"
+    assert detector.detected.stage == "product"
+
+
+def test_detector_skips_rules_of_other_stages():
+    detector = DeadEndDetector("shop.ru", "payment", FakeBrowserContext([]), DEFAULT_RULES)
+    assert "out_of_stock" not in {rule.reason for rule in detector.rules}
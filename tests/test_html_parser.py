@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from platilka.monitor.html_parser import parse_product_html
+
+
+def json_ld(data) -> str:
+    return f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+
+def test_json_ld_product():
+    html = json_ld({"@context": "https://schema.org", "@type": "Product", "name": "Кофе",
+                    "offers": {"@type": "Offer", "price": "1299.90", "priceCurrency": "RUB",
+                               "availability": "https://schema.org/InStock"}})
+    assert parse_product_html(html) == {"price": 1299.90, "currency": "RUB", "available": True}
+
+
+def test_json_ld_graph_with_offer_list():
+    html = json_ld({"@graph": [
+        {"@type": "BreadcrumbList"},
+        {"@type": ["Product", "Thing"],
+         "offers": [{"lowPrice": 990, "priceCurrency": "RUB", "availability": "https://schema.org/OutOfStock"}]},
+    ]})
+    assert parse_product_html(html) == {"price": 990.0, "currency": "RUB", "available": False}
+
+
+def test_broken_json_ld_falls_back_to_microdata():
+    html = """
+        <script type="application/ld+json">{broken</script>
+        <div itemscope itemtype="https://schema.org/Product">
+            <span itemprop="price" content="1 299,90">1 299,90 ₽</span>
+            <meta itemprop="priceCurrency" content="RUB">
+            <link itemprop="availability" href="https://schema.org/InStock">
+        </div>
+    """
+    assert parse_product_html(html) == {"price": 1299.90, "currency": "RUB", "available": True}
+
+
+def test_open_graph_price():
+    html = """
+        <meta property="product:price:amount" content="450">
+        <meta property="product:price:currency" content="RUB">
+        <p>В наличии</p>
+    """
+    assert parse_product_html(html) == {"price": 450.0, "currency": "RUB", "available": True}
+
+
+@pytest.mark.parametrize("text, available", [
+    ("Нет в наличии", False),
+    ("Товар закончился, сообщить о поступлении", False),
+    ("Sold out", False),
+    ("Осталось 3 шт.", True),
+])
+def test_availability_from_text(text, available):
+    html = f'<span class="price">1 000 ₽</span><div>{text}</div>'
+    assert parse_product_html(html)["available"] is available
+
+
+def test_page_without_offer():
+    assert parse_product_html("<html><body><h1>Каталог</h1></body></html>") == {
+        "price": None, "currency": None, "available": True,
+    }
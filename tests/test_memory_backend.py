@@ -0,0 +1,90 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from platilka.agent import memory_backend as memory_module
+from platilka.agent.memory_backend import AgentMemoryBackend
+
+pytestmark = pytest.mark.skipif(memory_module.Memory is None, reason="нужен browser-use[memory]")
+
+
+class FakeMem0:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.deleted = []
+
+    def delete_all(self, agent_id):
+        if self.fail:
+            raise RuntimeError("индекс недоступен")
+        self.deleted.append(agent_id)
+
+
+class FakeAgent:
+    def __init__(self):
+        self.llm = FakeListChatModel(responses=["сводка"])
+        self._message_manager = object()
+        self.memory = None
+        self.enable_memory = False
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    created = []
+
+    def from_config(config_dict):
+        created.append(config_dict)
+        return FakeMem0()
+
+    monkeypatch.setattr(memory_module.Mem0Memory, "from_config", staticmethod(from_config))
+    backend = AgentMemoryBackend()
+    backend.created = created
+    return backend
+
+
+def test_backend_is_initialized_once(backend):
+    llm = FakeListChatModel(responses=["сводка"])
+    assert not backend.initialized
+
+    mem0 = backend.get(llm)
+    assert backend.get(llm) is mem0
+    assert len(backend.created) == 1
+    assert backend.initialized
+    assert backend.init_seconds is not None
+
+
+def test_attach_shares_backend_per_order(backend, monkeypatch):
+    monkeypatch.setattr(memory_module.Memory, "create_procedural_memory", lambda self, current_step: None)
+    mem0 = backend.get(FakeListChatModel(responses=["сводка"]))
+    first, second = FakeAgent(), FakeAgent()
+
+    backend.attach(first, "order_memory_1", 5)
+    backend.attach(second, "order_memory_2", 5)
+
+    assert first.enable_memory and second.enable_memory
+    assert first.memory.mem0 is mem0 and second.memory.mem0 is mem0
+    assert first.memory.config.agent_id == "order_memory_1"
+    assert first.memory.config.memory_interval == 5
+    assert backend.stats()["active_orders"] == 2
+
+    first.memory.create_procedural_memory(5)
+    first.memory.create_procedural_memory(10)
+    assert backend.release("order_memory_1")["summaries"] == 2
+    assert mem0.deleted == ["order_memory_1"]
+
+    # Без сводок в индексе удалять нечего
+    assert backend.release("order_memory_2")["summaries"] == 0
+    assert mem0.deleted == ["order_memory_1"]
+    assert backend.stats()["active_orders"] == 0
+
+
+def test_release_unknown_memory(backend):
+    assert backend.release("missing") == {"summaries": 0, "seconds": 0.0}
+
+
+def test_release_survives_delete_errors(backend):
+    backend._mem0 = FakeMem0(fail=True)
+    agent = FakeAgent()
+    backend.attach(agent, "order_memory_1", 5)
+    agent.memory.usage.summaries = 1
+
+    assert backend.release("order_memory_1")["summaries"] == 1
+    assert backend.stats()["active_orders"] == 0
@@ -0,0 +1,83 @@
+import json
+from urllib.parse import parse_qsl
+
+import pytest
+
+from platilka.agent.network_recorder import (
+    REDACTED, is_secret_key, product_id_from_url, redact_body, template_body, template_url
+)
+from platilka.core.config import sensitive_data
+
+JSON = "application/json; charset=utf-8"
+FORM = "application/x-www-form-urlencoded"
+
+
+@pytest.mark.parametrize("key", [
+    "card_number", "cardNumber", "cvv", "phone", "email", "delivery_address", "csrf_token", "csrfToken",
+    "password", "name", "first_name", "customerName", "fio",
+])
+def test_secret_keys(key):
+    assert is_secret_key(key)
+
+
+@pytest.mark.parametrize("key", [
+    "product_name", "productName", "sku", "quantity", "cart_id", "payment_method", "discount", "telegram_ok",
+])
+def test_not_secret_keys(key):
+    assert not is_secret_key(key)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://shop.ru/catalog/coffee-lavazza-123456/", "123456"),
+    ("https://shop.ru/p/lavazza-oro", "lavazza-oro"),
+    ("https://shop.ru/", None),
+])
+def test_product_id_from_url(url, expected):
+    assert product_id_from_url(url) == expected
+
+
+def test_redact_json_body():
+    body = json.dumps({
+        "cardNumber": "0000", "product_name": "Кофе", "customerName": "Иван",
+        "note": f"карта {sensitive_data['card_number']}", "items": [{"email": "a@b.ru", "qty": 1}],
+    })
+    assert json.loads(redact_body(body, JSON)) == {
+        "cardNumber": REDACTED, "product_name": "Кофе", "customerName": REDACTED,
+        "note": f"карта {REDACTED}", "items": [{"email": REDACTED, "qty": 1}],
+    }
+
+
+def test_redact_form_body():
+    redacted = dict(parse_qsl(redact_body("phone=79990000000&sku=1&csrf_token=abc", FORM)))
+    assert redacted == {"phone": REDACTED, "sku": "1", "csrf_token": REDACTED}
+
+
+def test_redact_unknown_body_removes_sensitive_values():
+    assert redact_body(f"cvv:{sensitive_data['card_number']}", "text/plain") == f"cvv:{REDACTED}"
+    assert redact_body("", JSON) == ""
+
+
+def test_template_url():
+    url = template_url("https://shop.ru/api/cart/123456/add?qty=2&page=2", "123456", 2)
+    assert url == "https://shop.ru/api/cart/{product_id}/add?qty={quantity}&page=2"
+
+
+def test_template_json_body_keeps_value_types():
+    body = template_body(json.dumps({"productId": 123456, "qty": 2, "sku": "123456", "count": 5}),
+                         JSON, "123456", 2)
+    # Числа остаются числами после подстановки, строки - строками
+    assert body == '{"productId": {product_id}, "qty": {quantity}, "sku": "{product_id}", "count": 5}'
+    assert json.loads(body.replace("{product_id}", "777").replace("{quantity}", "3")) == {
+        "productId": 777, "qty": 3, "sku": "777", "count": 5,
+    }
+
+
+def test_template_form_body_only_quantity_fields():
+    body = template_body("product_id=123456&quantity=2&color=2", FORM, "123456", 2)
+    assert body == "product_id={product_id}&quantity={quantity}&color=2"
+
+
+def test_template_unknown_body():
+    assert template_body("id:123456", "text/plain", "123456", 1) is None
+    assert template_body("action=refresh", "text/plain", "123456", 1) == "action=refresh"
+    assert template_body("{broken", JSON, "123456", 1) is None
@@ -0,0 +1,100 @@
+import asyncio
+
+from platilka.core.order_events import FINISHED_EVENT, OrderEventBus
+
+
+def make_bus(history_size: int = 10, queue_size: int = 10, max_channels: int = 10) -> OrderEventBus:
+    return OrderEventBus(history_size=history_size, queue_size=queue_size, max_channels=max_channels)
+
+
+async def collect(events) -> list:
+    return [event async for event in events]
+
+
+def test_late_subscriber_replays_history():
+    bus = make_bus()
+    for step in range(1, 3):
+        bus.publish("order_1", "step", {"step": step})
+    bus.publish("order_1", FINISHED_EVENT, {"status": "checkout_completed"})
+
+    events = asyncio.run(collect(bus.subscribe("order_1")))
+    assert [event.id for event in events] == [1, 2, 3]
+    assert [event.type for event in events] == ["step", "step", FINISHED_EVENT]
+    assert events[0].data == {"step": 1}
+
+
+def test_replay_after_last_event_id():
+    bus = make_bus()
+    for step in range(1, 4):
+        bus.publish("order_1", "step", {"step": step})
+    bus.publish("order_1", FINISHED_EVENT)
+
+    events = asyncio.run(collect(bus.subscribe("order_1", last_event_id=2)))
+    assert [event.id for event in events] == [3, 4]
+
+
+def test_history_is_bounded():
+    bus = make_bus(history_size=2)
+    for step in range(1, 4):
+        bus.publish("order_1", "step", {"step": step})
+    bus.publish("order_1", FINISHED_EVENT)
+
+    events = asyncio.run(collect(bus.subscribe("order_1")))
+    assert [event.id for event in events] == [3, 4]
+
+
+def test_unknown_order_has_no_events():
+    assert asyncio.run(collect(make_bus().subscribe("missing"))) == []
+
+
+def test_slow_subscriber_drops_oldest_but_gets_final_event():
+    bus = make_bus(queue_size=2)
+
+    async def run():
+        bus.publish("order_1", "status", {"status": "checkout_in_progress"})
+        events = bus.subscribe("order_1")
+        received = [await events.__anext__()]
+        assert bus.subscribers_count() == 1
+        # Подписчик не читает очередь, пока идут публикации
+        for step in range(1, 4):
+            bus.publish("order_1", "step", {"step": step})
+        bus.publish("order_1", FINISHED_EVENT, {"status": "checkout_completed"})
+        received.extend(await collect(events))
+        return received
+
+    received = asyncio.run(run())
+    assert [event.id for event in received] == [1, 4, 5]
+    assert received[-1].type == FINISHED_EVENT
+    assert bus.subscribers_count() == 0
+
+
+def test_heartbeat_while_run_is_active():
+    bus = make_bus()
+    bus.publish("order_1", "status", {"status": "checkout_in_progress"})
+
+    async def run():
+        events = bus.subscribe("order_1", last_event_id=1, heartbeat=0.01)
+        keep_alive = await events.__anext__()
+        await events.aclose()
+        return keep_alive
+
+    assert asyncio.run(run()) is None
+    assert bus.subscribers_count() == 0
+
+
+def test_evicts_only_finished_channels():
+    bus = make_bus(max_channels=2)
+    bus.publish("active", "status", {"status": "checkout_in_progress"})
+    bus.publish("finished", FINISHED_EVENT)
+    bus.publish("new", "status", {"status": "checkout_in_progress"})
+
+    assert asyncio.run(collect(bus.subscribe("finished"))) == []
+
+    async def first_event(order_id):
+        events = bus.subscribe(order_id)
+        event = await events.__anext__()
+        await events.aclose()
+        return event
+
+    assert asyncio.run(first_event("active")).id == 1
+    assert asyncio.run(first_event("new")).id == 1
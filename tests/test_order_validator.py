@@ -0,0 +1,111 @@
+import pytest
+
+from platilka.core.order_validator import order_validator
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1 299,90 ₽", 1299.90),
+    ("1 299 руб.", 1299.0),
+    ("1,299.90", 1299.90),
+    ("1.299,90 руб.", 1299.90),
+    ("1.299.000", 1299000.0),
+    ("1,299", 1299.0),
+    ("12,5", 12.5),
+    ("Итого: 350 ₽", 350.0),
+    ("2 шт × 1 299 ₽", 1299.0),
+    ("1 299 ₽ × 2 шт", 1299.0),
+    ("$1,299.90 for 2 items", 1299.90),
+    ("2 × 450", 450.0),
+    ("2 шт.", 2.0),
+    (499, 499.0),
+    (12.5, 12.5),
+])
+def test_parse_price(value, expected):
+    assert order_validator.parse_price(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", [None, True, "", "бесплатно", "—"])
+def test_parse_price_without_number(value):
+    assert order_validator.parse_price(value) is None
+
+
+@pytest.mark.parametrize("expected, actual", [
+    ("iPhone 15", "iphone 15"),
+    ("Смартфон «Ёжик» X", "смартфон ежик x"),
+    ("iPhone 15", "iPhone 15 (черный, 128 ГБ)"),
+    ("iPhone 15", "iPhone 15, арт. 123456"),
+    ("iPhone 15 (черный)", "iPhone 15 (черный, 128 ГБ)"),
+    ("Молоко 3,2%", "Молоко 3,2% (1 л)"),
+    ("Курьерская доставка", "Курьерская доставка - завтра"),
+    ("Lavazza Oro, 1 кг", "Lavazza Oro 1 кг"),
+    ("Lavazza Oro 1 кг", "Lavazza Oro, 1 кг"),
+    ("Кофе Lavazza Oro", "Lavazza Oro кофе"),
+    ("Кофе \"Lavazza\" Oro/зерно", "кофе lavazza oro зерно"),
+])
+def test_names_match(expected, actual):
+    assert order_validator.names_match(expected, actual)
+
+
+@pytest.mark.parametrize("expected, actual", [
+    ("iPhone 15", "iPhone 15 Pro Max"),
+    ("iPhone 15 Pro Max", "iPhone 15"),
+    ("Pro", "iPhone 15 Pro"),
+    ("Lavazza Oro, 1 кг", "Lavazza Oro 500 г"),
+    ("iPhone 15 (черный)", "iPhone 15 (белый)"),
+    ("Молоко 3,2%", "Молоко 2,5%"),
+    ("Курьер", "Курьерская доставка"),
+    ("", "iPhone 15"),
+    ("iPhone 15", ""),
+    (None, "iPhone 15"),
+])
+def test_names_do_not_match(expected, actual):
+    assert not order_validator.names_match(expected, actual)
+
+
+EXPECTED_ORDER = {
+    "product_name": "iPhone 15",
+    "quantity": 2,
+    "product_price": 79990.0,
+    "delivery_cost": 0.0,
+    "total_price": 159980.0,
+    "delivery_method": "Курьерская доставка",
+}
+
+
+def test_validate_matching_cart():
+    actual = {
+        "product_name": "iPhone 15 (черный, 128 ГБ)",
+        "quantity": "2 шт.",
+        "product_price": "79 990 ₽",
+        "delivery_cost": None,
+        "total_price": "159 980,00 ₽",
+        "delivery_method": "Курьерская доставка",
+    }
+    assert order_validator.validate(EXPECTED_ORDER, actual) == []
+
+
+def test_validate_reports_each_discrepancy():
+    actual = {
+        "product_name": "iPhone 15 Pro Max",
+        "quantity": "1",
+        "product_price": "79 990 ₽",
+        "delivery_cost": "300 ₽",
+        "total_price": "80 290 ₽",
+        "delivery_method": "Самовывоз",
+    }
+    discrepancies = {d.field: d for d in order_validator.validate(EXPECTED_ORDER, actual)}
+    assert set(discrepancies) == {"product_name", "quantity", "delivery_cost", "total_price", "delivery_method"}
+    assert discrepancies["quantity"].actual == 1
+    assert discrepancies["delivery_cost"].actual == 300.0
+
+
+def test_validate_unparsed_price_is_discrepancy():
+    actual = {**EXPECTED_ORDER, "total_price": "уточняется"}
+    discrepancies = order_validator.validate(EXPECTED_ORDER, actual)
+    assert [d.field for d in discrepancies] == ["total_price"]
+
+
+def test_validate_tolerance():
+    actual = {**EXPECTED_ORDER, "total_price": 159980.5}
+    assert order_validator.validate(EXPECTED_ORDER, actual, tolerance=1.0) == []
+    assert [d.field for d in order_validator.validate(EXPECTED_ORDER, actual)] == ["total_price"]